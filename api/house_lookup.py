@@ -0,0 +1,182 @@
+"""
+Быстрый путь для запросов «улица + дом [+ корпус/строение]».
+
+Вместо полнотекстового каскада с вариантами корпуса/строения и wildcard по номеру дома —
+два шага по точным ключам:
+1. улица (или город для домов без улицы) находится запросом без номера дома один раз,
+   её ключ street_key кэшируется; тем же _msearch выполняется основное тело полного каскада,
+   чтобы при промахе не спрашивать ES повторно;
+2. дом ищется по (street_key, house_key): в словаре домов улицы в памяти процесса
+   или, для длинных улиц, одним term-запросом.
+Полнотекстовый каскад остаётся запасным путём, если точного совпадения нет. Путь отдаёт один дом,
+поэтому используется только для запросов с limit=1 (геокодирование).
+
+В выгрузке ФИАС у дома нет guid улицы, поэтому ключ улицы — её full_norm
+(у дома — full_norm без последнего сегмента). Поля street_key/house_key пишет ETL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generator, List, Optional, Tuple
+
+from .query_plan import SOURCE_FIELDS
+
+# Уровни, к которым привязаны дома: улица или населённый пункт без улиц
+HOUSE_PARENT_LEVELS = ("street", "city")
+# Разделитель частей house_key
+HOUSE_KEY_SEP = "|"
+
+# Шаг быстрого пути: тела, которые нужно выполнить (одно — _search, несколько — _msearch), и ответы ES на них.
+# Результат: хиты (список из одного дома; None — нужен полный каскад) и ответ ES на основное тело
+# каскада, если он уже получен вместе с улицей
+FastPathResult = Tuple[Optional[List[Dict[str, Any]]], Optional[Dict[str, Any]]]
+FastPathSteps = Generator[List[Dict[str, Any]], List[Dict[str, Any]], FastPathResult]
+
+
+def parent_full_norm(full_norm: str) -> str:
+    """full_norm родителя дома: без последнего сегмента ("..., тверская ул, дом 1" -> "..., тверская ул")"""
+    return full_norm.rsplit(",", 1)[0].strip() if "," in full_norm else ""
+
+
+def house_key(
+    house_number: Optional[str],
+    korpus: Optional[str] = None,
+    stroenie: Optional[str] = None,
+    sep: str = HOUSE_KEY_SEP
+) -> str:
+    """Точный ключ дома: номер, корпус, строение в нижнем регистре"""
+    return sep.join((house_number or "", korpus or "", stroenie or "")).lower()
+
+
+def street_key(source: Dict[str, Any]) -> Optional[str]:
+    """Ключ улицы документа: свой full_norm у улицы/города, full_norm родителя у дома"""
+    if source.get("street_key"):
+        return source["street_key"]
+    full_norm = source.get("full_norm")
+    if not full_norm:
+        return None
+    return parent_full_norm(full_norm) if source.get("level") == "house" else full_norm
+
+
+def street_houses_body(key: str, size: int) -> Dict[str, Any]:
+    """Все дома улицы одним фильтр-запросом (без скоринга)"""
+    return {
+        "size": size,
+        "query": {"bool": {"filter": [{"term": {"street_key": key}}, {"term": {"level": "house"}}]}},
+        "_source": list(SOURCE_FIELDS)
+    }
+
+
+def house_body(key: str, house: str) -> Dict[str, Any]:
+    """Один дом по точным ключам"""
+    return {
+        "size": 1,
+        "query": {"bool": {"filter": [
+            {"term": {"street_key": key}}, {"term": {"house_key": house}}, {"term": {"level": "house"}}
+        ]}},
+        "_source": list(SOURCE_FIELDS)
+    }
+
+
+class HouseDirectory:
+    """Кэш быстрого пути в памяти процесса: запрос улицы -> street_key (в том числе «не найдено»)
+    и street_key -> словарь домов улицы (house_key -> хит ES).
+    LRU с TTL; поколение индекса входит в ключ, как в кэше результатов.
+    """
+
+    def __init__(self, max_streets: int, max_houses: int, ttl: float):
+        self.max_streets = max_streets
+        self.max_houses = max_houses
+        self.ttl = ttl
+        self._streets: "OrderedDict[Tuple, Tuple[float, Optional[str]]]" = OrderedDict()
+        self._houses: "OrderedDict[Tuple, Tuple[float, Optional[Dict[str, Dict[str, Any]]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.term_lookups = 0
+        self.misses = 0
+
+    def _get(self, data: OrderedDict, key: Tuple) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = data.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] < time.monotonic():
+                del data[key]
+                return False, None
+            data.move_to_end(key)
+            return True, entry[1]
+
+    def _set(self, data: OrderedDict, key: Tuple, value: Any) -> None:
+        with self._lock:
+            data[key] = (time.monotonic() + self.ttl, value)
+            data.move_to_end(key)
+            while len(data) > self.max_streets:
+                data.popitem(last=False)
+
+    def lookup(
+        self,
+        street_body: Dict[str, Any],
+        street_query: Tuple,
+        house: str,
+        generation: Optional[str] = None,
+        cascade_body: Optional[Dict[str, Any]] = None
+    ) -> FastPathSteps:
+        """Шаги быстрого пути: генератор отдаёт списки тел и получает ответы ES на них,
+        результат — (список из одного хита дома или None, ответ на cascade_body или None).
+        Так один и тот же алгоритм исполняется и синхронным, и асинхронным клиентом.
+        cascade_body — основное тело полного каскада: если улицы нет в кэше, оно уходит в ES
+        одним _msearch с запросом улицы, и при промахе каскад продолжается без повтора этого тела.
+        """
+        prefetched = None
+        found, key = self._get(self._streets, (generation, street_query))
+        if not found:
+            key = None
+            responses = yield [street_body] if cascade_body is None else [street_body, cascade_body]
+            hits = responses[0].get("hits", {}).get("hits", [])
+            if hits and hits[0]["_source"].get("level") in HOUSE_PARENT_LEVELS:
+                key = street_key(hits[0]["_source"])
+            if cascade_body is not None:
+                prefetched = responses[1]
+            self._set(self._streets, (generation, street_query), key)
+        if key is None:
+            self.misses += 1
+            return None, prefetched
+
+        found, houses = self._get(self._houses, (generation, key))
+        if not found:
+            response = (yield [street_houses_body(key, self.max_houses + 1)])[0]
+            hits = response.get("hits", {}).get("hits", [])
+            # Длинная улица не хранится целиком: для неё дом ищется term-запросом
+            houses = None
+            if len(hits) <= self.max_houses:
+                houses = {
+                    house_key(h["_source"].get("house_number"), h["_source"].get("korpus"), h["_source"].get("stroenie")): h
+                    for h in hits
+                }
+            self._set(self._houses, (generation, key), houses)
+
+        if houses is None:
+            self.term_lookups += 1
+            hits = (yield [house_body(key, house)])[0].get("hits", {}).get("hits", [])
+            hit = hits[0] if hits else None
+        else:
+            hit = houses.get(house)
+        if hit is None:
+            self.misses += 1
+            return None, prefetched
+        self.hits += 1
+        return [hit], prefetched
+
+    def clear(self) -> None:
+        with self._lock:
+            self._streets.clear()
+            self._houses.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "streets": len(self._streets),
+            "house_dictionaries": len(self._houses),
+            "hits": self.hits,
+            "term_lookups": self.term_lookups,
+            "misses": self.misses,
+        }
@@ -0,0 +1,75 @@
+"""
+Разбор номера дома / корпуса / строения, общий для ETL и нормализатора запросов.
+
+Грамматика (алиасы «корп», «стр», «вл» и допустимые буквенные литеры) задаётся здесь
+один раз, все регексы компилируются при импорте модуля:
+- HOUSE_PATTERN1 / HOUSE_PATTERN2 — поиск дома в произвольном тексте запроса
+  (api/normalizer.py::extract_house_number);
+- parse_house_name / parse_house_names — разбор имени дома из ФИАС целиком
+  (data/etl.py, при загрузке в индекс).
+
+Порядок групп повторяет исторический: у второго шаблона (строение перед корпусом)
+группа 2 — строение, группа 3 — корпус, и обе стороны читают их одинаково как
+(корпус, строение). Менять это можно только одновременно с переиндексацией.
+"""
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+# Размер кэша разбора имён домов: в ФИАС имена вида "1", "2а", "10к1" повторяются миллионы раз
+HOUSE_PARSE_CACHE_SIZE = 65536
+
+# Алиасы
+CORP_ALIAS = r'(?:корпус|корп|кор\.?|к)'
+BLDG_ALIAS = r'(?:строение|стр\.?|с)'
+HOUSE_ALIAS = r'(?:дом|д)'
+# Также поддержим «владение» как синоним строения для фильтрации
+OWN_ALIAS = r'(?:владение|влад\.?|вл)'
+
+# Номер с необязательной буквенной литерой: 12, 12а
+NUM = r'(\d+[абвгдежзийклмнопрстуфхцчшщъыьэюя]?)'
+
+# Шаблоны для поиска номера дома в любом месте строки. Поддерживаются разные порядки (корп/стр меняются местами)
+BASE_NUM = r'(?:' + HOUSE_ALIAS + r'\.?\s*)?' + NUM
+CORP_NUM = r'(?:\s*(?:' + CORP_ALIAS + r')\.?\s*' + NUM + r')'
+BLDG_NUM = r'(?:\s*(?:' + BLDG_ALIAS + r'|' + OWN_ALIAS + r')\.?\s*' + NUM + r')'
+
+HOUSE_PATTERN1 = re.compile(r'\b' + BASE_NUM + r'(?:' + CORP_NUM + r')?(?:' + BLDG_NUM + r')?', re.IGNORECASE)
+HOUSE_PATTERN2 = re.compile(r'\b' + BASE_NUM + r'(?:' + BLDG_NUM + r')?(?:' + CORP_NUM + r')?', re.IGNORECASE)
+
+# Имя дома из ФИАС разбирается целиком; перед номером допускаются «д», точка и пробелы
+_NAME_BASE_NUM = r'(?:' + HOUSE_ALIAS + r')?\.?\s*' + NUM
+_NAME_PATTERN1 = re.compile(r'^' + _NAME_BASE_NUM + r'(?:' + CORP_NUM + r')?(?:' + BLDG_NUM + r')?$', re.IGNORECASE)
+_NAME_PATTERN2 = re.compile(r'^' + _NAME_BASE_NUM + r'(?:' + BLDG_NUM + r')?(?:' + CORP_NUM + r')?$', re.IGNORECASE)
+
+# Компактные формы "49к4", "49с2" -> "49 к 4", "49 с 2"
+_NAME_COMPACT_KORPUS_RX = re.compile(r'(\d)\s*[к]\s*(\d)')
+_NAME_COMPACT_STROENIE_RX = re.compile(r'(\d)\s*[с]\s*(\d)')
+
+HouseParts = Tuple[str, Optional[str], Optional[str]]
+
+
+@lru_cache(maxsize=HOUSE_PARSE_CACHE_SIZE)
+def parse_house_name(name: str) -> Optional[HouseParts]:
+    """Разбор имени дома из ФИАС (в нижнем регистре): "49к4с2" -> ("49", "4", "2").
+    None — имя не похоже на номер дома, его следует оставить как есть.
+    """
+    # Чистый номер — самый частый случай, обходимся без регексов
+    if name.isdigit() and name.isascii():
+        return name, None, None
+    # Латинские k/c в русские
+    name = name.replace('k', 'к').replace('c', 'с')
+    # Вставим пробелы между числом и метками
+    name = _NAME_COMPACT_KORPUS_RX.sub(r'\1 к \2', name)
+    name = _NAME_COMPACT_STROENIE_RX.sub(r'\1 с \2', name)
+    m = _NAME_PATTERN1.search(name) or _NAME_PATTERN2.search(name)
+    if not m:
+        return None
+    return m.group(1), m.group(2), m.group(3)
+
+
+def parse_house_names(names: Iterable[str]) -> List[Optional[HouseParts]]:
+    """Пакетный разбор (пачка fetchmany в ETL). Повторы внутри пачки и между пачками
+    отдаёт LRU-кэш parse_house_name; отдельная дедупликация пачки на замерах только медленнее.
+    """
+    return list(map(parse_house_name, names))
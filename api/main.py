@@ -2,23 +2,33 @@
 FastAPI приложение для адресного поиска FIAS
 """
 import asyncio
-from fastapi import FastAPI, HTTPException, Query
+from collections import deque
+from itertools import islice
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import List, Dict, Any, Optional
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional
 import logging
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, AsyncElasticsearch
 from pathlib import Path
 
 import sys
 import os
 import json
+import time
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from config import settings, get_elasticsearch_config
 from .normalizer import normalize_query
-from .search import SearchService
-from .models import SearchResponse, AddressItem
+from .search import SearchService, AsyncSearchService, build_search_params, prepare_search_batch
+from .result_cache import ResultCache
+from .suggest import SUGGEST_LEVEL_WEIGHTS, SuggestService
+from .suggest_index import PrefixSuggestIndex
+from .offline_search import OfflineIndex, OfflineSearchService
+from .models import SearchResponse, AddressItem, BatchSearchRequest
+from .metrics import observe_request, render_metrics
+from .timing import RequestTiming, current_timing, stage
+from .tracing import QueryTrace, TraceSink, current_trace, should_trace, trace_normalized, trace_results
 
 # Настройка логирования
 logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL))
@@ -40,29 +50,181 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+
+async def _after_body(body: AsyncIterator, on_done: Callable[[], None]) -> AsyncIterator:
+    """Тело ответа, после последнего чанка (или обрыва клиентом) которого вызывается on_done"""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        on_done()
+
+
+def _is_streamed(request: Request) -> bool:
+    """Ответ эндпоинта работает, пока отдаётся тело (/search/batch): к возврату call_next он ещё не готов"""
+    return getattr(request.state, "streamed", False)
+
+
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    """Замер стадий запроса (api/timing.py): метрики Prometheus и заголовок Server-Timing"""
+    if not settings.METRICS_ENABLED:
+        return await call_next(request)
+    timing = RequestTiming()
+    token = current_timing.set(timing)
+    try:
+        response = await call_next(request)
+    finally:
+        current_timing.reset(token)
+    # Шаблон пути маршрута, а не сам путь: число меток не растёт от параметров
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    if _is_streamed(request):
+        # Стадии ещё идут: метрики — по окончании тела, Server-Timing (заголовок уже не дописать) не ставим
+        response.body_iterator = _after_body(
+            response.body_iterator, lambda: observe_request(path, timing, time.perf_counter() - timing.started)
+        )
+        return response
+    observe_request(path, timing, time.perf_counter() - timing.started)
+    response.headers["Server-Timing"] = timing.server_timing()
+    return response
+
+
+# Эндпоинты, запросы которых попадают в трассы, и те, что попадают в захват медленных/пустых
+TRACED_PATHS = frozenset({"/search", "/search/batch", "/suggest"})
+CAPTURED_PATHS = frozenset({"/search"})
+
+
+@app.middleware("http")
+async def query_trace(request: Request, call_next):
+    """Трасса выбранного запроса (api/tracing.py); её id возвращается в заголовке X-Trace-Id.
+    При CAPTURE_ENABLED трасса собирается для каждого /search, а в файл захвата попадают
+    только медленные (CAPTURE_SLOW_MS) и пустые ответы.
+    """
+    if request.url.path not in TRACED_PATHS:
+        return await call_next(request)
+    forced = settings.TRACE_FORCE_HEADER and request.headers.get("x-trace") == "1"
+    sampled = trace_sink is not None and should_trace(settings.TRACE_SAMPLE_RATE, forced)
+    capture = capture_sink is not None and request.url.path in CAPTURED_PATHS
+    if not (sampled or capture):
+        return await call_next(request)
+    trace = QueryTrace(request.url.path, request.query_params.get("q"), dict(request.query_params))
+
+    def finish(status: int) -> None:
+        trace.finish(status)
+        if sampled:
+            trace_sink.submit(trace)
+        if capture and (
+            trace.duration_ms >= settings.CAPTURE_SLOW_MS or (settings.CAPTURE_ZERO_HITS and trace.results == 0)
+        ):
+            capture_sink.submit(trace)
+
+    token = current_trace.set(trace)
+    try:
+        response = await call_next(request)
+    except BaseException:
+        finish(500)
+        raise
+    finally:
+        current_trace.reset(token)
+    if _is_streamed(request):
+        # Вызовы ES пакета попадают в трассу, пока отдаётся тело: закрываем её после последнего чанка
+        response.body_iterator = _after_body(response.body_iterator, lambda: finish(response.status_code))
+    else:
+        finish(response.status_code)
+    if sampled:
+        response.headers["X-Trace-Id"] = trace.trace_id
+    return response
+
+
 # Глобальные переменные для сервисов
 es_client = None
+async_es_client = None
 search_service = None
+suggest_service = None
+suggest_index = None
+offline_index = None
+result_cache = None
+generation_watch_task = None
+trace_sink = None
+capture_sink = None
+
+
+async def watch_index_generation():
+    """Фоновая сверка поколения индекса для инвалидации кэша результатов"""
+    while True:
+        try:
+            await search_service.refresh_index_generation()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Не удалось получить поколение индекса: {e}")
+        await asyncio.sleep(settings.RESULT_CACHE_GENERATION_POLL)
 
 
 @app.on_event("startup")
 async def startup_event():
     """Инициализация при запуске"""
-    global es_client, search_service
+    global es_client, async_es_client, search_service, suggest_service, suggest_index, offline_index, result_cache, generation_watch_task, trace_sink, capture_sink
     
     try:
-        # Подключение к Elasticsearch
+        # Подключение к Elasticsearch (офлайн-движку ES не нужен)
         es_config = get_elasticsearch_config()
-        es_client = Elasticsearch(
-            **es_config
-        )
-        
-        # Проверка подключения
-        if not es_client.ping():
-            raise Exception("Не удалось подключиться к Elasticsearch")
+        if settings.SEARCH_BACKEND == "offline" and settings.SUGGEST_BACKEND == "completion":
+            # completion suggester ходит в ES, которого в офлайн-режиме нет
+            raise ValueError("SEARCH_BACKEND=offline требует SUGGEST_BACKEND=memory или search")
+        if settings.SEARCH_BACKEND != "offline":
+            es_client = Elasticsearch(
+                **es_config
+            )
+            
+            # Проверка подключения
+            if not es_client.ping():
+                raise Exception("Не удалось подключиться к Elasticsearch")
+        
+        # Кэш результатов поиска
+        if settings.RESULT_CACHE_ENABLED:
+            result_cache = ResultCache(
+                backend=settings.RESULT_CACHE_BACKEND,
+                max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+                ttl=settings.RESULT_CACHE_TTL,
+                redis_url=settings.RESULT_CACHE_REDIS_URL
+            )
         
         # Инициализация сервиса поиска
-        search_service = SearchService(es_client, settings.ES_INDEX)
+        if settings.SEARCH_BACKEND == "offline":
+            offline_index = OfflineIndex(settings.OFFLINE_INDEX_PATH)
+            search_service = OfflineSearchService(offline_index, result_cache)
+            logger.info(
+                f"Офлайн-индекс {settings.OFFLINE_INDEX_PATH}: мест {offline_index.header['places']}, "
+                f"домов {offline_index.header['houses']}"
+            )
+        elif settings.ES_CLIENT_MODE == "async":
+            # Нативный асинхронный клиент с собственным пулом соединений
+            async_es_client = AsyncElasticsearch(
+                **es_config,
+                connections_per_node=settings.ES_ASYNC_CONNECTIONS
+            )
+            search_service = AsyncSearchService(async_es_client, settings.ES_INDEX, result_cache)
+        else:
+            search_service = SearchService(es_client, settings.ES_INDEX, result_cache)
+        if settings.SUGGEST_BACKEND == "memory":
+            suggest_index = PrefixSuggestIndex(settings.SUGGEST_SNAPSHOT_PATH)
+            logger.info(f"Снимок подсказок {settings.SUGGEST_SNAPSHOT_PATH}: {suggest_index.header['records']} записей")
+        suggest_service = SuggestService(search_service, suggest_index)
+        
+        if result_cache is not None:
+            generation_watch_task = asyncio.create_task(watch_index_generation())
+        
+        # Трассировка запросов (выборка TRACE_SAMPLE_RATE или заголовок X-Trace)
+        if settings.TRACE_SAMPLE_RATE > 0 or settings.TRACE_FORCE_HEADER:
+            trace_sink = TraceSink(settings.TRACE_BUFFER_SIZE, settings.TRACE_LOG_PATH)
+        # Захват медленных и пустых запросов для bench/replay_capture.py
+        if settings.CAPTURE_ENABLED:
+            capture_sink = TraceSink(
+                0, settings.CAPTURE_PATH, max_bytes=settings.CAPTURE_MAX_BYTES, backups=settings.CAPTURE_BACKUPS
+            )
         
         logger.info("API успешно инициализировано")
         
@@ -74,8 +236,20 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Очистка при завершении"""
+    if generation_watch_task:
+        generation_watch_task.cancel()
+    if async_es_client:
+        await async_es_client.close()
     if es_client:
         es_client.close()
+    if suggest_index:
+        suggest_index.close()
+    if offline_index:
+        offline_index.close()
+    if trace_sink:
+        trace_sink.close()
+    if capture_sink:
+        capture_sink.close()
 
 
 @app.get("/", response_model=dict)
@@ -128,36 +302,17 @@ async def search_addresses(
             raise HTTPException(status_code=503, detail="Сервис поиска не инициализирован")
         
         # Нормализация запроса
-        normalized = normalize_query(q)
-        logger.info(
+        with stage("normalize"):
+            normalized = normalize_query(q)
+        trace_normalized(normalized)
+        logger.debug(
             f"Поиск: '{q}' -> '{normalized['text_without_house']}', "
             f"дом={normalized['house_number']}, корп={normalized.get('korpus')}, стр={normalized.get('stroenie')}"
         )
         
         # Поиск
-        # Сформируем расширенную фразу для точного матча по full_norm
-        expanded_phrase = normalized['text_without_house']
-        if normalized['house_number']:
-            expanded_phrase = f"{expanded_phrase} дом {normalized['house_number']}"
-            if normalized.get('korpus'):
-                expanded_phrase = f"{expanded_phrase} к {normalized['korpus']}"
-            if normalized.get('stroenie'):
-                expanded_phrase = f"{expanded_phrase} с {normalized['stroenie']}"
-
-        results = await search_service.search(
-            query=normalized['text_without_house'],
-            house_number=normalized['house_number'],
-            korpus=normalized.get('korpus'),
-            stroenie=normalized.get('stroenie'),
-            limit=limit,
-            full_phrase=normalized.get('normalized') or q,
-            expanded_phrase=expanded_phrase,
-            has_moscow=normalized.get('has_moscow', False),
-            has_moscow_region=normalized.get('has_moscow_region', False),
-            has_balashikha=normalized.get('has_balashikha', False),
-            has_leningrad_region=normalized.get('has_leningrad_region', False),
-            original_query=q
-        )
+        results = await search_service.search(**build_search_params(normalized, q, limit), original_query=q)
+        trace_results(results)
         
         return SearchResponse(
             query=q,
@@ -174,26 +329,142 @@ async def search_addresses(
         raise HTTPException(status_code=500, detail="Ошибка выполнения поиска")
 
 
+def _batch_line(index: int, q: str, prepared: Any, result: Any) -> str:
+    """Строка NDJSON для одного запроса пакета"""
+    if isinstance(prepared, Exception):
+        line = {"index": index, "query": q, "error": f"Ошибка нормализации: {prepared}"}
+    elif isinstance(result, Exception):
+        line = {"index": index, "query": q, "error": f"Ошибка поиска: {result}"}
+    else:
+        normalized = prepared[0]
+        line = SearchResponse(
+            query=q,
+            normalized_query=normalized['text_without_house'],
+            house_number=normalized['house_number'],
+            total=len(result),
+            results=result
+        ).model_dump()
+        line = {"index": index, **line}
+    return json.dumps(line, ensure_ascii=False) + "\n"
+
+
+@app.post("/search/batch")
+async def search_batch(request: BatchSearchRequest, http_request: Request):
+    """Пакетное геокодирование: NDJSON, по строке на запрос в порядке входа.
+    Запросы уходят в ES пачками через _msearch (шаг каскада фолбэков на пачку за один запрос).
+    """
+    if not search_service:
+        raise HTTPException(status_code=503, detail="Сервис поиска не инициализирован")
+    if len(request.queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"Не больше {settings.BATCH_MAX_QUERIES} запросов в пакете")
+
+    queries = request.queries
+    chunk_size = request.chunk_size or settings.BATCH_CHUNK_SIZE
+    concurrency = request.concurrency or settings.BATCH_CONCURRENCY
+
+    async def run_chunk(chunk: List[str]):
+        # Нормализация — CPU, уводим из event loop
+        prepared = await asyncio.to_thread(prepare_search_batch, chunk, request.limit)
+        params = [p[1] for p in prepared if not isinstance(p, Exception)]
+        try:
+            found = iter(await search_service.search_many(params))
+        except Exception as e:
+            logger.error(f"Ошибка пакетного поиска: {e}")
+            found = iter([e] * len(params))
+        return prepared, [None if isinstance(p, Exception) else next(found) for p in prepared]
+
+    async def stream():
+        starts = iter(range(0, len(queries), chunk_size))
+        in_flight: deque = deque()
+
+        def launch(start: int) -> None:
+            in_flight.append((start, asyncio.create_task(run_chunk(queries[start:start + chunk_size]))))
+
+        try:
+            # Окно из не более concurrency пачек: следующая запускается, только когда
+            # старшая отдана клиенту, — медленный читатель не копит результаты в памяти
+            for start in islice(starts, concurrency):
+                launch(start)
+            while in_flight:
+                base, task = in_flight.popleft()
+                prepared, results = await task
+                yield "".join(
+                    _batch_line(base + j, queries[base + j], prepared[j], results[j])
+                    for j in range(len(prepared))
+                )
+                start = next(starts, None)
+                if start is not None:
+                    launch(start)
+        finally:
+            # Клиент отключился — не продолжаем пакет впустую
+            for _, task in in_flight:
+                task.cancel()
+
+    # Поиск идёт, пока отдаётся тело: метрики и трасса записываются по его окончании
+    http_request.state.streamed = True
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+# Как часто проверять, не отключился ли клиент подсказок, сек.
+SUGGEST_DISCONNECT_POLL = 0.05
+
+
+async def run_until_disconnect(request: Request, coro):
+    """Выполнение coro с отменой, если клиент ушёл (type-ahead отменил прежний fetch).
+    Возвращает None, если клиент отключился.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=SUGGEST_DISCONNECT_POLL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                return None
+    finally:
+        if not task.done():
+            task.cancel()
+
+
 @app.get("/suggest", response_model=List[AddressItem])
 async def suggest_addresses(
+    request: Request,
     q: str = Query(..., description="Поисковый запрос для подсказок"),
-    limit: int = Query(5, ge=1, le=20, description="Максимальное количество подсказок")
+    limit: int = Query(5, ge=1, le=20, description="Максимальное количество подсказок"),
+    region: Optional[str] = Query(None, description="Код региона для сужения подсказок"),
+    level: Optional[str] = Query(None, description="Уровни через запятую: region, city, street")
 ):
-    """Подсказки адресов (упрощенная версия поиска)"""
+    """Подсказки адресов при вводе.
+    SUGGEST_BACKEND=completion — completion suggester по полю suggest, memory — префиксный индекс
+    в процессе, иначе упрощённый полный поиск.
+    """
     try:
         if not search_service:
             raise HTTPException(status_code=503, detail="Сервис поиска не инициализирован")
         
-        # Нормализация запроса
-        normalized = normalize_query(q)
-        
-        # Поиск только по названию без домов
-        results = await search_service.search(
-            query=normalized['text_without_house'],
-            house_number=None,
-            limit=limit
-        )
-        
+        if settings.SUGGEST_BACKEND in ("completion", "memory"):
+            levels = [lv.strip() for lv in level.split(",") if lv.strip()] if level else None
+            if levels and any(lv not in SUGGEST_LEVEL_WEIGHTS for lv in levels):
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"level: допустимы {', '.join(SUGGEST_LEVEL_WEIGHTS)}"
+                )
+            work = suggest_service.suggest(q, limit=limit, region_code=region, levels=levels)
+        else:
+            # Нормализация запроса и поиск только по названию без домов
+            with stage("normalize"):
+                normalized = normalize_query(q)
+            trace_normalized(normalized)
+            work = search_service.search(
+                query=normalized['text_without_house'],
+                house_number=None,
+                limit=limit
+            )
+        
+        results = await run_until_disconnect(request, work)
+        if results is None:
+            # 499 (nginx: client closed request) — ответ всё равно никто не прочитает
+            return Response(status_code=499)
         return results
         
     except HTTPException:
@@ -214,6 +485,51 @@ async def analyze_query(q: str = Query(..., description="Запрос для а
         raise HTTPException(status_code=500, detail="Ошибка анализа запроса")
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Метрики в формате Prometheus"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Метрики выключены (METRICS_ENABLED=false)")
+    payload, content_type = render_metrics()
+    return Response(content=payload, headers={"Content-Type": content_type})
+
+
+@app.get("/debug/traces")
+async def list_traces(limit: int = Query(50, ge=1, le=1000)):
+    """Последние трассы этого воркера"""
+    if trace_sink is None:
+        raise HTTPException(status_code=404, detail="Трассировка выключена")
+    return {**trace_sink.stats(), "traces": trace_sink.recent(limit)}
+
+
+@app.get("/debug/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """Трасса по id из заголовка X-Trace-Id (хранится в памяти воркера, который обработал запрос)"""
+    if trace_sink is None:
+        raise HTTPException(status_code=404, detail="Трассировка выключена")
+    trace = trace_sink.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Трасса не найдена (вытеснена или в другом воркере)")
+    return trace
+
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Счётчики кэша результатов поиска и быстрого пути «улица + дом»"""
+    stats = {"enabled": False} if result_cache is None else {"enabled": True, **result_cache.stats()}
+    if search_service is not None and search_service.houses is not None:
+        stats["house_fast_path"] = search_service.houses.stats()
+    return stats
+
+
+@app.get("/metrics/suggest")
+async def suggest_metrics():
+    """Память и задержки префиксного индекса подсказок (SUGGEST_BACKEND=memory)"""
+    if suggest_index is None:
+        return {"enabled": False, "backend": settings.SUGGEST_BACKEND}
+    return {"enabled": True, **suggest_index.stats()}
+
+
 @app.get("/etl-status")
 async def etl_status():
     """Статус ETL процесса"""
@@ -222,8 +538,19 @@ async def etl_status():
         if not es_client:
             return {"status": "error", "message": "Elasticsearch недоступен"}
         
+        # Загрузка идёт в самую новую версию <ES_INDEX>_<метка времени>, поиск — через алиас ES_INDEX
+        build_index = settings.ES_INDEX
+        live_index = None
+        try:
+            generations = es_client.indices.get_alias(index=f"{settings.ES_INDEX}_*")
+            if generations:
+                build_index = max(generations)
+                live_index = next((name for name, info in generations.items() if settings.ES_INDEX in (info.get('aliases') or {})), None)
+        except Exception:
+            pass
+        
         try:
-            count_result = es_client.count(index=settings.ES_INDEX)
+            count_result = es_client.count(index=build_index)
             total_docs = count_result.get('count', 0) if isinstance(count_result, dict) else count_result.body.get('count', 0)
         except:
             total_docs = 0
@@ -234,6 +561,8 @@ async def etl_status():
         
         return {
             "status": "running" if total_docs < total_estimated else "completed",
+            "index": build_index,
+            "live_index": live_index,
             "total_docs": total_docs,
             "total_estimated": total_estimated,
             "progress_percent": round(progress_percent, 2),
@@ -383,16 +712,11 @@ async def run_tests():
         
         tests_data = load_tests()
         logger.info(f"Загружено тестов: {len(tests_data.get('tests', []))}")
-        logger.info(f"Структура данных: {list(tests_data.keys())}")
-        logger.info(f"tests_data type: {type(tests_data)}")
-        logger.info(f"tests_data content: {tests_data}")
         results = []
         
         # Проверяем структуру данных
         if 'tests' not in tests_data or not tests_data['tests']:
-            logger.error("Нет тестов в данных")
-            logger.error(f"tests_data: {tests_data}")
-            logger.error(f"tests_data type: {type(tests_data)}")
+            logger.error(f"Нет тестов в данных (ключи: {list(tests_data.keys())})")
             return {
                 "message": "Нет тестов для выполнения",
                 "total": 0,
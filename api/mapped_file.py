@@ -0,0 +1,116 @@
+"""
+Файлы из секций для mmap: снимки, которые ETL пишет из выгрузки, а API открывает только на чтение.
+
+Формат: сигнатура (8 байт), длина заголовка (uint64 LE), JSON-заголовок со смещениями секций;
+секции — массивы array (порядок байт записан в заголовке) и блоки байт, каждая выровнена по 8 байт.
+Файл открывается мгновенно, страницы общие для всех процессов, открывших его.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+Blob = Union[array, bytes, bytearray]
+
+
+def _nbytes(blob: Blob) -> int:
+    return len(blob) * blob.itemsize if isinstance(blob, array) else len(blob)
+
+
+def bytes_column(name: str, values: Iterable[bytes]) -> List[Tuple[str, Blob]]:
+    """Секции столбца строк переменной длины: блок <name> и смещения <name>.offsets (для BytesColumn)"""
+    blob = bytearray()
+    offsets = array("Q", [0])
+    for value in values:
+        blob += value
+        offsets.append(len(blob))
+    return [(name, blob), (f"{name}.offsets", offsets)]
+
+
+def write_mapped_file(path: str, magic: bytes, header: Dict[str, Any], sections: List[Tuple[str, Blob]]) -> Dict[str, Any]:
+    """Запись файла; в header добавляются byteorder и смещения секций.
+    Файл появляется под своим именем только целиком записанным.
+    """
+    header = {**header, "byteorder": sys.byteorder, "sections": {name: [0, _nbytes(blob)] for name, blob in sections}}
+    # Смещения секций зависят от длины заголовка: место под заголовок резервируется
+    # с запасом на длину самих чисел-смещений
+    reserve = len(json.dumps(header).encode("utf-8")) + 24 * len(sections) + 64
+    offset = len(magic) + 8 + reserve
+    for name, blob in sections:
+        offset += -offset % 8
+        header["sections"][name] = [offset, _nbytes(blob)]
+        offset += _nbytes(blob)
+    header_bytes = json.dumps(header).encode("utf-8").ljust(reserve)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(magic)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name, blob in sections:
+            f.write(b"\0" * (-f.tell() % 8))
+            f.write(blob)
+    os.replace(tmp, path)
+    return header
+
+
+class MappedFile:
+    """Файл write_mapped_file, открытый через mmap только на чтение"""
+
+    def __init__(self, path: str, magic: bytes, version: int):
+        self.path = path
+        with open(path, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buf[:len(magic)] != magic:
+            self.buf.close()
+            raise ValueError(f"{path}: неизвестный формат файла")
+        header_len = struct.unpack_from("<Q", self.buf, len(magic))[0]
+        start = len(magic) + 8
+        self.header = json.loads(self.buf[start:start + header_len])
+        if self.header.get("version") != version or self.header["byteorder"] != sys.byteorder:
+            self.buf.close()
+            raise ValueError(f"{path}: несовместимая версия или порядок байт")
+        self._view = memoryview(self.buf)
+        self._views: List[memoryview] = []
+
+    def __len__(self) -> int:
+        return len(self.buf)
+
+    def offset(self, name: str) -> int:
+        return self.header["sections"][name][0]
+
+    def section(self, name: str, fmt: Optional[str] = None) -> memoryview:
+        """Секция как memoryview (fmt — код типа array для числовых массивов)"""
+        offset, length = self.header["sections"][name]
+        part = self._view[offset:offset + length]
+        if fmt:
+            part = part.cast(fmt)
+        self._views.append(part)
+        return part
+
+    def close(self) -> None:
+        # mmap закрывается только после освобождения всех представлений поверх него
+        for view in self._views:
+            view.release()
+        self._view.release()
+        self.buf.close()
+
+
+class BytesColumn:
+    """Столбец строк переменной длины из bytes_column: i-е значение — bytes.
+    Поддерживает bisect, если значения записаны отсортированными.
+    """
+
+    def __init__(self, mapped: MappedFile, name: str):
+        self.buf = mapped.buf
+        self.base = mapped.offset(name)
+        self.offsets = mapped.section(f"{name}.offsets", "Q")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.buf[self.base + self.offsets[i]:self.base + self.offsets[i + 1]]
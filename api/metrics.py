@@ -0,0 +1,59 @@
+"""
+Метрики Prometheus для /metrics: задержки стадий запроса, запросы к ES (время с клиента и took),
+ветки каскада, давшие ответ. Данные собирает api/timing.py за время одного HTTP-запроса.
+
+Несколько воркеров uvicorn: задайте PROMETHEUS_MULTIPROC_DIR (общий пустой каталог),
+тогда /metrics отдаёт сумму по всем процессам.
+"""
+import os
+from typing import Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+
+from .timing import RequestTiming
+
+# Границы корзин, сек: от долей миллисекунды (нормализация, кэш) до таймаута ES
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+REQUEST_SECONDS = Histogram(
+    "fias_http_request_seconds", "Время обработки HTTP-запроса", ["endpoint"], buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "fias_stage_seconds", "Время стадии обработки запроса (сумма за запрос)", ["endpoint", "stage"],
+    buckets=LATENCY_BUCKETS
+)
+ES_REQUEST_SECONDS = Histogram(
+    "fias_es_request_seconds", "Время запроса к ES со стороны клиента", ["branch"], buckets=LATENCY_BUCKETS
+)
+ES_TOOK_SECONDS = Histogram(
+    "fias_es_took_seconds", "Время выполнения запроса по данным ES (took)", ["branch"], buckets=LATENCY_BUCKETS
+)
+BRANCH_TOTAL = Counter(
+    "fias_search_branch_total", "Ветка поиска, давшая ответ (кэш, быстрый путь, шаг каскада)", ["branch"]
+)
+
+
+def observe_request(endpoint: str, timing: RequestTiming, seconds: float) -> None:
+    """Перенос замеров запроса в метрики"""
+    REQUEST_SECONDS.labels(endpoint).observe(seconds)
+    for name, stage_seconds in timing.stages.items():
+        STAGE_SECONDS.labels(endpoint, name).observe(stage_seconds)
+    for branch, wall, took in timing.es_calls:
+        ES_REQUEST_SECONDS.labels(branch).observe(wall)
+        if took is not None:
+            ES_TOOK_SECONDS.labels(branch).observe(took)
+    for branch in timing.branches:
+        BRANCH_TOTAL.labels(branch).inc()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Текст метрик в формате Prometheus и его Content-Type"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -2,7 +2,7 @@
 Модели данных для API
 """
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class GeoPoint(BaseModel):
@@ -50,6 +50,15 @@ class SearchResponse(BaseModel):
     results: List[AddressItem]
 
 
+class BatchSearchRequest(BaseModel):
+    """Пакетный запрос геокодирования"""
+    queries: List[str]
+    limit: int = Field(1, ge=1, le=100)
+    # Переопределение настроек BATCH_CHUNK_SIZE / BATCH_CONCURRENCY для одного запроса
+    chunk_size: Optional[int] = Field(None, ge=1, le=1000)
+    concurrency: Optional[int] = Field(None, ge=1, le=64)
+
+
 class IndexStats(BaseModel):
     """Статистика индекса"""
     total_documents: int
@@ -3,9 +3,13 @@
 """
 import re
 import unicodedata
+from functools import lru_cache
 from typing import Dict, Any
 from unidecode import unidecode
 
+from .house_parser import HOUSE_PATTERN1, HOUSE_PATTERN2, OWN_ALIAS
+from .timing import laps
+
 
 # Словари и регексы алиасов типов
 # Каноническая форма -> варианты написания
@@ -188,6 +192,21 @@ ALIASES_REGEX = [
 ]
 
 
+# Прекомпилированные регексы базовой нормализации
+_ORDINAL_RXS = [
+	(re.compile(r'(\d+)-й\b'), r'\1 й'),
+	(re.compile(r'(\d+)-я\b(?=\s|$)'), r'\1 я'),  # Только если после "-я" идет пробел или конец строки
+	(re.compile(r'(\d+)-е\b'), r'\1 е'),
+	(re.compile(r'(\d+)-го\b'), r'\1 го'),
+	(re.compile(r'(\d+)-му\b'), r'\1 му'),
+]
+_COMMA_RX = re.compile(r',\s*')
+_TRAILING_DOT_RX = re.compile(r'\.(?=\s|$)')
+_DOT_SPACE_RX = re.compile(r'\.\s+')
+_PUNCT_RX = re.compile(r'[^\w\s\-\/\.]')
+_SPACES_RX = re.compile(r'\s+')
+
+
 def normalize_text(text: str) -> str:
 	"""Базовая нормализация текста"""
 	if not text:
@@ -205,65 +224,59 @@ def normalize_text(text: str) -> str:
 	# Специальная обработка числительных типа "1-й", "2-й", "3-й" и т.д.
 	# Заменяем на "1 й", "2 й", "3 й" для правильной токенизации
 	# НО НЕ разрываем окончания прилагательных типа "ая", "ой", "ий"
-	text = re.sub(r'(\d+)-й\b', r'\1 й', text)
-	text = re.sub(r'(\d+)-я\b(?=\s|$)', r'\1 я', text)  # Только если после "-я" идет пробел или конец строки
-	text = re.sub(r'(\d+)-е\b', r'\1 е', text)
-	text = re.sub(r'(\d+)-го\b', r'\1 го', text)
-	text = re.sub(r'(\d+)-му\b', r'\1 му', text)
+	if '-' in text:
+		for rx, repl in _ORDINAL_RXS:
+			text = rx.sub(repl, text)
 	
 	# Обрабатываем запятые как разделители - заменяем на пробелы
-	text = re.sub(r',\s*', ' ', text)
+	text = _COMMA_RX.sub(' ', text)
 	
 	# Обрабатываем точки в конце слов (ул., пл., пр-кт.) - заменяем на пробелы
-	text = re.sub(r'\.(?=\s|$)', ' ', text)
+	text = _TRAILING_DOT_RX.sub(' ', text)
 	
 	# Обрабатываем точки после сокращений (ул., пл., пр-кт. и т.д.) - заменяем на пробелы
-	text = re.sub(r'\.\s+', ' ', text)
+	text = _DOT_SPACE_RX.sub(' ', text)
 	
 	# Удаление лишней пунктуации, сохраняем дефис и слэш, но не удаляем точки в середине слов
-	text = re.sub(r'[^\w\s\-\/\.]', ' ', text)
+	text = _PUNCT_RX.sub(' ', text)
 	
 	# Схлопывание пробелов
-	text = re.sub(r'\s+', ' ', text).strip()
+	text = _SPACES_RX.sub(' ', text).strip()
 	
 	return text
 
 
-def apply_type_aliases(text: str) -> str:
-	"""Нормализация типов топонимов по словарям алиасов и регексам.
-	Работает по токенам: сначала точные алиасы, затем регексы для сложных форм.
+# Канонические типы улиц: их алиасы применяются раньше остальных
+STREET_TYPE_CANONS = frozenset([
+	"ул", "пер", "пр-кт", "б-р", "пр-д", "пл", "ш", "наб", "туп", "ал", "дор", "тракт", "мост", "эст", "п/п",
+	"съезд", "заезд", "подъезд-авт", "просека", "просёлок", "линия", "ряд", "кольцо", "автодорога", "трасса"
+])
+
+# Прекомпилированные регекс-алиасы (порядок важен)
+_ALIASES_REGEX_COMPILED = [(re.compile(rx, re.IGNORECASE), canon) for rx, canon in ALIASES_REGEX]
+# Те же регексы одной альтернацией для токенов: re.match перебирает ветки по порядку,
+# поэтому побеждает первый подходящий регекс, как при переборе списка
+_ALIASES_REGEX_TOKEN_RX = re.compile(
+	'|'.join(f'(?P<a{i}>{rx})' for i, (rx, _) in enumerate(ALIASES_REGEX)),
+	re.IGNORECASE
+)
+# Есть ли в тексте хоть одно совпадение с регекс-алиасами (иначе замены по фразе — холостые)
+_ALIASES_REGEX_ANY_RX = re.compile('|'.join(f'(?:{rx})' for rx, _ in ALIASES_REGEX), re.IGNORECASE)
+_SPOS_RX = re.compile(r'\bс/пос\b', re.IGNORECASE)
+_QUARTER_LL_RX = re.compile(r'\b\d+\s+й\s+кв-л-л\b')
+_QUARTER_RX = re.compile(r'\b\d+\s+й\s+кв-л\b')
+_KVL_DUP_RX = re.compile(r'\bкв-л-л\b')
+_WORD_RUN_RX = re.compile(r'\w+')
+
+
+def _build_alias_tables():
+	"""Однократная сборка упорядоченных таблиц точных алиасов.
+	Порядок и приоритеты совпадают с прежней сборкой на каждый запрос:
+	по длине убыв., "бульвар" первым среди типов улиц, "средняя" и "с/пос" первыми среди остальных.
 	"""
-	if not text:
-		return text
-
-	result = text
-
-	# 0) Специальная обработка для "с/пос" перед обработкой "с" как "средняя"
-	result = re.sub(r'\bс/пос\b', 'с/пос', result, flags=re.IGNORECASE)
-
-	# 1) Сначала применяем регекс-замены для сложных форм
-	# Применяем к фразе целиком для многословных паттернов
-	for rx, canon in ALIASES_REGEX:
-		if re.search(rx, result, flags=re.IGNORECASE):
-			result = re.sub(rx, canon, result, flags=re.IGNORECASE)
-	
-	# Затем применяем к отдельным токенам для простых паттернов
-	tokens = result.split()
-	for i, tok in enumerate(tokens):
-		# Специальная обработка: не заменяем "с" на "средняя", если за ним следует "/пос"
-		if tok.lower() == "с" and i + 1 < len(tokens) and tokens[i + 1].lower() == "пос":
-			continue
-		for rx, canon in ALIASES_REGEX:
-			if re.match(rx, tok, flags=re.IGNORECASE):
-				tokens[i] = canon
-				break
-	result = ' '.join(tokens)
-
-	# 2) Затем применяем точные алиасы, но избегаем повторных замен
-	# Сначала применяем алиасы типов улиц (более длинные и специфичные)
 	street_type_aliases = []
 	other_aliases = []
-	
+
 	for canon, variants in ALIASES.items():
 		for v in variants:
 			# Нормализуем вариант под текущие правила normalize_text
@@ -271,84 +284,209 @@ def apply_type_aliases(text: str) -> str:
 			if not norm_v:
 				continue
 			# Разделяем алиасы типов улиц и остальные
-			if canon in ["ул", "пер", "пр-кт", "б-р", "пр-д", "пл", "ш", "наб", "туп", "ал", "дор", "тракт", "мост", "эст", "п/п", "съезд", "заезд", "подъезд-авт", "просека", "просёлок", "линия", "ряд", "кольцо", "автодорога", "трасса"]:
+			if canon in STREET_TYPE_CANONS:
 				street_type_aliases.append((norm_v, canon))
 			else:
 				other_aliases.append((norm_v, canon))
-	
+
 	# Сортировка по длине убыв.
 	street_type_aliases.sort(key=lambda x: len(x[0]), reverse=True)
 	other_aliases.sort(key=lambda x: len(x[0]), reverse=True)
-	
+
 	# Специальная обработка: перемещаем "бульвар" в начало списка типов улиц
 	bulvar_aliases = [(pattern, canon) for pattern, canon in street_type_aliases if canon == "б-р"]
 	other_street_aliases = [(pattern, canon) for pattern, canon in street_type_aliases if canon != "б-р"]
 	street_type_aliases = bulvar_aliases + other_street_aliases
-	
+
 	# Специальная обработка: перемещаем "с/пос" в начало списка других алиасов (перед "средняя")
 	spos_aliases = [(pattern, canon) for pattern, canon in other_aliases if canon == "с/пос"]
 	other_aliases_filtered = [(pattern, canon) for pattern, canon in other_aliases if canon != "с/пос"]
 	other_aliases = spos_aliases + other_aliases_filtered
-	
+
 	# Специальная обработка: перемещаем "средняя" в начало списка других алиасов
 	srednaya_aliases = [(pattern, canon) for pattern, canon in other_aliases if canon == "средняя"]
 	other_aliases_filtered = [(pattern, canon) for pattern, canon in other_aliases if canon != "средняя"]
 	other_aliases = srednaya_aliases + other_aliases_filtered
 
-	# Применяем замены только один раз для каждого паттерна
-	applied_replacements = set()
-	
-	# Сначала применяем алиасы типов улиц
-	for pattern_text, canon in street_type_aliases:
-		if pattern_text in applied_replacements:
-			continue
+	all_patterns = {pattern for pattern, _ in street_type_aliases + other_aliases}
+
+	def compile_entry(pattern_text, canon):
 		# Границы слова по краям, допускаем дефис/слэш внутри
-		escaped = re.escape(pattern_text)
-		regex = re.compile(rf"(?<!\w){escaped}(?!\w)", flags=re.IGNORECASE)
-		if regex.search(result):
-			result = regex.sub(canon, result)
-			applied_replacements.add(pattern_text)
-	
-	# Затем применяем остальные алиасы, но исключаем те, которые могут конфликтовать с уже примененными
-	for pattern_text, canon in other_aliases:
-		if pattern_text in applied_replacements:
+		regex = re.compile(rf"(?<!\w){re.escape(pattern_text)}(?!\w)", flags=re.IGNORECASE)
+		# Уже применённые паттерны, с которыми этот алиас конфликтует (вхождение подстрокой)
+		conflicts = frozenset(p for p in all_patterns if p in pattern_text or pattern_text in p)
+		return pattern_text, canon, regex, conflicts
+
+	# Единая таблица в порядке применения: (паттерн, канон, регекс, конфликты, это_тип_улицы)
+	table = tuple(compile_entry(p, c) + (True,) for p, c in street_type_aliases)
+	table += tuple(compile_entry(p, c) + (False,) for p, c in other_aliases)
+	# Паттерн -> позиции в таблице (один вариант может вести к разным канонам, например "г.п.")
+	by_pattern = {}
+	for idx, entry in enumerate(table):
+		by_pattern.setdefault(entry[0], []).append(idx)
+	by_pattern = {p: tuple(idxs) for p, idxs in by_pattern.items()}
+	# Первые слова вариантов: с других слов алиас начаться не может
+	first_words = frozenset(_WORD_RUN_RX.match(p).group(0) for p in by_pattern)
+	return table, by_pattern, first_words, max(len(p) for p in by_pattern)
+
+
+_ALIAS_TABLE, _ALIAS_POSITIONS, _ALIAS_FIRST_WORDS, _ALIAS_MAX_LEN = _build_alias_tables()
+
+
+def _alias_candidates(text: str):
+	"""Алиасы, которые встречаются в тексте как целые фрагменты между границами слов.
+	Все варианты начинаются и заканчиваются буквой/цифрой, поэтому кандидат — это отрезок
+	от начала одного слова до конца другого. Для текста не в нижнем регистре возвращает None
+	(проверяем каждый алиас регексом, как раньше).
+	"""
+	if text != text.lower():
+		return None
+	runs = [(m.start(), m.end()) for m in _WORD_RUN_RX.finditer(text)]
+	found = set()
+	for i, (start, first_end) in enumerate(runs):
+		if text[start:first_end] not in _ALIAS_FIRST_WORDS:
 			continue
-		# Проверяем, не конфликтует ли этот алиас с уже примененными типами улиц
-		skip_this = False
-		for applied_pattern in applied_replacements:
-			if applied_pattern in pattern_text or pattern_text in applied_pattern:
-				skip_this = True
+		for _, end in runs[i:]:
+			if end - start > _ALIAS_MAX_LEN:
 				break
-		if skip_this:
+			fragment = text[start:end]
+			if fragment in _ALIAS_POSITIONS:
+				found.add(fragment)
+	return found
+
+
+def apply_type_aliases(text: str) -> str:
+	"""Нормализация типов топонимов по словарям алиасов и регексам.
+	Работает по токенам: сначала точные алиасы, затем регексы для сложных форм.
+	Таблицы алиасов собираются один раз при импорте; за проход по тексту находим
+	все встречающиеся варианты и применяем только их, в прежнем порядке приоритетов.
+	"""
+	if not text:
+		return text
+
+	result = text
+
+	# 0) Специальная обработка для "с/пос" перед обработкой "с" как "средняя"
+	result = _SPOS_RX.sub('с/пос', result)
+
+	# 1) Сначала применяем регекс-замены для сложных форм
+	# Применяем к фразе целиком для многословных паттернов
+	if _ALIASES_REGEX_ANY_RX.search(result):
+		for rx, canon in _ALIASES_REGEX_COMPILED:
+			result = rx.sub(canon, result)
+
+	# Затем применяем к отдельным токенам для простых паттернов
+	tokens = result.split()
+	for i, tok in enumerate(tokens):
+		# Специальная обработка: не заменяем "с" на "средняя", если за ним следует "/пос"
+		if tok.lower() == "с" and i + 1 < len(tokens) and tokens[i + 1].lower() == "пос":
 			continue
-		# Границы слова по краям, допускаем дефис/слэш внутри
-		escaped = re.escape(pattern_text)
-		regex = re.compile(rf"(?<!\w){escaped}(?!\w)", flags=re.IGNORECASE)
-		if regex.search(result):
-			result = regex.sub(canon, result)
-			applied_replacements.add(pattern_text)
+		m = _ALIASES_REGEX_TOKEN_RX.match(tok)
+		if m:
+			tokens[i] = ALIASES_REGEX[int(m.lastgroup[1:])][1]
+	result = ' '.join(tokens)
+
+	# 2) Затем применяем точные алиасы, но избегаем повторных замен
+	# Сначала алиасы типов улиц (бульвар первым), затем остальные — порядок задан в _ALIAS_TABLE.
+	# Проверяем только встреченные в тексте варианты; после каждой замены текст пересканируется.
+	applied_replacements = set()
+	candidates = _alias_candidates(result)
+	pos = 0
+	while pos < len(_ALIAS_TABLE):
+		if candidates is None:
+			pending = range(pos, len(_ALIAS_TABLE))
+		else:
+			pending = sorted(i for p in candidates for i in _ALIAS_POSITIONS[p] if i >= pos)
+		pos = len(_ALIAS_TABLE)
+		for idx in pending:
+			pattern_text, canon, regex, conflicts, is_street_type = _ALIAS_TABLE[idx]
+			if pattern_text in applied_replacements:
+				continue
+			# Остальные алиасы не применяем, если они конфликтуют с уже примененными
+			if not is_street_type and not conflicts.isdisjoint(applied_replacements):
+				continue
+			replaced, count = regex.subn(canon, result)
+			if count:
+				applied_replacements.add(pattern_text)
+				if replaced != result:
+					# Текст изменился — набор встречающихся вариантов нужно пересобрать
+					result = replaced
+					candidates = _alias_candidates(result)
+					pos = idx + 1
+					break
 
 	# Специальная обработка для числительных с кварталами
-	result = re.sub(r'\b\d+\s+й\s+кв-л-л\b', 'кв-л', result)
-	result = re.sub(r'\b\d+\s+й\s+кв-л\b', 'кв-л', result)
+	result = _QUARTER_LL_RX.sub('кв-л', result)
+	result = _QUARTER_RX.sub('кв-л', result)
 	
 	# Исправляем повторные применения алиаса "кв-л"
-	result = re.sub(r'\bкв-л-л\b', 'кв-л', result)
+	result = _KVL_DUP_RX.sub('кв-л', result)
 	
 	return result
 
 
+# Известные названия улиц, которые содержат числа как часть названия
+STREET_NAMES_WITH_NUMBERS = [
+	"8 марта", "1 мая", "9 января", "7 ноября", "3 декабря", "5 августа", 
+	"2 апреля", "6 марта", "4 июля", "10 октября", "12 декабря", "15 марта",
+	"20 лет октября", "25 лет октября", "30 лет победы", "40 лет победы",
+	"50 лет октября", "60 лет октября", "70 лет октября", "100 лет октября"
+]
+
+# Микрорайоны с названиями улиц: "1 Мая мкр" — это микрорайон, а не улица "1 мая"
+MICRODISTRICT_PATTERNS = [
+	"1 мая мкр", "1 мая мкр.", "1 мая микрорайон", "1 мая мкрн"
+]
+
+# Типы улиц, после которых число считается номером дома
+HOUSE_STREET_TYPES = ['ул', 'пер', 'пр-кт', 'б-р', 'пр-д', 'пл', 'ш', 'наб', 'туп', 'ал', 'дор', 'тракт', 'мост', 'эст', 'п/п', 'съезд', 'заезд', 'подъезд-авт', 'просека', 'просёлок', 'линия', 'ряд', 'кольцо', 'автодорога', 'трасса']
+
+# Прекомпилированные регексы разбора дома/корпуса/строения
+_LATIN_K_RX = re.compile(r'k', re.IGNORECASE)
+_LATIN_C_RX = re.compile(r'c', re.IGNORECASE)
+_KM_ORDINAL_RX = re.compile(r'\b\d+\s*й\s*км\b', re.IGNORECASE)
+# Название улицы с числом -> (название + номер дома после него)
+_STREET_NAME_HOUSE_RXS = {
+	name: re.compile(rf'\b{re.escape(name.lower())}\s+(\d+)\b') for name in STREET_NAMES_WITH_NUMBERS
+}
+_END_NUMBER_RX = re.compile(r'\b(\d+)\s*$')
+_END_NUMBER_STRIP_RX = re.compile(r'\b\d+\s*$')
+# Для каждого типа улицы: "тип число что-то_еще" и компактная форма номера дома "тип 37с5"
+_STREET_TYPE_NUMBER_RXS = [
+	(
+		re.compile(r'\b' + re.escape(st) + r'\.?\s+\d+\s+\w+'),
+		re.compile(r'\b' + re.escape(st) + r'\.?\s+(\d+[кс]\d+)'),
+	)
+	for st in HOUSE_STREET_TYPES
+]
+_ORDINAL_STREET_RX = re.compile(r'(\b\d+\s*(?:й|я|е)\b\s+\w+\s+(?:' + '|'.join([re.escape(st) for st in HOUSE_STREET_TYPES]) + r')\b)', re.IGNORECASE)
+_COMPACT_KORPUS_RX = re.compile(r'(\d)\s*[к]\s*(\d)(?=\s|$)', re.IGNORECASE)
+_COMPACT_STROENIE_RX = re.compile(r'(\d)\s*[с]\s*(\d)(?=\s|$)', re.IGNORECASE)
+_LETTER_DIGIT_RX = re.compile(r'([а-я])\s*(\d)(?=\s|$)', re.IGNORECASE)
+_FRACTION_RX = re.compile(r'(\d+[а-я]?)\s*/\s*(\d+)', re.IGNORECASE)
+_QUARTER_DASH_RX = re.compile(r'\b(\d+)-й\s+кв-л\b')
+_KM_BEFORE_RX = re.compile(r'\b(\d+)[\-–—‑]?й?\s*(?:км|километр)\b', re.IGNORECASE)
+_KM_AFTER_RX = re.compile(r'\b(?:км|километр)\s*(\d+)\b', re.IGNORECASE)
+_KM_ORDINAL_WORD_RX = re.compile(r'\b(\d+)\s+й\s+километр\b', re.IGNORECASE)
+
+# Сложные номера домов с дробью типа "16А/1", "25К1/2"
+_COMPLEX_HOUSE_RX = re.compile(r'\b(\d+[а-я]?/\d+)\b', re.IGNORECASE)
+_STROENIE_TAIL_RX = re.compile(r'\bс\s+(\d+[a-zа-я]?)\b', re.IGNORECASE)
+_OWN_ONLY_RX = re.compile(r'\b' + OWN_ALIAS + r'\s*(\d+[a-zа-я]?)\b', re.IGNORECASE)
+_OWN_COMPACT_RX = re.compile(r'\bвл(\d+[a-zа-я]?)\b', re.IGNORECASE)
+
+
 def extract_house_number(text: str) -> Dict[str, Any]:
 	"""Извлечение номера дома из текста"""
 	# Приводим возможные латинские буквы к русским для единообразия (k->к, c->с)
-	text = re.sub(r'k', 'к', text, flags=re.IGNORECASE)
-	text = re.sub(r'c', 'с', text, flags=re.IGNORECASE)
+	text = _LATIN_K_RX.sub('к', text)
+	text = _LATIN_C_RX.sub('с', text)
 
 	# Обрабатываем запятые как разделители - заменяем на пробелы
-	text = re.sub(r',\s*', ' ', text)
+	text = _COMMA_RX.sub(' ', text)
 
 	# Специальная обработка для километров - не извлекаем как номер дома
-	if re.search(r'\b\d+\s*й\s*км\b', text, flags=re.IGNORECASE):
+	if _KM_ORDINAL_RX.search(text):
 		return {
 			"text_without_house": text,
 			"house_number": None,
@@ -357,41 +495,23 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 			"has_house": False
 		}
 
-	# Специальная обработка для названий улиц с числами
-	# Известные названия улиц, которые содержат числа как часть названия
-	street_names_with_numbers = [
-		"8 марта", "1 мая", "9 января", "7 ноября", "3 декабря", "5 августа", 
-		"2 апреля", "6 марта", "4 июля", "10 октября", "12 декабря", "15 марта",
-		"20 лет октября", "25 лет октября", "30 лет победы", "40 лет победы",
-		"50 лет октября", "60 лет октября", "70 лет октября", "100 лет октября"
-	]
-	
-	# Специальная обработка для микрорайонов с названиями улиц
-	# Если в запросе есть "1 Мая мкр", то это микрорайон, а не улица "1 мая"
-	microdistrict_patterns = [
-		"1 мая мкр", "1 мая мкр.", "1 мая микрорайон", "1 мая мкрн"
-	]
-	
 	# Проверяем, содержит ли текст название улицы с числом
 	# НО НЕ исключаем извлечение номера дома, если после названия улицы есть отдельное число
 	text_lower = text.lower()
 	
 	# Сначала проверяем, есть ли микрорайоны с названиями улиц
-	for microdistrict_pattern in microdistrict_patterns:
+	for microdistrict_pattern in MICRODISTRICT_PATTERNS:
 		if microdistrict_pattern.lower() in text_lower:
 			# Это микрорайон, а не улица - не исключаем извлечение номера дома
 			break
 	else:
 		# Проверяем обычные названия улиц с числами
-		for street_name in street_names_with_numbers:
+		for street_name in STREET_NAMES_WITH_NUMBERS:
 			if street_name.lower() in text_lower:
 				# Проверяем, есть ли после названия улицы отдельное число (номер дома)
 				street_name_pattern = re.escape(street_name.lower())
 				# Ищем паттерн: название улицы + пробел + число (не часть названия)
-				house_number_after_street = re.search(
-					rf'\b{street_name_pattern}\s+(\d+)\b', 
-					text_lower
-				)
+				house_number_after_street = _STREET_NAME_HOUSE_RXS[street_name].search(text_lower)
 				if house_number_after_street:
 					# Есть номер дома после названия улицы - извлекаем его
 					house_number = house_number_after_street.group(1)
@@ -402,7 +522,7 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 						text_lower
 					)
 					return {
-						"text_without_house": re.sub(r'\s+', ' ', text_without_house).strip(),
+						"text_without_house": _SPACES_RX.sub(' ', text_without_house).strip(),
 						"house_number": house_number,
 						"korpus": None,
 						"stroenie": None,
@@ -411,13 +531,13 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 				else:
 					# Проверяем, есть ли отдельное число в конце запроса (например, "17")
 					# Ищем число в конце строки, которое не является частью названия улицы
-					end_number_match = re.search(r'\b(\d+)\s*$', text_lower)
+					end_number_match = _END_NUMBER_RX.search(text_lower)
 					if end_number_match:
 						house_number = end_number_match.group(1)
 						# Удаляем номер дома из текста
-						text_without_house = re.sub(r'\b\d+\s*$', '', text_lower).strip()
+						text_without_house = _END_NUMBER_STRIP_RX.sub('', text_lower).strip()
 						return {
-							"text_without_house": re.sub(r'\s+', ' ', text_without_house).strip(),
+							"text_without_house": _SPACES_RX.sub(' ', text_without_house).strip(),
 							"house_number": house_number,
 							"korpus": None,
 							"stroenie": None,
@@ -426,7 +546,7 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 					else:
 						# Нет отдельного номера дома - не извлекаем
 						return {
-							"text_without_house": re.sub(r'\s+', ' ', text).strip(),
+							"text_without_house": _SPACES_RX.sub(' ', text).strip(),
 							"house_number": None,
 							"korpus": None,
 							"stroenie": None,
@@ -435,19 +555,15 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 
 	# Упрощенная логика: определяем, является ли число номером дома
 	# Основной принцип: если после типа улицы идет число, то это номер дома
-	street_types = ['ул', 'пер', 'пр-кт', 'б-р', 'пр-д', 'пл', 'ш', 'наб', 'туп', 'ал', 'дор', 'тракт', 'мост', 'эст', 'п/п', 'съезд', 'заезд', 'подъезд-авт', 'просека', 'просёлок', 'линия', 'ряд', 'кольцо', 'автодорога', 'трасса']
 	has_street_type_before_number = False
 	
-	# Проверяем, не является ли это числительным с кварталом
-	is_quarter_with_number = bool(re.search(r'\b\d+\s+й\s+кв-л\b', text))
-	
 	# Проверяем, есть ли тип улицы перед числом в середине текста (это не номер дома)
 	# Но исключаем случаи, когда это компактная форма номера дома (например, "37с5")
-	for st in street_types:
+	for street_number_rx, compact_house_rx in _STREET_TYPE_NUMBER_RXS:
 		# Ищем паттерн "тип_улицы число что-то_еще" (не номер дома)
-		if re.search(r'\b' + re.escape(st) + r'\.?\s+\d+\s+\w+', text):
+		if street_number_rx.search(text):
 			# Проверяем, не является ли это компактной формой номера дома
-			match = re.search(r'\b' + re.escape(st) + r'\.?\s+(\d+[кс]\d+)', text)
+			match = compact_house_rx.search(text)
 			if not match:  # Если это не компактная форма, то это не номер дома
 				has_street_type_before_number = True
 				break
@@ -455,10 +571,9 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 	# Исключение порядковых числительных в названии улицы перед типом
 	# Примеры: "3 й новомихалковский пр-д", "1 я тверская ул", "2 е кольцо"
 	# Если перед типом улицы стоит шаблон N й/я/е <слово>, то это часть названия, а не номер дома
-	ordinal_street_pattern = re.compile(r'(\b\d+\s*(?:й|я|е)\b\s+\w+\s+(?:' + '|'.join([re.escape(st) for st in street_types]) + r')\b)', re.IGNORECASE)
-	if ordinal_street_pattern.search(text):
+	if _ORDINAL_STREET_RX.search(text):
 		return {
-			"text_without_house": re.sub(r'\s+', ' ', text).strip(),
+			"text_without_house": _SPACES_RX.sub(' ', text).strip(),
 			"house_number": None,
 			"korpus": None,
 			"stroenie": None,
@@ -468,42 +583,27 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 	# Вставляем пробелы в компактных формах: 49к4 -> 49 к 4, 49с1 -> 49 с 1, 49к4с2 -> 49 к 4 с 2
 	# Делаем несколько проходов, чтобы разорвать обе связки
 	# НО НЕ разрываем слова, где к/с являются частью слова
-	text = re.sub(r'(\d)\s*[к]\s*(\d)(?=\s|$)', r'\1 к \2', text, flags=re.IGNORECASE)
-	text = re.sub(r'(\d)\s*[с]\s*(\d)(?=\s|$)', r'\1 с \2', text, flags=re.IGNORECASE)
+	text = _COMPACT_KORPUS_RX.sub(r'\1 к \2', text)
+	text = _COMPACT_STROENIE_RX.sub(r'\1 с \2', text)
 	
 	# Специальная обработка для случаев типа "33/19с1" - разрываем "с1" на "с 1"
 	# НО НЕ разрываем окончания прилагательных типа "ая", "ой", "ий"
 	# Исключаем случаи, когда после буквы идет цифра, но это не окончание прилагательного
-	text = re.sub(r'([а-я])\s*(\d)(?=\s|$)', r'\1 \2', text, flags=re.IGNORECASE)
+	text = _LETTER_DIGIT_RX.sub(r'\1 \2', text)
 	
 	# Специальная обработка для сложных номеров домов типа "16А/1", "25К1/2"
 	# Сохраняем оригинальный номер дома с дробью как единое целое
-	text = re.sub(r'(\d+[а-я]?)\s*/\s*(\d+)', r'\1/\2', text, flags=re.IGNORECASE)
+	text = _FRACTION_RX.sub(r'\1/\2', text)
 	
 	# Специальная обработка для числительных с кварталами - не считать их номером дома
-	text = re.sub(r'\b(\d+)-й\s+кв-л\b', r'\1 й кв-л', text)
+	text = _QUARTER_DASH_RX.sub(r'\1 й кв-л', text)
 
 	# Маскируем километраж, чтобы не принять его за номер дома: "65-й километр", "65 км", "километр 65"
 	text_km_safe = text
-	text_km_safe = re.sub(r'\b(\d+)[\-–—‑]?й?\s*(?:км|километр)\b', ' километр ', text_km_safe, flags=re.IGNORECASE)
-	text_km_safe = re.sub(r'\b(?:км|километр)\s*(\d+)\b', ' километр ', text_km_safe, flags=re.IGNORECASE)
+	text_km_safe = _KM_BEFORE_RX.sub(' километр ', text_km_safe)
+	text_km_safe = _KM_AFTER_RX.sub(' километр ', text_km_safe)
 	# Специальная обработка для случаев типа "69 й километр" (после нормализации числительных)
-	text_km_safe = re.sub(r'\b(\d+)\s+й\s+километр\b', ' километр ', text_km_safe, flags=re.IGNORECASE)
-
-	# Алиасы
-	corp_alias = r'(?:корпус|корп|кор\.?|к)'
-	bldg_alias = r'(?:строение|стр\.?|с)'
-	house_alias = r'(?:дом|д)'
-	# Также поддержим «владение» как синоним строения для фильтрации
-	own_alias = r'(?:владение|влад\.?|вл)'
-
-	# Шаблоны для поиска номера дома в любом месте строки. Поддерживаются разные порядки (корп/стр меняются местами)
-	base_num = r'(?:' + house_alias + r'\.?\s*)?(\d+[абвгдежзийклмнопрстуфхцчшщъыьэюя]?)'
-	corp_num = r'(?:\s*(?:' + corp_alias + r')\.?\s*(\d+[абвгдежзийклмнопрстуфхцчшщъыьэюя]?))'
-	bldg_num = r'(?:\s*(?:' + bldg_alias + r'|' + own_alias + r')\.?\s*(\d+[абвгдежзийклмнопрстуфхцчшщъыьэюя]?))'
-
-	pattern1 = re.compile(r'\b' + base_num + r'(?:' + corp_num + r')?(?:' + bldg_num + r')?', re.IGNORECASE)
-	pattern2 = re.compile(r'\b' + base_num + r'(?:' + bldg_num + r')?(?:' + corp_num + r')?', re.IGNORECASE)
+	text_km_safe = _KM_ORDINAL_WORD_RX.sub(' километр ', text_km_safe)
 
 	# Если обнаружен тип улицы перед числом, не ищем номер дома
 	if has_street_type_before_number:
@@ -516,8 +616,7 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 		}
 	
 	# Специальная обработка для сложных номеров домов с дробью типа "16А/1", "25К1/2"
-	complex_house_pattern = re.compile(r'\b(\d+[а-я]?/\d+)\b', re.IGNORECASE)
-	complex_match = complex_house_pattern.search(text_km_safe)
+	complex_match = _COMPLEX_HOUSE_RX.search(text_km_safe)
 	if complex_match:
 		house_num = complex_match.group(1)
 		matched_fragment = complex_match.group(0)
@@ -529,17 +628,17 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 			text_without_house = (text[:start_idx] + ' ' + text[end_idx:]).strip()
 		else:
 			text_without_house = text
-		text_without_house = re.sub(r'\s+', ' ', text_without_house)
+		text_without_house = _SPACES_RX.sub(' ', text_without_house)
 		
 		# Дополнительно ищем строение в оставшемся тексте
-		stroenie_match = re.search(r'\bс\s+(\d+[a-zа-я]?)\b', text_without_house, flags=re.IGNORECASE)
+		stroenie_match = _STROENIE_TAIL_RX.search(text_without_house)
 		stroenie = None
 		if stroenie_match:
 			stroenie = stroenie_match.group(1)
 			# Удаляем строение из текста
 			s, e = stroenie_match.span()
 			text_without_house = (text_without_house[:s] + ' ' + text_without_house[e:]).strip()
-			text_without_house = re.sub(r'\s+', ' ', text_without_house)
+			text_without_house = _SPACES_RX.sub(' ', text_without_house)
 		
 		return {
 			"text_without_house": text_without_house,
@@ -552,11 +651,12 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 	# Находим все совпадения и берем самое правое
 	match = None
 	last_end = -1
-	for m in pattern1.finditer(text_km_safe):
+	# Шаблоны общие с ETL (api/house_parser.py): дом в запросе и в индексе разбирается одинаково
+	for m in HOUSE_PATTERN1.finditer(text_km_safe):
 		if m.end() > last_end:
 			match = m
 			last_end = m.end()
-	for m in pattern2.finditer(text_km_safe):
+	for m in HOUSE_PATTERN2.finditer(text_km_safe):
 		if m.end() > last_end:
 			match = m
 			last_end = m.end()
@@ -579,7 +679,7 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 			text_without_house = (text[:start_idx] + ' ' + text[end_idx:]).strip()
 		else:
 			text_without_house = text
-		text_without_house = re.sub(r'\s+', ' ', text_without_house)
+		text_without_house = _SPACES_RX.sub(' ', text_without_house)
 		
 		return {
 			"text_without_house": text_without_house,
@@ -590,11 +690,11 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 		}
 	
 	# Фоллбек: если дом не найден, но указано владение (вл/влад/владение N) — интерпретируем как строение
-	own_only = re.search(r'\b(?:владение|влад\.?|вл)\s*(\d+[a-zа-я]?)\b', text, flags=re.IGNORECASE)
+	own_only = _OWN_ONLY_RX.search(text)
 	if own_only:
 		s, e = own_only.span()
 		text_wo = (text[:s] + ' ' + text[e:]).strip()
-		text_wo = re.sub(r'\s+', ' ', text_wo)
+		text_wo = _SPACES_RX.sub(' ', text_wo)
 		return {
 			"text_without_house": text_wo,
 			"house_number": None,
@@ -604,11 +704,11 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 		}
 	
 	# Специальная обработка для компактных форм владения типа "вл10"
-	own_compact = re.search(r'\bвл(\d+[a-zа-я]?)\b', text, flags=re.IGNORECASE)
+	own_compact = _OWN_COMPACT_RX.search(text)
 	if own_compact:
 		s, e = own_compact.span()
 		text_wo = (text[:s] + ' ' + text[e:]).strip()
-		text_wo = re.sub(r'\s+', ' ', text_wo)
+		text_wo = _SPACES_RX.sub(' ', text_wo)
 		return {
 			"text_without_house": text_wo,
 			"house_number": None,
@@ -618,11 +718,11 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 		}
 	
 	# Специальная обработка для случаев типа "33/19с1" - если в тексте осталось "с N", интерпретируем как строение
-	stroenie_match = re.search(r'\bс\s+(\d+[a-zа-я]?)\b', text, flags=re.IGNORECASE)
+	stroenie_match = _STROENIE_TAIL_RX.search(text)
 	if stroenie_match:
 		s, e = stroenie_match.span()
 		text_wo = (text[:s] + ' ' + text[e:]).strip()
-		text_wo = re.sub(r'\s+', ' ', text_wo)
+		text_wo = _SPACES_RX.sub(' ', text_wo)
 		return {
 			"text_without_house": text_wo,
 			"house_number": None,
@@ -640,8 +740,144 @@ def extract_house_number(text: str) -> Dict[str, Any]:
 	}
 
 
+# Регион/город в исходном запросе: один проход вместо отдельного поиска на каждый флаг
+_REGION_FLAGS_RX = re.compile(
+	r'\b(?:(?P<has_moscow>москва)'
+	r'|(?P<has_moscow_region>московская\s+область)'
+	r'|(?P<has_balashikha>балашиха)'
+	r'|(?P<has_leningrad_region>ленинградская\s+(?:область|обл\.?)))\b',
+	re.IGNORECASE
+)
+_MOSCOW_RX = re.compile(r'\bмосква\b', re.IGNORECASE)
+
+# Типы улиц, которые переносятся из начала названия ("ул большая дмитровка" -> "дмитровка большая")
+_LEADING_STREET_TYPES = {"ул", "пер", "пр-кт", "б-р", "пр-д", "пл", "ш", "наб", "туп", "ал", "дор", "тракт", "мост", "эст", "п/п", "линия", "ряд", "кольцо", "автодорога", "трасса"}
+
+# Алиасы в названии улицы
+_ALIAS_KEYWORDS = {"большая", "малая", "средняя", "новая", "старая", "верхняя", "нижняя", "восточная", "западная", "северная", "южная", "центральная", "промышленная", "строительная", "железнодорожная", "красная", "советская", "комсомольская", "пионерская", "октябрьская", "молодежная", "школьная"}
+
+# Числительные в названии улицы
+_NUMERICAL_KEYWORDS = {"первой", "второй", "третьей", "четвертой", "пятой", "шестой", "седьмой", "восьмой", "девятой", "десятой", "одиннадцатой", "двенадцатой", "тринадцатой", "четырнадцатой", "пятнадцатой", "шестнадцатой", "семнадцатой", "восемнадцатой", "девятнадцатой", "двадцатой", "первого", "второго", "третьего", "четвертого", "пятого", "шестого", "седьмого", "восьмого", "девятого", "десятого", "одиннадцатого", "двенадцатого", "тринадцатого", "четырнадцатого", "пятнадцатого", "шестнадцатого", "семнадцатого", "восемнадцатого", "девятнадцатого", "двадцатого"}
+
+_QUARTER_REST_RX = re.compile(r'\bй\s+кв-л-л\b')
+
+# Размер LRU-кэша нормализованных запросов (повторяющиеся запросы не нормализуются заново)
+NORMALIZE_CACHE_SIZE = 8192
+
+
+def _region_flags(query: str) -> Dict[str, bool]:
+	"""Флаги регионов по исходному запросу"""
+	flags = {
+		"has_moscow": False,
+		"has_moscow_region": False,
+		"has_balashikha": False,
+		"has_leningrad_region": False
+	}
+	for m in _REGION_FLAGS_RX.finditer(query):
+		flags[m.lastgroup] = True
+	return flags
+
+
+def _reorder_leading_street_type(text_normalized: str) -> str:
+	"""Специальная обработка для запросов с типом улицы в начале и алиасами.
+	Например, "ул большая дмитровка" -> "дмитровка большая"
+	"""
+	tokens = text_normalized.split()
+	if len(tokens) >= 3 and tokens[0] in _LEADING_STREET_TYPES:
+		street_name_tokens = tokens[1:]
+		if len(street_name_tokens) == 2 and street_name_tokens[0] in _ALIAS_KEYWORDS:
+			# Переставляем слова: "ул большая дмитровка" -> "дмитровка большая" (без типа улицы)
+			return f"{street_name_tokens[1]} {street_name_tokens[0]}"
+		elif len(street_name_tokens) == 2 and street_name_tokens[0] in _NUMERICAL_KEYWORDS:
+			# Переставляем слова: "ал первой маевки" -> "маевки первой" (без типа улицы)
+			return f"{street_name_tokens[1]} {street_name_tokens[0]}"
+	return text_normalized
+
+
+def _strip_house_leftovers(text: str) -> str:
+	"""Хвосты разбора дома в тексте, который уже прошёл normalize_text: точки, пунктуация, пробелы.
+	Для такого текста совпадает с normalize_text (регистр, ё, запятые и числительные уже приведены).
+	"""
+	text = _TRAILING_DOT_RX.sub(' ', text)
+	text = _DOT_SPACE_RX.sub(' ', text)
+	text = _PUNCT_RX.sub(' ', text)
+	return _SPACES_RX.sub(' ', text).strip()
+
+
+def _cleanup_quarters(text_normalized: str) -> str:
+	"""Специальная обработка для числительных с кварталами в тексте без дома"""
+	text_normalized = _QUARTER_LL_RX.sub('кв-л', text_normalized)
+	text_normalized = _QUARTER_RX.sub('кв-л', text_normalized)
+	# Дополнительная очистка от остатков "й кв-л-л"
+	text_normalized = _QUARTER_REST_RX.sub('кв-л', text_normalized)
+	# Исправляем повторные применения алиаса "кв-л"
+	return _KVL_DUP_RX.sub('кв-л', text_normalized)
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize_query_cached(query: str):
+	"""Конвейер нормализации непустого запроса. Результат неизменяемый (кортеж пар).
+	Стадии замеряются (api/timing.py) только при промахе кэша — при попадании их нет.
+	"""
+	lap = laps("normalize")
+	# 1) Базовая нормализация — один раз на запрос, дальше работаем с её результатом
+	normalized = normalize_text(query)
+	lap("normalize_text")
+
+	# 2) Флаги регионов по исходному запросу
+	flags = _region_flags(query)
+
+	# Удаляем "москва" из запроса для поиска (но сохраняем в оригинале для фильтрации)
+	if flags["has_moscow"] or 'москва' in normalized:
+		normalized_for_search = _MOSCOW_RX.sub('', normalized).strip()
+		normalized_for_search = _SPACES_RX.sub(' ', normalized_for_search).strip(' ,')
+	else:
+		normalized_for_search = normalized
+	
+	# Если после удаления "москва" строка стала пустой, вернем оригинал
+	if not normalized_for_search:
+		normalized_for_search = normalized
+	
+	lap("region_flags")
+	
+	# 3) Извлечение номера дома (из текста без "москва")
+	house_info = extract_house_number(normalized_for_search)
+	lap("house_number")
+	
+	# 4) Алиасы типов: к полному тексту и к тексту без дома.
+	# Текст без дома получен из уже нормализованного — повторный normalize_text не нужен,
+	# достаточно убрать оставшиеся от разбора дома точки и пунктуацию.
+	# Алиасы до разбора дома применять нельзя: «д», «с», «к» после них уже не номер дома.
+	text_without_house = _strip_house_leftovers(house_info["text_without_house"])
+	aliased = apply_type_aliases(normalized)
+	text_normalized = aliased if text_without_house == normalized else apply_type_aliases(text_without_house)
+	normalized = aliased
+	lap("type_aliases")
+	
+	# 5) Перестановки и чистка кварталов
+	text_normalized = _cleanup_quarters(_reorder_leading_street_type(text_normalized))
+	lap("cleanup")
+	
+	return (
+		("original", query),
+		("normalized", normalized),
+		("text_without_house", text_normalized),
+		("house_number", house_info["house_number"]),
+		("korpus", house_info["korpus"]),
+		("stroenie", house_info["stroenie"]),
+		("has_house", house_info["has_house"]),
+		("has_moscow", flags["has_moscow"]),
+		("has_moscow_region", flags["has_moscow_region"]),
+		("has_balashikha", flags["has_balashikha"]),
+		("has_leningrad_region", flags["has_leningrad_region"])
+	)
+
+
 def normalize_query(query: str) -> Dict[str, Any]:
-	"""Полная нормализация поискового запроса"""
+	"""Полная нормализация поискового запроса.
+	Результаты кэшируются в ограниченном LRU по исходной строке запроса;
+	вызывающая сторона получает собственную копию словаря.
+	"""
 	if not query:
 		return {
 			"original": "",
@@ -654,77 +890,4 @@ def normalize_query(query: str) -> Dict[str, Any]:
 			"has_moscow": False
 		}
 	
-	# Базовая нормализация
-	normalized = normalize_text(query)
-	
-	# Проверяем, есть ли "москва" в исходном запросе
-	has_moscow = bool(re.search(r'\bмосква\b', query, flags=re.IGNORECASE))
-	
-	# Проверяем, есть ли "московская область" в исходном запросе
-	has_moscow_region = bool(re.search(r'\bмосковская\s+область\b', query, flags=re.IGNORECASE))
-	
-	# Проверяем, есть ли "балашиха" в исходном запросе
-	has_balashikha = bool(re.search(r'\bбалашиха\b', query, flags=re.IGNORECASE))
-	
-	# Проверяем, есть ли "ленинградская область" в исходном запросе
-	has_leningrad_region = bool(re.search(r'\bленинградская\s+(область|обл\.?)\b', query, flags=re.IGNORECASE))
-	
-	# Удаляем "москва" из запроса для поиска (но сохраняем в оригинале для фильтрации)
-	normalized_for_search = re.sub(r'\bмосква\b', '', normalized, flags=re.IGNORECASE).strip()
-	normalized_for_search = re.sub(r'\s+', ' ', normalized_for_search).strip(' ,')
-	
-	# Если после удаления "москва" строка стала пустой, вернем оригинал
-	if not normalized_for_search:
-		normalized_for_search = normalized
-	
-	# Извлечение номера дома (из текста без "москва")
-	house_info = extract_house_number(normalized_for_search)
-	
-	# Применяем алиасы типов к полному тексту
-	normalized = apply_type_aliases(normalized)
-	
-	# Нормализация текста без дома (также без "москва")
-	text_normalized = normalize_text(house_info["text_without_house"])
-	# Применяем алиасы типов к тексту без дома
-	text_normalized = apply_type_aliases(text_normalized)
-	
-	# Специальная обработка для запросов с типом улицы в начале и алиасами
-	# Например, "ул большая дмитровка" -> "дмитровка большая ул"
-	tokens = text_normalized.split()
-	if len(tokens) >= 3 and tokens[0] in ["ул", "пер", "пр-кт", "б-р", "пр-д", "пл", "ш", "наб", "туп", "ал", "дор", "тракт", "мост", "эст", "п/п", "линия", "ряд", "кольцо", "автодорога", "трасса"]:
-		street_type = tokens[0]
-		street_name_tokens = tokens[1:]
-		
-		# Проверяем, есть ли алиасы в названии улицы
-		alias_keywords = {"большая", "малая", "средняя", "новая", "старая", "верхняя", "нижняя", "восточная", "западная", "северная", "южная", "центральная", "промышленная", "строительная", "железнодорожная", "красная", "советская", "комсомольская", "пионерская", "октябрьская", "молодежная", "школьная"}
-		
-		# Проверяем, есть ли числительные в названии улицы
-		numerical_keywords = {"первой", "второй", "третьей", "четвертой", "пятой", "шестой", "седьмой", "восьмой", "девятой", "десятой", "одиннадцатой", "двенадцатой", "тринадцатой", "четырнадцатой", "пятнадцатой", "шестнадцатой", "семнадцатой", "восемнадцатой", "девятнадцатой", "двадцатой", "первого", "второго", "третьего", "четвертого", "пятого", "шестого", "седьмого", "восьмого", "девятого", "десятого", "одиннадцатого", "двенадцатого", "тринадцатого", "четырнадцатого", "пятнадцатого", "шестнадцатого", "семнадцатого", "восемнадцатого", "девятнадцатого", "двадцатого"}
-		
-		if len(street_name_tokens) == 2 and street_name_tokens[0] in alias_keywords:
-			# Переставляем слова: "ул большая дмитровка" -> "дмитровка большая" (без типа улицы)
-			text_normalized = f"{street_name_tokens[1]} {street_name_tokens[0]}"
-		elif len(street_name_tokens) == 2 and street_name_tokens[0] in numerical_keywords:
-			# Переставляем слова: "ал первой маевки" -> "маевки первой" (без типа улицы)
-			text_normalized = f"{street_name_tokens[1]} {street_name_tokens[0]}"
-	# Специальная обработка для числительных с кварталами в тексте без дома
-	text_normalized = re.sub(r'\b\d+\s+й\s+кв-л-л\b', 'кв-л', text_normalized)
-	text_normalized = re.sub(r'\b\d+\s+й\s+кв-л\b', 'кв-л', text_normalized)
-	# Дополнительная очистка от остатков "й кв-л-л"
-	text_normalized = re.sub(r'\bй\s+кв-л-л\b', 'кв-л', text_normalized)
-	# Исправляем повторные применения алиаса "кв-л"
-	text_normalized = re.sub(r'\bкв-л-л\b', 'кв-л', text_normalized)
-	
-	return {
-		"original": query,
-		"normalized": normalized,
-		"text_without_house": text_normalized,
-		"house_number": house_info["house_number"],
-		"korpus": house_info["korpus"],
-		"stroenie": house_info["stroenie"],
-		"has_house": house_info["has_house"],
-		"has_moscow": has_moscow,
-		"has_moscow_region": has_moscow_region,
-		"has_balashikha": has_balashikha,
-		"has_leningrad_region": has_leningrad_region
-	}
+	return dict(_normalize_query_cached(query))
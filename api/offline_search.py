@@ -0,0 +1,417 @@
+"""
+Поиск адресов без Elasticsearch: файл офлайн-индекса, отображённый в память (api/mapped_file.py).
+
+ETL пишет индекс из выгрузки (write_offline_index):
+- столбцы документов: id, full_norm, geo, уровень, регион и прочие поля _source компактным JSON;
+- обратный индекс по токенам канонической формы full_norm (canonical_full) для «мест» —
+  регионов, городов, улиц, а также родителей домов, которых нет среди документов
+  (например, кварталов): их full_norm — full_norm дома без последнего сегмента;
+- таблица домов каждого места, отсортированная по ключу (дом, корпус, строение).
+
+OfflineSearchService — тот же интерфейс, что у SearchService: место выбирается по сумме idf
+совпавших токенов запроса за вычетом несовпавших токенов собственного названия места,
+дом — точным поиском ключа в таблице домов лучших мест.
+"""
+import json
+import math
+import re
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from .house_lookup import house_key as base_house_key, parent_full_norm
+from .mapped_file import BytesColumn, MappedFile, bytes_column, write_mapped_file
+from .models import AddressItem
+from .query_plan import canonical_full
+from .result_cache import ResultCache
+from .search import SearchService
+from .timing import BRANCH_CACHE, BRANCH_NONE, record_branch, stage
+
+OFFLINE_MAGIC = b"FIASOFF1"
+OFFLINE_VERSION = 1
+# Коды уровней в столбце level; VIRTUAL — место без собственного документа (родитель домов)
+LEVEL_CODES = {"region": 0, "city": 1, "street": 2, "house": 3}
+LEVEL_BY_CODE = {code: level for level, code in LEVEL_CODES.items()}
+VIRTUAL = 255
+NO_REGION = 0xFFFF
+# Поля _source, которые хранятся в JSON-столбце details (остальные — отдельными столбцами)
+DETAIL_FIELDS = ("name_norm", "name_exact", "type_norm", "house_number", "korpus", "stroenie")
+# Разделитель частей ключа дома: меньше любого печатного символа, поэтому «46» идёт раньше «46 к 2»
+HOUSE_KEY_SEP = "\x1f"
+# Кандидаты-места: постинги самого редкого токена запроса и следующих, пока их не больше этого предела
+CANDIDATE_LIMIT = 2000
+# Вес совпадения токена в собственном названии места (последний сегмент full_norm)
+NAME_WEIGHT = 2.0
+# Префикс токенов названия места в словаре: те же токены, отдельные постинги
+NAME_PREFIX = "\x01"
+# Постинги не длиннее стольких кандидатов проходятся целиком, длиннее — бинарным поиском
+POSTINGS_WALK_RATIO = 16
+# Сколько лучших по совпадениям кандидатов переоцениваются с учётом их собственного названия
+RESCORE_TOP = 200
+# Дом ищется в местах, набравших не меньше этой доли лучшей оценки
+HOUSE_PLACE_RATIO = 0.75
+# Регион по флагам normalize_query — как фильтры region_code в QueryPlanCompiler
+REGION_FLAGS = (("has_moscow", "77"), ("has_moscow_region", "50"), ("has_balashikha", "50"), ("has_leningrad_region", "47"))
+
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+
+
+def offline_tokens(text: Optional[str]) -> List[str]:
+    """Токены канонической формы текста (одна функция для документов и запросов)"""
+    return _TOKEN_RE.findall(canonical_full(text) or "")
+
+
+def house_key(house_number: str, korpus: Optional[str] = None, stroenie: Optional[str] = None) -> bytes:
+    return base_house_key(house_number, korpus, stroenie, sep=HOUSE_KEY_SEP).encode("utf-8")
+
+
+def write_offline_index(path: str, sources: Iterable[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """Офлайн-индекс из пар (id, документ) выгрузки"""
+    regions: Dict[str, int] = {}
+    # Столбцы мест (строки 0..P-1); дома копятся отдельно и идут после мест
+    ids: List[bytes] = []
+    full_norms: List[bytes] = []
+    details: List[bytes] = []
+    levels = array("B")
+    region_ids = array("H")
+    geo = array("d")
+    place_by_full_norm: Dict[str, int] = {}
+    postings: Dict[str, array] = {}
+    houses: List[Tuple[str, bytes, bytes, bytes, bytes, int, float, float]] = []
+
+    def region_id(source: Dict[str, Any]) -> int:
+        code = source.get("region_code")
+        return NO_REGION if code is None else regions.setdefault(str(code), len(regions))
+
+    def point(source: Dict[str, Any]) -> Tuple[float, float]:
+        g = source.get("geo")
+        return (float(g["lat"]), float(g["lon"])) if g else (math.nan, math.nan)
+
+    def add_place(doc_id: str, full_norm: str, level: int, region: int, lat: float, lon: float, detail: bytes) -> None:
+        row = len(levels)
+        ids.append(doc_id.encode("utf-8"))
+        full_norms.append(full_norm.encode("utf-8"))
+        details.append(detail)
+        levels.append(level)
+        region_ids.append(region)
+        geo.extend((lat, lon))
+        place_by_full_norm.setdefault(full_norm, row)
+        for token in set(offline_tokens(full_norm)):
+            postings.setdefault(token, array("I")).append(row)
+        for token in set(offline_tokens(full_norm.rsplit(",", 1)[-1])):
+            postings.setdefault(NAME_PREFIX + token, array("I")).append(row)
+
+    def detail_json(source: Dict[str, Any]) -> bytes:
+        return json.dumps(
+            {k: source[k] for k in DETAIL_FIELDS if source.get(k) is not None},
+            ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    for doc_id, source in sources:
+        full_norm = source.get("full_norm") or ""
+        if source["level"] == "house":
+            lat, lon = point(source)
+            houses.append((
+                parent_full_norm(full_norm),
+                house_key(source.get("house_number") or source.get("name_norm"), source.get("korpus"), source.get("stroenie")),
+                str(doc_id).encode("utf-8"), full_norm.encode("utf-8"), detail_json(source),
+                region_id(source), lat, lon
+            ))
+        elif source["level"] in LEVEL_CODES:
+            add_place(str(doc_id), full_norm, LEVEL_CODES[source["level"]], region_id(source), *point(source), detail_json(source))
+
+    # Родители домов, которых нет среди документов, становятся виртуальными местами
+    for parent, _, _, _, _, region, _, _ in houses:
+        if parent not in place_by_full_norm:
+            add_place("", parent, VIRTUAL, region, math.nan, math.nan, b"{}")
+    places = len(levels)
+
+    houses.sort(key=lambda h: (place_by_full_norm[h[0]], h[1]))
+    house_start = array("I", [0] * (places + 1))
+    for parent, _, _, _, _, _, _, _ in houses:
+        house_start[place_by_full_norm[parent] + 1] += 1
+    for row in range(places):
+        house_start[row + 1] += house_start[row]
+    for _, _, doc_id, full_norm, detail, region, lat, lon in houses:
+        ids.append(doc_id)
+        full_norms.append(full_norm)
+        details.append(detail)
+        levels.append(LEVEL_CODES["house"])
+        region_ids.append(region)
+        geo.extend((lat, lon))
+
+    vocabulary = sorted(postings)
+    posting_offsets = array("Q", [0])
+    all_postings = array("I")
+    for token in vocabulary:
+        all_postings.extend(postings.pop(token))
+        posting_offsets.append(len(all_postings))
+
+    sections = (
+        bytes_column("ids", ids) + bytes_column("full_norm", full_norms) + bytes_column("details", details)
+        + [("level", levels), ("region", region_ids), ("geo", geo), ("house_start", house_start)]
+        + bytes_column("house_keys", (h[1] for h in houses))
+        + bytes_column("vocabulary", (t.encode("utf-8") for t in vocabulary))
+        + [("postings", all_postings), ("posting_offsets", posting_offsets)]
+    )
+    return write_mapped_file(path, OFFLINE_MAGIC, {
+        "version": OFFLINE_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "generation": f"offline-{time.time_ns()}",
+        "places": places,
+        "houses": len(houses),
+        "tokens": len(vocabulary),
+        "regions": sorted(regions, key=regions.get),
+    }, sections)
+
+
+class OfflineIndex:
+    """Офлайн-индекс из write_offline_index (только чтение, mmap): общий для всех воркеров"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = MappedFile(path, OFFLINE_MAGIC, OFFLINE_VERSION)
+        self.header = self.file.header
+        self.places = self.header["places"]
+        self.ids = BytesColumn(self.file, "ids")
+        self.full_norms = BytesColumn(self.file, "full_norm")
+        self.details = BytesColumn(self.file, "details")
+        self.levels = self.file.section("level", "B")
+        self.regions = self.file.section("region", "H")
+        self.geo = self.file.section("geo", "d")
+        self.house_start = self.file.section("house_start", "I")
+        self.house_keys = BytesColumn(self.file, "house_keys")
+        self.vocabulary = BytesColumn(self.file, "vocabulary")
+        self.postings = self.file.section("postings", "I")
+        self.posting_offsets = self.file.section("posting_offsets", "Q")
+        self.region_ids = {code: n for n, code in enumerate(self.header["regions"])}
+
+    def token_postings(self, token: str) -> Optional[memoryview]:
+        """Отсортированные номера мест с токеном (None — токена нет в индексе)"""
+        key = token.encode("utf-8")
+        i = bisect_left(self.vocabulary, key)
+        if i == len(self.vocabulary) or self.vocabulary[i] != key:
+            return None
+        return self.postings[self.posting_offsets[i]:self.posting_offsets[i + 1]]
+
+    def source(self, row: int) -> Dict[str, Any]:
+        """_source документа строки в том же виде, что хранит ES"""
+        source = json.loads(self.details[row])
+        source["level"] = LEVEL_BY_CODE[self.levels[row]]
+        source["full_norm"] = self.full_norms[row].decode("utf-8")
+        region = self.regions[row]
+        if region != NO_REGION:
+            source["region_code"] = self.header["regions"][region]
+        lat, lon = self.geo[2 * row], self.geo[2 * row + 1]
+        if not math.isnan(lat):
+            source["geo"] = {"lat": lat, "lon": lon}
+        return source
+
+    def hit(self, row: int, score: float) -> Dict[str, Any]:
+        return {"_id": self.ids[row].decode("utf-8"), "_score": score, "_source": self.source(row)}
+
+    def _stats(self, tokens: Iterable[str], prefix: str = "") -> List[Tuple[int, str, memoryview]]:
+        """(df, токен, постинги) токенов, найденных в индексе, — по возрастанию df"""
+        stats = []
+        for token in tokens:
+            post = self.token_postings(prefix + token)
+            if post is not None:
+                stats.append((len(post), token, post))
+        stats.sort(key=lambda s: s[0])
+        return stats
+
+    def _idf(self, df: int) -> float:
+        return math.log(1 + self.places / df)
+
+    def rank_places(self, query: str, region_code: Optional[str] = None) -> List[Tuple[float, float, int]]:
+        """Места по убыванию оценки: (оценка, оценка совпадений без штрафа, строка)"""
+        tokens = set(offline_tokens(query))
+        full_stats = self._stats(tokens)
+        if not full_stats:
+            return []
+        name_stats = self._stats(tokens, NAME_PREFIX)
+
+        # Кандидаты — места, в названии которых есть редкие токены запроса (иначе — в full_norm);
+        # частые токены («ул», «г») только участвуют в оценке
+        candidates = set()
+        for df, _, post in name_stats or full_stats:
+            if candidates and len(candidates) + df > CANDIDATE_LIMIT:
+                break
+            candidates.update(post)
+        if region_code is not None:
+            region = self.region_ids.get(str(region_code))
+            candidates = {row for row in candidates if self.regions[row] == region}
+
+        # Совпадение в названии места весит больше, чем в родительских сегментах (как name_norm и full_norm в ES)
+        weighted = [(self._idf(df), post) for df, _, post in full_stats]
+        weighted += [(self._idf(df) * NAME_WEIGHT, post) for df, _, post in name_stats]
+        scores = dict.fromkeys(candidates, 0.0)
+        for weight, post in weighted:
+            if len(post) <= len(scores) * POSTINGS_WALK_RATIO:
+                # Короткие постинги дешевле пройти целиком
+                for row in post:
+                    if row in scores:
+                        scores[row] += weight
+            else:
+                # Длинные («ул») — бинарный поиск каждого кандидата
+                for row in scores:
+                    i = bisect_left(post, row)
+                    if i < len(post) and post[i] == row:
+                        scores[row] += weight
+        scored = sorted(((score, row) for row, score in scores.items()), key=lambda s: -s[0])
+
+        # Штраф за токены собственного названия места, которых нет в запросе:
+        # "тверская ул" не должна уступать "тверская-ямская 1-я ул"
+        ranked = []
+        for matched, row in scored[:RESCORE_TOP]:
+            full_norm = self.full_norms[row].decode("utf-8")
+            missing = set(offline_tokens(full_norm.rsplit(",", 1)[-1])) - tokens
+            penalty = sum(self._idf(df) for df, _, _ in self._stats(missing, NAME_PREFIX))
+            ranked.append((matched - penalty, matched, -len(full_norm), row))
+        ranked.sort(reverse=True)
+        return [(score, matched, row) for score, matched, _, row in ranked]
+
+    def find_house(self, place: int, key: bytes, number_prefix: bytes, tokens: set) -> Tuple[Optional[int], bool]:
+        """Дом места: (строка, точное совпадение ключа). Без точного совпадения — дом с тем же номером,
+        у которого больше общих с запросом токенов (корпус мог остаться в тексте запроса)
+        """
+        lo, hi = self.house_start[place], self.house_start[place + 1]
+        if lo == hi:
+            return None, False
+        i = bisect_left(self.house_keys, key, lo, hi)
+        if i < hi and self.house_keys[i] == key:
+            return self.places + i, True
+        best, best_overlap = None, -math.inf
+        i = bisect_left(self.house_keys, number_prefix, lo, hi)
+        while i < hi and self.house_keys[i].startswith(number_prefix):
+            parts = self.house_keys[i].decode("utf-8").split(HOUSE_KEY_SEP)
+            overlap = len(tokens.intersection(parts[1:])) - sum(1 for part in parts[1:] if part)
+            if overlap > best_overlap:
+                best, best_overlap = self.places + i, overlap
+            i += 1
+        return best, False
+
+    def search(
+        self,
+        query: str,
+        house_number: Optional[str] = None,
+        korpus: Optional[str] = None,
+        stroenie: Optional[str] = None,
+        limit: int = 10,
+        region_code: Optional[str] = None,
+        full_phrase: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Хиты в формате ответа ES (_id, _score, _source)"""
+        ranked = self.rank_places(query, region_code)
+        if not ranked:
+            return []
+        hits: List[Dict[str, Any]] = []
+        if house_number:
+            key = house_key(house_number, korpus, stroenie)
+            number_prefix = (house_number + HOUSE_KEY_SEP).lower().encode("utf-8")
+            tokens = set(offline_tokens(query)) | set(offline_tokens(full_phrase))
+            threshold = max(matched for _, matched, _ in ranked) * HOUSE_PLACE_RATIO
+            exact, approximate = [], []
+            for score, matched, place in ranked:
+                if matched < threshold:
+                    continue
+                row, is_exact = self.find_house(place, key, number_prefix, tokens)
+                if row is not None:
+                    (exact if is_exact else approximate).append(self.hit(row, score))
+            hits = (exact + approximate)[:limit]
+        # Без дома (или дом не найден) — сами места; виртуальные места не возвращаются
+        for score, _, place in ranked:
+            if len(hits) >= limit:
+                break
+            if self.levels[place] != VIRTUAL:
+                hits.append(self.hit(place, score))
+        return hits
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class OfflineSearchService(SearchService):
+    """Реализация интерфейса SearchService поверх OfflineIndex (SEARCH_BACKEND=offline).
+    Разбор запроса, кэш результатов и формирование ответа — общие с поиском в ES.
+    """
+
+    def __init__(self, index: OfflineIndex, result_cache: Optional[ResultCache] = None):
+        super().__init__(None, index.path, result_cache)
+        self.offline = index
+
+    def _search_sync(
+        self,
+        query: str,
+        house_number: Optional[str] = None,
+        korpus: Optional[str] = None,
+        stroenie: Optional[str] = None,
+        limit: int = 10,
+        full_phrase: Optional[str] = None,
+        expanded_phrase: Optional[str] = None,
+        has_moscow: bool = False,
+        has_moscow_region: bool = False,
+        has_balashikha: bool = False,
+        has_leningrad_region: bool = False,
+        original_query: Optional[str] = None
+    ) -> List[AddressItem]:
+        """Синхронный поиск по офлайн-индексу"""
+        if not query.strip():
+            return []
+
+        if self.cache is not None:
+            cache_key = ResultCache.make_key(
+                query, house_number, korpus, stroenie, limit, full_phrase, expanded_phrase,
+                has_moscow, has_moscow_region, has_balashikha, has_leningrad_region
+            )
+            generation = self.cache.generation
+            with stage("cache"):
+                cached = self.cache.get(cache_key)
+            if cached is not None:
+                record_branch(BRANCH_CACHE)
+                return cached
+
+        flags = {
+            "has_moscow": has_moscow, "has_moscow_region": has_moscow_region,
+            "has_balashikha": has_balashikha, "has_leningrad_region": has_leningrad_region,
+        }
+        region_code = next((code for flag, code in REGION_FLAGS if flags[flag]), None)
+        with stage("offline"):
+            hits = self.offline.search(query, house_number, korpus, stroenie, limit, region_code, full_phrase)
+            branch = "offline"
+            # Как в каскаде ES: без результата в регионе из запроса — повтор без фильтра региона
+            if not hits and region_code is not None:
+                hits = self.offline.search(query, house_number, korpus, stroenie, limit, None, full_phrase)
+                branch = "offline_any_region"
+        record_branch(branch if hits else BRANCH_NONE)
+        with stage("materialize"):
+            items = self._hits_to_items(hits)
+
+        if self.cache is not None:
+            self.cache.set(cache_key, items, generation)
+        return items
+
+    def _search_many_sync(self, params_list: List[Dict[str, Any]]) -> List[Union[List[AddressItem], Exception]]:
+        results: List[Union[List[AddressItem], Exception]] = []
+        for params in params_list:
+            try:
+                results.append(self._search_sync(**params))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _refresh_index_generation_sync(self) -> str:
+        generation = self.offline.header["generation"]
+        self.cache.set_generation(generation)
+        return generation
+
+    def _get_index_stats_sync(self) -> Dict[str, Any]:
+        header = self.offline.header
+        return {
+            "total_documents": header["places"] + header["houses"],
+            "index_size_bytes": len(self.offline.file),
+            "places": header["places"],
+            "houses": header["houses"],
+            "tokens": header["tokens"],
+        }
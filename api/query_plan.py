@@ -0,0 +1,1904 @@
+"""
+Компиляция нормализованного запроса в план поиска ES
+"""
+import json
+import re
+from dataclasses import dataclass
+from functools import cached_property, lru_cache, partial
+from typing import List, Optional, Dict, Any, Tuple
+
+
+# Размер LRU-кэша скомпилированных планов (повторяющиеся запросы не собираются заново)
+QUERY_PLAN_CACHE_SIZE = 4096
+
+# Канонические типы улиц (после apply_type_aliases)
+STREET_TYPE_TOKENS = frozenset({
+    "ул", "пер", "пр-кт", "б-р", "пр-д", "пл", "ш", "наб", "туп",
+    "ал", "дор", "тракт", "мост", "эст", "п/п", "линия", "ряд",
+    "кольцо", "автодорога", "трасса"
+})
+
+# Расширенный набор типов для распознавания «конкретной улицы» в финальном фолбэке
+SPECIFIC_STREET_TYPES = STREET_TYPE_TOKENS | frozenset({
+    "съезд", "заезд", "подъезд-авт", "просека", "просёлок"
+})
+
+# Алиасы сокращений названий улиц
+STREET_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "большая": ("б", "б."),
+    "малая": ("м", "м."),
+    "средняя": ("ср", "ср.", "с"),
+    "новая": ("н", "н."),
+    "старая": ("ст", "ст."),
+    "верхняя": ("в", "в."),
+    "нижняя": ("ниж", "ниж."),
+    "восточная": ("вост", "вост."),
+    "западная": ("зап", "зап."),
+    "северная": ("сев", "сев."),
+    "южная": ("юж", "юж."),
+    "центральная": ("центр", "центр."),
+    "промышленная": ("пром", "пром."),
+    "строительная": ("стр", "стр."),
+    "железнодорожная": ("жд", "ж.д."),
+    "красная": ("кр", "кр."),
+    "советская": ("сов", "сов."),
+    "комсомольская": ("комс", "комс."),
+    "пионерская": ("пион", "пион."),
+    "октябрьская": ("окт", "окт."),
+    "молодежная": ("мол", "мол."),
+    "школьная": ("шк", "шк.")
+}
+ALIAS_KEYWORDS = frozenset(STREET_ALIASES)
+
+# Краткий тип улицы -> полное написание (для случаев, когда в базе полные названия)
+STREET_TYPE_FULL_NAMES: Dict[str, str] = {
+    "пр-д": "проезд",
+    "ул": "улица",
+    "пер": "переулок",
+    "пр-кт": "проспект",
+    "б-р": "бульвар",
+    "пл": "площадь",
+    "ш": "шоссе",
+    "наб": "набережная"
+}
+
+# Админ-синонимы: район/р-н/вн/тер-г/м/о
+ADMIN_TOKENS = ("район", "р-н", "вн/тер-г", "м/о")
+ADMIN_MARKERS = frozenset(ADMIN_TOKENS) | frozenset({"округ", "округа", "административный"})
+ADMIN_STOPWORDS = ADMIN_MARKERS | frozenset({"г", "город", ","})
+ADMIN_TYPE_TERMS = ("р-н", "вн/тер-г", "вн.тер.г.", "м/о")
+
+SOURCE_FIELDS = (
+    "level", "name_norm", "name_exact", "full_norm",
+    "type_norm", "region_code", "geo", "house_number",
+    "korpus", "stroenie", "house_type", "road_km",
+    "street_guid", "settlement_guid", "city_guid", "name_lem"
+)
+
+# Типовые русские окончания прилагательных/род. падежа
+_MORPH_ENDINGS = (
+    ("ского", "ский"), ("сого", "сый"), ("его", "ий"), ("ого", "ий"),
+    ("ской", "ская"), ("цкой", "цкая"), ("ой", "ая"), ("ий", "ий"),
+    ("ая", "ая"), ("ое", "ое"), ("ые", "ый"), ("ых", "ый"), ("их", "ий")
+)
+
+_ROAD_KM_RX = re.compile(r'(\d+)[-\s]*й?\s*километр')
+
+# Канонические поля документа (name_canon, full_canon) считает ETL при индексации. Сокращения
+# из STREET_ALIASES, совпадающие с типами нас. пунктов и строений ("с", "ст", "стр"), не раскрываются
+CANONICAL_CACHE_SIZE = 65536
+_CANON_AMBIGUOUS_ALIASES = frozenset({"с", "ст", "стр"})
+_CANON_ALIASES: Dict[str, str] = {
+    alias.rstrip("."): full
+    for full, aliases in STREET_ALIASES.items()
+    for alias in aliases
+    if alias.rstrip(".") not in _CANON_AMBIGUOUS_ALIASES
+}
+_CANON_TYPE_NAMES: Dict[str, str] = {full: short for short, full in STREET_TYPE_FULL_NAMES.items()}
+
+
+def _norm_adj(tok: str) -> str:
+    # Очень лёгкая нормализация. Не трогаем числовые/смешанные (остаются как есть)
+    if any(ch.isdigit() for ch in tok):
+        return tok
+    for src, dst in _MORPH_ENDINGS:
+        if tok.endswith(src):
+            return tok[: -len(src)] + dst
+    return tok
+
+
+def generate_morph_variants(text: str) -> List[str]:
+    """Морф-упрощение окончаний прилагательных/родительного падежа"""
+    if not text:
+        return []
+    tokens = [t for t in text.split() if t]
+    variants: List[str] = []
+    normed = [_norm_adj(t) for t in tokens]
+    if normed != tokens:
+        variants.append(" ".join(normed))
+    return variants
+
+
+def move_street_type_to_tail(text: str) -> Optional[str]:
+    """Перестановка типа улицы в конец сегмента (например: "пл савеловского вокзала" -> "савеловского вокзала пл")"""
+    if not text:
+        return None
+    tokens = [t for t in text.split() if t]
+    if not tokens:
+        return None
+    try:
+        idx = next(i for i, t in enumerate(tokens) if t in STREET_TYPE_TOKENS)
+    except StopIteration:
+        return None
+    # Не трогаем, если тип уже в конце
+    if idx == len(tokens) - 1:
+        return None
+    new_tokens = tokens[:idx] + tokens[idx+1:] + [tokens[idx]]
+    return " ".join(new_tokens)
+
+
+def extract_street_phrase(text: str) -> Optional[str]:
+    """Извлечение уличной фразы вида "ленина ул" или "комсомольский пр-кт" из текста запроса"""
+    tokens = [t for t in (text or "").split() if t]
+    # Ищем последнее вхождение типа улицы
+    type_idx = None
+    for i in range(len(tokens)-1, -1, -1):
+        if tokens[i] in STREET_TYPE_TOKENS:
+            type_idx = i
+            break
+    if type_idx is None:
+        return None
+    # Случай 1: тип стоит в конце — берём предыдущее слово (напр. "ленина ул")
+    if type_idx >= 1:
+        # Берем все слова после типа улицы до конца строки
+        if type_idx < len(tokens) - 1:
+            name_part = " ".join(tokens[type_idx+1:])
+            return f"{name_part} {tokens[type_idx]}".strip()
+        else:
+            return f"{tokens[type_idx-1]} {tokens[type_idx]}"
+    # Случай 2: тип стоит в начале — формируем фразу "<имя> <тип>"
+    # Пример: "ул юлиана семенова" -> "юлиана семенова ул"
+    if type_idx == 0 and len(tokens) >= 2:
+        name_part = " ".join(tokens[1:])
+        return f"{name_part} {tokens[0]}".strip()
+    return None
+
+
+def generate_e_yo_variants(text: str) -> List[str]:
+    """Варианты с заменой е/ё для лучшего поиска"""
+    if not text:
+        return []
+    variants = [text]
+    # Заменяем е на ё
+    if 'е' in text:
+        variants.append(text.replace('е', 'ё'))
+    # Заменяем ё на е
+    if 'ё' in text:
+        variants.append(text.replace('ё', 'е'))
+    return variants
+
+
+@lru_cache(maxsize=CANONICAL_CACHE_SIZE)
+def canonical_segment(text: str) -> str:
+    """Каноническая форма сегмента адреса: ё -> е, сокращения названий раскрыты ("б." -> "большая"),
+    полные названия типов заменены сокращениями ("улица" -> "ул"), окончания прилагательных упрощены,
+    тип улицы перенесён в конец. Одна и та же функция для документа (ETL) и для запроса.
+    """
+    tokens = []
+    for token in (text or "").lower().replace("ё", "е").split():
+        token = token.rstrip(".") or token
+        token = _CANON_ALIASES.get(token, token)
+        tokens.append(_CANON_TYPE_NAMES.get(token) or _norm_adj(token))
+    joined = " ".join(tokens)
+    return move_street_type_to_tail(joined) or joined
+
+
+def canonical_name(text: Optional[str]) -> Optional[str]:
+    """Значение поля name_canon"""
+    return canonical_segment(text) if text else None
+
+
+def canonical_full(text: Optional[str]) -> Optional[str]:
+    """Значение поля full_canon: каждый сегмент полного адреса (через запятую) отдельно"""
+    if not text:
+        return None
+    return ", ".join(canonical_segment(part) for part in text.split(",") if part.strip())
+
+
+# Поля, по которым строятся варианты запроса (е/ё, окончания, порядок типа, алиасы).
+# В режимах канонических полей и русского анализатора условия по ним в тело не попадают
+VARIANT_TEXT_FIELDS = frozenset({"name_norm", "name_exact", "full_norm"})
+
+
+def _canonical_must(query: str) -> Dict[str, Any]:
+    """Текстовое условие режима канонических полей вместо вариантов запроса: имя (name_canon),
+    фраза улицы в полном адресе (full_canon) или все слова запроса в полном адресе
+    """
+    should = [
+        {
+            "match_phrase": {
+                "full_canon": {
+                    "query": canonical_full(extract_street_phrase(query) or query),
+                    "boost": 12.0
+                }
+            }
+        },
+        # Неблокирующий матч всех слов: запрос без типа улицы или с иерархией («москва тверская»)
+        {
+            "match": {
+                "full_canon": {
+                    "query": canonical_segment(query),
+                    "operator": "and",
+                    "boost": 1.5
+                }
+            }
+        }
+    ]
+    # В name_canon тип улицы не входит
+    name = " ".join(t for t in canonical_segment(query).split() if t not in STREET_TYPE_TOKENS)
+    if name:
+        should.append({
+            "match": {
+                "name_canon": {
+                    "query": name,
+                    "operator": "and",
+                    "boost": 18.0
+                }
+            }
+        })
+    return {"bool": {"should": should, "minimum_should_match": 1}}
+
+
+def _ru_analyzer_must(query: str) -> Dict[str, Any]:
+    """Текстовое условие режима русского анализатора: по фразе и матчу всех слов на подполя
+    name_norm.ru и full_norm.ru. Е/ё, окончания и синонимы типов учитывает анализатор, а не варианты запроса
+    """
+    should = [
+        {
+            "match_phrase": {
+                "full_norm.ru": {
+                    "query": extract_street_phrase(query) or query,
+                    "boost": 12.0
+                }
+            }
+        },
+        {
+            "match": {
+                "full_norm.ru": {
+                    "query": query,
+                    "operator": "and",
+                    "boost": 1.5
+                }
+            }
+        }
+    ]
+    # Тип улицы в name_norm не входит
+    name = " ".join(t for t in query.split() if t not in STREET_TYPE_TOKENS)
+    if name:
+        should.extend([
+            {
+                "match_phrase": {
+                    "name_norm.ru": {
+                        "query": name,
+                        "boost": 20.0
+                    }
+                }
+            },
+            {
+                "match": {
+                    "name_norm.ru": {
+                        "query": name,
+                        "operator": "and",
+                        "boost": 10.0
+                    }
+                }
+            }
+        ])
+    return {"bool": {"should": should, "minimum_should_match": 1}}
+
+
+def _uses_fields(node: Any, fields: frozenset) -> bool:
+    """Есть ли в условии (на любой глубине) match, match_phrase или multi_match по одному из полей fields"""
+    if isinstance(node, list):
+        return any(_uses_fields(item, fields) for item in node)
+    if not isinstance(node, dict):
+        return False
+    for key, value in node.items():
+        if key in ("match", "match_phrase") and isinstance(value, dict):
+            if fields.intersection(value):
+                return True
+        elif key == "multi_match" and isinstance(value, dict):
+            if any(field.partition("^")[0] in fields for field in value.get("fields", [])):
+                return True
+        elif _uses_fields(value, fields):
+            return True
+    return False
+
+
+def _with_text_must(
+    body: Dict[str, Any],
+    text_must: Dict[str, Any],
+    house_number: Optional[str],
+    korpus: Optional[str],
+    stroenie: Optional[str]
+) -> Dict[str, Any]:
+    """Копия основного тела, в которой вся текстовая часть — text_must (_canonical_must, _ru_analyzer_must).
+    Фильтры (дом, регион, админ-типы) и нетекстовые бусты сохраняются, условия по name_norm/full_norm
+    и вариантам запроса отбрасываются
+    """
+    qb = dict(body["query"]["bool"])
+    qb["must"] = [text_must]
+    should = [clause for clause in qb.get("should", []) if not _uses_fields(clause, VARIANT_TEXT_FIELDS)]
+    if house_number:
+        # Точный номер выше вариантов N/* (раньше это держали бусты вместе с матчем по full_norm)
+        exact: List[Dict[str, Any]] = [{"term": {"house_number": house_number}}]
+        if korpus:
+            exact.append({"terms": {"korpus": build_korpus_variants(korpus)}})
+        if stroenie:
+            exact.append({"terms": {"stroenie": build_stroenie_variants(stroenie)}})
+        if not korpus and not stroenie:
+            exact.append({"bool": {"must_not": [{"exists": {"field": "stroenie"}}, {"exists": {"field": "korpus"}}]}})
+        should.append({"bool": {"must": exact, "boost": 100.0}})
+    qb["should"] = should
+    return {**body, "query": {**body["query"], "bool": qb}}
+
+
+def build_korpus_variants(k: str) -> List[str]:
+    """Варианты записи корпуса"""
+    return [
+        k, f"к {k}", f"к.{k}", f"к{k}", f"корп {k}", f"корп. {k}",
+        f"корп.{k}", f"корпус {k}", f"кор. {k}", f"кор.{k}"
+    ]
+
+
+def build_stroenie_variants(s: str) -> List[str]:
+    """Варианты записи строения (включая «владение» и варианты для МКАД)"""
+    return [
+        s, f"с {s}", f"с.{s}", f"стр {s}", f"стр. {s}", f"стр.{s}", f"строение {s}",
+        f"вл {s}", f"вл.{s}", f"влад {s}", f"влад. {s}", f"влад.{s}", f"владение {s}",
+        f"влд {s}", f"влд.{s}"
+    ]
+
+
+def replace_admin_token(q: str, to_token: str) -> str:
+    """Замена админ-синонима (район/р-н/вн/тер-г/м/о) на заданный"""
+    return " ".join([to_token if t in ADMIN_TOKENS else t for t in q.split()])
+
+
+def _reduce_admin_tokens(q: str) -> str:
+    # Удаляем служебные админ-слова, оставляя смысловые токены
+    return " ".join([t for t in q.split() if t and t not in ADMIN_STOPWORDS])
+
+
+def _type_boost(type_values: List[str], boost_val: float) -> Dict[str, Any]:
+    return {
+        "constant_score": {
+            "filter": {"terms": {"type_norm": type_values}},
+            "boost": boost_val
+        }
+    }
+
+
+def _house_musts(
+    house_number: Optional[str],
+    korpus: Optional[str],
+    stroenie: Optional[str],
+    include_house: bool,
+    include_k: bool,
+    include_s: bool
+) -> List[Dict[str, Any]]:
+    """Домовые условия фолбэков: уровень house держим всегда, детали — по флагам"""
+    musts: List[Dict[str, Any]] = []
+    # Всегда удерживаем уровень домов, если в исходном запросе были домовые компоненты
+    if house_number or korpus or stroenie:
+        musts.append({"term": {"level": "house"}})
+    if include_house and house_number:
+        musts.append({
+            "bool": {
+                "should": [
+                    {"term": {"house_number": house_number}},
+                    {"wildcard": {"house_number": f"{house_number}/*"}}
+                ],
+                "minimum_should_match": 1
+            }
+        })
+    if include_k and korpus:
+        korpus_variants = build_korpus_variants(korpus)
+        musts.append({
+            "bool": {
+                "should": [
+                    {"terms": {"korpus": korpus_variants}},
+                    # Допуск: некоторые ETL кладут значения строения в поле korpus
+                    {"terms": {"korpus": build_stroenie_variants(korpus)}}
+                ],
+                "minimum_should_match": 1
+            }
+        })
+    if include_s and stroenie:
+        stroenie_variants = build_stroenie_variants(stroenie)
+        musts.append({
+            "bool": {
+                "should": [
+                    {"terms": {"stroenie": stroenie_variants}},
+                    # Допуск: некоторые ETL кладут значения строения в поле korpus
+                    {"terms": {"korpus": stroenie_variants}}
+                ],
+                "minimum_should_match": 1
+            }
+        })
+    return musts
+
+
+def _with_house_musts(body: Dict[str, Any], musts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Копия тела с заменой домовых фильтров (региональные/прочие term-фильтры сохраняются)"""
+    new_body = dict(body)
+    # Копируем и query: иначе замена bool ниже меняет общий словарь исходного тела и всех попыток
+    new_body["query"] = dict(body["query"])
+    qb = dict(new_body["query"]["bool"])  # shallow copy
+    # Сохраним региональные/прочие фильтры, если были (например, region_code=77)
+    preserved_filters = []
+    for f in qb.get("filter", []) or []:
+        # Сохраняем любые filters кроме вложенных bool must по домам
+        if isinstance(f, dict) and ("terms" in f or "term" in f):
+            preserved_filters.append(f)
+    qb["filter"] = preserved_filters + [{"bool": {"must": musts}}]
+    new_body["query"]["bool"] = qb
+    return new_body
+
+
+def _clone_body_wo_filters(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Копия тела без фильтров; should копируется, чтобы его можно было расширять"""
+    nb = dict(body)
+    nb["query"] = dict(nb.get("query", {}))
+    qb = dict(nb["query"].get("bool", {}))
+    # Сносим фильтры полностью
+    qb.pop("filter", None)
+    # Копируем should: список расширяется и не должен меняться в остальных телах каскада
+    qb["should"] = list(qb.get("should", []))
+    nb.setdefault("query", {})["bool"] = qb
+    return nb
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    """Скомпилированный план поиска: основное тело ES и фолбэки в порядке приоритета.
+    Планы кэшируются и разделяются между запросами — тела только читаются, не изменяются.
+    """
+    primary: Dict[str, Any]
+    fallbacks: Tuple[Dict[str, Any], ...]
+    # Имена веток фолбэков (для метрик: какая ветка дала ответ)
+    fallback_labels: Tuple[str, ...] = ()
+
+    @property
+    def bodies(self) -> List[Dict[str, Any]]:
+        """Каскад целиком: основное тело + фолбэки"""
+        return [self.primary, *self.fallbacks]
+
+    @property
+    def labels(self) -> Tuple[str, ...]:
+        """Имена веток каскада в порядке bodies"""
+        return ("primary", *(self.fallback_labels or (f"fallback_{i}" for i in range(1, len(self.fallbacks) + 1))))
+
+    @cached_property
+    def encoded_bodies(self) -> Tuple[bytes, ...]:
+        """Тела каскада в JSON (как их сериализует клиент ES), один раз на план — для строк _msearch"""
+        return tuple(
+            json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            for body in self.bodies
+        )
+
+
+class QueryPlanCompiler:
+    """Компилятор нормализованного запроса в QueryPlan с LRU-мемоизацией по кортежу параметров.
+    canonical_fields — текстовая часть тел только по name_canon/full_canon, без вариантов запроса
+    и условий по name_norm/full_norm;
+    ru_analyzer — текстовая часть тел — фраза и матч всех слов по подполям name_norm.ru/full_norm.ru
+    с русским анализатором (ё, синонимы типов, стеммер) вместо вариантов запроса.
+    Индекс должен содержать эти поля (маппинг FiasETL.create_index).
+    """
+
+    def __init__(self, cache_size: int = QUERY_PLAN_CACHE_SIZE, canonical_fields: bool = False, ru_analyzer: bool = False):
+        self.canonical_fields = canonical_fields
+        self.ru_analyzer = ru_analyzer
+        self._compile_cached = lru_cache(maxsize=cache_size)(
+            partial(self._compile, canonical_fields=canonical_fields, ru_analyzer=ru_analyzer)
+        )
+
+    def compile(
+        self,
+        query: str,
+        house_number: Optional[str] = None,
+        korpus: Optional[str] = None,
+        stroenie: Optional[str] = None,
+        limit: int = 10,
+        full_phrase: Optional[str] = None,
+        expanded_phrase: Optional[str] = None,
+        has_moscow: bool = False,
+        has_moscow_region: bool = False,
+        has_balashikha: bool = False,
+        has_leningrad_region: bool = False
+    ) -> QueryPlan:
+        """План для нормализованного запроса (из кэша, если такой уже собирался)"""
+        return self._compile_cached(
+            query, house_number, korpus, stroenie, limit, full_phrase, expanded_phrase,
+            bool(has_moscow), bool(has_moscow_region), bool(has_balashikha), bool(has_leningrad_region)
+        )
+
+    def cache_info(self):
+        return self._compile_cached.cache_info()
+
+    def cache_clear(self) -> None:
+        self._compile_cached.cache_clear()
+
+    @staticmethod
+    def _compile(
+        query: str,
+        house_number: Optional[str],
+        korpus: Optional[str],
+        stroenie: Optional[str],
+        limit: int,
+        full_phrase: Optional[str],
+        expanded_phrase: Optional[str],
+        has_moscow: bool,
+        has_moscow_region: bool,
+        has_balashikha: bool,
+        has_leningrad_region: bool,
+        canonical_fields: bool = False,
+        ru_analyzer: bool = False
+    ) -> QueryPlan:
+        """Сборка каскада тел ES-запросов (основное + фолбэки) без кэша"""
+        # Варианты е/ё, окончаний и алиасов не нужны, если их учитывает индекс
+        skip_variants = canonical_fields or ru_analyzer
+        # Базовый поисковый запрос
+        search_body = {
+            "size": limit,
+            "query": {
+                "bool": {
+                    "must": [],
+                    "should": [
+                        # Очень высокий буст для точного совпадения названия улицы
+                        {
+                            "match_phrase": {
+                                "name_norm": {
+                                    "query": query,
+                                    "boost": 20.0  # Увеличили с 4.0 до 20.0
+                                }
+                            }
+                        },
+                        # Высокий буст для точного совпадения названия улицы с fuzziness
+                        {
+                            "match": {
+                                "name_norm": {
+                                    "query": query,
+                                    "boost": 10.0,  # Увеличили с 2.0 до 10.0
+                                    "fuzziness": "AUTO"
+                                }
+                            }
+                        },
+                        # Дополнительный буст для точного совпадения в name_exact
+                        {
+                            "match_phrase": {
+                                "name_exact": {
+                                    "query": query,
+                                    "boost": 25.0
+                                }
+                            }
+                        },
+                        # Фразовое совпадение по полю полного адреса с высоким бустом
+                    ],
+                    "minimum_should_match": 0
+                }
+            },
+            "_source": list(SOURCE_FIELDS)
+        }
+
+        # Добавляем should-условия динамически
+        dynamic_should: List[Dict[str, Any]] = []
+        
+        # Определяем токены запроса для использования в логике поиска
+        query_tokens = [t for t in (query or "").split() if t]
+        
+        # Специальная логика для поиска улиц с типом в начале запроса
+        # Например, "ул большая дмитровка" -> также ищем "большая дмитровка" и "дмитровка большая"
+        if query_tokens and query_tokens[0] in STREET_TYPE_TOKENS:
+            # Убираем тип улицы из начала запроса
+            street_name_without_type = " ".join(query_tokens[1:])
+            if street_name_without_type:
+                # Ищем по названию без типа улицы
+                dynamic_should.append({
+                    "match_phrase": {
+                        "name_norm": {
+                            "query": street_name_without_type,
+                            "boost": 15.0
+                        }
+                    }
+                })
+                dynamic_should.append({
+                    "match_phrase": {
+                        "full_norm": {
+                            "query": street_name_without_type,
+                            "boost": 12.0
+                        }
+                    }
+                })
+                
+                # Также ищем с переставленными словами (например, "большая дмитровка" -> "дмитровка большая")
+                street_tokens = street_name_without_type.split()
+                if len(street_tokens) == 2:
+                    # Переставляем два слова местами
+                    reversed_name = f"{street_tokens[1]} {street_tokens[0]}"
+                    dynamic_should.append({
+                        "match_phrase": {
+                            "name_norm": {
+                                "query": reversed_name,
+                                "boost": 18.0
+                            }
+                        }
+                    })
+                    dynamic_should.append({
+                        "match_phrase": {
+                            "full_norm": {
+                                "query": reversed_name,
+                                "boost": 15.0
+                            }
+                        }
+                    })
+                elif len(street_tokens) > 2:
+                    # Для более чем 2 слов, переставляем первое и последнее
+                    reversed_name = " ".join([street_tokens[-1]] + street_tokens[1:-1] + [street_tokens[0]])
+                    dynamic_should.append({
+                        "match_phrase": {
+                            "name_norm": {
+                                "query": reversed_name,
+                                "boost": 16.0
+                            }
+                        }
+                    })
+                    dynamic_should.append({
+                        "match_phrase": {
+                            "full_norm": {
+                                "query": reversed_name,
+                                "boost": 13.0
+                            }
+                        }
+                    })
+
+        # Фразовое совпадение по полю полного адреса
+        if full_phrase:
+            dynamic_should.append({
+                "match_phrase": {
+                    "full_norm": {
+                        "query": full_phrase,
+                        "boost": 15.0  # Увеличили с 10.0 до 15.0
+                    }
+                }
+            })
+            # Дополнительно усилим фразу без дома как точную
+            dynamic_should.append({
+                "match_phrase": {
+                    "full_norm": {
+                        "query": query,
+                        "boost": 12.0  # Увеличили с 6.0 до 12.0
+                    }
+                }
+            })
+            # Перестановка типа улицы в конец (если применимо) для full_phrase и query
+            tail_variant_query = None if canonical_fields else move_street_type_to_tail(query)
+            if tail_variant_query:
+                dynamic_should.append({
+                    "match_phrase": {
+                        "full_norm": {
+                            "query": tail_variant_query,
+                            "boost": 8.0
+                        }
+                    }
+                })
+                # Также фразовый матч по name_norm с перестановкой
+                dynamic_should.append({
+                    "match_phrase": {
+                        "name_norm": {
+                            "query": tail_variant_query,
+                            "boost": 18.0
+                        }
+                    }
+                })
+            tail_variant_full = None if canonical_fields else move_street_type_to_tail(full_phrase)
+            if tail_variant_full:
+                dynamic_should.append({
+                    "match_phrase": {
+                        "full_norm": {
+                            "query": tail_variant_full,
+                            "boost": 9.0
+                        }
+                    }
+                })
+            
+            # Добавляем варианты с заменой е/ё для лучшего поиска (канонические поля их уже учитывают)
+            e_yo_variants_query = [] if skip_variants else generate_e_yo_variants(query)
+            for variant in e_yo_variants_query:
+                if variant != query:  # Не дублируем оригинальный запрос
+                    dynamic_should.append({
+                        "match_phrase": {
+                            "full_norm": {
+                                "query": variant,
+                                "boost": 10.0
+                            }
+                        }
+                    })
+                    # Также добавляем перестановку типа для вариантов
+                    tail_variant = move_street_type_to_tail(variant)
+                    if tail_variant:
+                        dynamic_should.append({
+                            "match_phrase": {
+                                "full_norm": {
+                                    "query": tail_variant,
+                                    "boost": 8.5
+                                }
+                            }
+                        })
+                        # И фразу по name_norm
+                        dynamic_should.append({
+                            "match_phrase": {
+                                "name_norm": {
+                                    "query": tail_variant,
+                                    "boost": 15.0
+                                }
+                            }
+                        })
+        # В любом случае добавим неблокирующий match по full_norm на текст без дома,
+        # чтобы не заваливаться из-за minimum_should_match
+        dynamic_should.append({
+            "match": {
+                "full_norm": {
+                    "query": query,
+                    "operator": "and",
+                    "boost": 1.5
+                }
+            }
+        })
+
+        # Fallback-логика для алиасов сокращений названий улиц
+        # Если поиск не находит результаты, пробуем варианты с обратными алиасами
+        alias_fallback_variants = []
+        
+        
+        # Генерируем варианты с обратными алиасами (в канонических полях сокращения уже раскрыты)
+        query_tokens = query.split()
+        for i, token in enumerate([] if skip_variants else query_tokens):
+            for full_name, aliases in STREET_ALIASES.items():
+                if token == full_name:
+                    # Заменяем полное название на сокращения
+                    for alias in aliases:
+                        variant_tokens = query_tokens.copy()
+                        variant_tokens[i] = alias
+                        alias_fallback_variants.append(" ".join(variant_tokens))
+                elif token in aliases:
+                    # Заменяем сокращение на полное название
+                    variant_tokens = query_tokens.copy()
+                    variant_tokens[i] = full_name
+                    alias_fallback_variants.append(" ".join(variant_tokens))
+        
+        # Добавляем варианты с алиасами в поиск
+        for variant in alias_fallback_variants:
+            if variant != query:  # Не дублируем оригинальный запрос
+                dynamic_should.append({
+                    "match_phrase": {
+                        "name_norm": {
+                            "query": variant,
+                            "boost": 8.0
+                        }
+                    }
+                })
+                dynamic_should.append({
+                    "match_phrase": {
+                        "full_norm": {
+                            "query": variant,
+                            "boost": 6.0
+                        }
+                    }
+                })
+                # Также добавляем перестановку типа для вариантов с алиасами
+                tail_variant = move_street_type_to_tail(variant)
+                if tail_variant:
+                    dynamic_should.append({
+                        "match_phrase": {
+                            "name_norm": {
+                                "query": tail_variant,
+                                "boost": 7.0
+                            }
+                        }
+                    })
+                    dynamic_should.append({
+                        "match_phrase": {
+                            "full_norm": {
+                                "query": tail_variant,
+                                "boost": 5.0
+                            }
+                        }
+                    })
+        
+        # Дополнительная fallback-логика для поиска по частям названия улицы
+        # Если точный поиск не работает, пробуем найти улицы, содержащие все слова из запроса
+        if len(query_tokens) >= 2:
+            # Ищем улицы, которые содержат все слова из запроса (в любом порядке)
+            dynamic_should.append({
+                "bool": {
+                    "must": [
+                        {"term": {"level": "street"}},
+                        *[{"match": {"name_norm": {"query": token}}} for token in query_tokens if token not in STREET_TYPE_TOKENS]
+                    ],
+                    "boost": 3.0
+                }
+            })
+            
+            # Также пробуем поиск по full_norm с частями названия
+            dynamic_should.append({
+                "bool": {
+                    "must": [
+                        {"term": {"level": "street"}},
+                        *[{"match": {"full_norm": {"query": token}}} for token in query_tokens if token not in STREET_TYPE_TOKENS]
+                    ],
+                    "boost": 2.0
+                }
+            })
+            
+            # Дополнительная логика для поиска улиц с алиасами в названии
+            # Например, "ул большая дмитровка" -> ищем "дмитровка б."
+            street_name_tokens = [token for token in query_tokens if token not in STREET_TYPE_TOKENS]
+            if len(street_name_tokens) >= 2:
+                # Ищем улицы, которые содержат все слова из названия улицы
+                dynamic_should.append({
+                    "bool": {
+                        "must": [
+                            {"term": {"level": "street"}},
+                            *[{"match": {"name_norm": {"query": token}}} for token in street_name_tokens]
+                        ],
+                        "boost": 4.0
+                    }
+                })
+                
+                # Также пробуем поиск по full_norm с названием улицы
+                dynamic_should.append({
+                    "bool": {
+                        "must": [
+                            {"term": {"level": "street"}},
+                            *[{"match": {"full_norm": {"query": token}}} for token in street_name_tokens]
+                        ],
+                        "boost": 3.0
+                    }
+                })
+                
+                # Специальная логика для поиска улиц с алиасами в названии
+                # Например, "ул большая дмитровка" -> ищем "дмитровка б."
+                # Проверяем, есть ли в названии улицы слова, которые могут быть алиасами
+                for keyword in ([] if skip_variants else street_name_tokens):
+                    if keyword in ALIAS_KEYWORDS:
+                        # Ищем улицы, которые содержат основное название улицы
+                        main_street_tokens = [token for token in street_name_tokens if token != keyword]
+                        if main_street_tokens:
+                            dynamic_should.append({
+                                "bool": {
+                                    "must": [
+                                        {"term": {"level": "street"}},
+                                        *[{"match": {"name_norm": {"query": token}}} for token in main_street_tokens]
+                                    ],
+                                    "boost": 6.0
+                                }
+                            })
+                            dynamic_should.append({
+                                "bool": {
+                                    "must": [
+                                        {"term": {"level": "street"}},
+                                        *[{"match": {"full_norm": {"query": token}}} for token in main_street_tokens]
+                                    ],
+                                    "boost": 5.0
+                                }
+                            })
+
+        # Расширенная фраза с домом/корпусом/строением и допуском перестановок служебных слов
+        if expanded_phrase:
+            dynamic_should.append({
+                "match_phrase": {
+                    "full_norm": {
+                        "query": expanded_phrase,
+                        "slop": 4,
+                        "boost": 9.0
+                    }
+                }
+            })
+            # Перестановка типа улицы в конец для expanded_phrase
+            if canonical_fields:
+                dynamic_should.append({
+                    "match_phrase": {
+                        "full_canon": {
+                            "query": canonical_full(expanded_phrase),
+                            "slop": 5,
+                            "boost": 9.5
+                        }
+                    }
+                })
+            else:
+                tail_variant_expanded = move_street_type_to_tail(expanded_phrase)
+                if tail_variant_expanded:
+                    dynamic_should.append({
+                        "match_phrase": {
+                            "full_norm": {
+                                "query": tail_variant_expanded,
+                                "slop": 5,
+                                "boost": 9.5
+                            }
+                        }
+                    })
+
+        # Если запрос короткий и без номера дома — поднимем агрегирующие уровни
+        query_tokens = [t for t in (query or "").split() if t]
+        if not house_number and len(query_tokens) <= 2:
+            # Явно поднимем города/внутригородские территории
+            dynamic_should.append({
+                "constant_score": {
+                    "filter": {"term": {"level": "city"}},
+                    "boost": 8.0
+                }
+            })
+            # Очень сильный буст на точное совпадение названия для уровня city
+            dynamic_should.append({
+                "bool": {
+                    "must": [
+                        {"term": {"level": "city"}},
+                        {"match_phrase": {"name_norm": {"query": query}}}
+                    ],
+                    "boost": 20.0
+                }
+            })
+            # Небольшой буст для регионов
+            dynamic_should.append({
+                "constant_score": {
+                    "filter": {"term": {"level": "region"}},
+                    "boost": 2.0
+                }
+            })
+            # Усилим тип вн/тер-г
+            dynamic_should.append({
+                "constant_score": {
+                    "filter": {"term": {"type_norm": "вн/тер-г"}},
+                    "boost": 3.0
+                }
+            })
+        
+        # Поддержка синонимов админ. единиц: район/р-н/вн/тер-г
+        admin_present = any(t in ADMIN_MARKERS for t in query_tokens)
+
+        if admin_present:
+            # Варианты запроса с заменой на канон и на эквиваленты
+            query_variants = set()
+            for vt in ADMIN_TOKENS:
+                query_variants.add(replace_admin_token(query, vt))
+            # Сконструируем облегчённый must: удалим служебные админ-слова и потребуем совпадение по смысловым токенам
+            mm_variants = []
+            for qv in sorted(query_variants):
+                reduced = _reduce_admin_tokens(qv)
+                if reduced:
+                    mm_variants.append({
+                        "multi_match": {
+                            "query": reduced,
+                            "fields": ["name_norm^2", "full_norm"],
+                            "type": "best_fields",
+                            "operator": "and"
+                        }
+                    })
+                    # Бэкап с более мягким оператором
+                    mm_variants.append({
+                        "multi_match": {
+                            "query": reduced,
+                            "fields": ["name_norm^2", "full_norm"],
+                            "type": "best_fields",
+                            "operator": "or",
+                            "fuzziness": "AUTO"
+                        }
+                    })
+                # Добавим фразовый матч по full_norm для каждого варианта
+                dynamic_should.append({
+                    "match_phrase": {"full_norm": {"query": qv, "boost": 5.0}}
+                })
+            if mm_variants:
+                search_body["query"]["bool"]["must"].append({
+                    "bool": {"should": mm_variants, "minimum_should_match": 1}
+                })
+            # Сильно поднимем админ-типы (район/м/о/вн/тер-г)
+            admin_type_terms = list(ADMIN_TYPE_TERMS)
+            dynamic_should.append({
+                "constant_score": {"filter": {"terms": {"type_norm": admin_type_terms}}, "boost": 300.0}
+            })
+            # Сильно приоритизируем городские документы с админ-типами
+            dynamic_should.append({
+                "bool": {
+                    "must": [
+                        {"term": {"level": "city"}},
+                        {"terms": {"type_norm": admin_type_terms}}
+                    ],
+                    "boost": 400.0
+                }
+            })
+            # Для коротких запросов без дома — ограничим выдачу только админ-типами
+            # Если это административный запрос без номера дома — ограничим выдачу админ-типами
+            if not house_number:
+                existing_filters = search_body["query"]["bool"].get("filter", [])
+                existing_filters.append({"terms": {"type_norm": admin_type_terms}})
+                search_body["query"]["bool"]["filter"] = existing_filters
+        
+        # Приоритизация Москвы для длинных иерархий
+        # Если в запросе есть "москва" или передана информация о наличии "москва", усилим результаты из Москвы
+        if "москва" in query.lower() or has_moscow:
+            # Буст для результатов из Москвы (по коду региона 77)
+            dynamic_should.append({
+                "constant_score": {
+                    "filter": {"terms": {"region_code": ["77", 77]}},
+                    "boost": 100.0
+                }
+            })
+            
+            # Дополнительный буст для вн/тер-г в Москве
+            dynamic_should.append({
+                "bool": {
+                    "filter": [
+                        {"terms": {"region_code": ["77", 77]}},
+                        {"term": {"type_norm": "вн/тер-г"}}
+                    ],
+                    "boost": 50.0
+                }
+            })
+            
+            # Для длинных иерархий (административные округа) усилим точность
+            if any(t in {"административный", "округа", "округ"} for t in query_tokens):
+                dynamic_should.append({
+                    "match_phrase": {
+                        "full_norm": {
+                            "query": query,
+                            "boost": 50.0  # Увеличили буст
+                        }
+                    }
+                })
+            
+            # Применяем СТРОГИЙ фильтр по региону для Москвы - только результаты из Москвы
+            existing_filters = search_body["query"]["bool"].get("filter", [])
+            # Удаляем любые существующие фильтры по region_code, чтобы избежать конфликтов
+            existing_filters = [f for f in existing_filters if not (isinstance(f, dict) and ("terms" in f or "term" in f) and "region_code" in f.get("terms", f.get("term", {})))]
+            existing_filters.append({"terms": {"region_code": ["77", 77]}})
+            search_body["query"]["bool"]["filter"] = existing_filters
+        
+        # Приоритизация Московской области для Балашихи
+        # Если в запросе есть "балашиха" или передана информация о наличии "балашиха", усилим результаты из Московской области
+        elif has_balashikha or "балашиха" in query.lower():
+            # Буст для результатов из Московской области (по коду региона 50)
+            dynamic_should.append({
+                "constant_score": {
+                    "filter": {"terms": {"region_code": ["50", 50]}},
+                    "boost": 100.0
+                }
+            })
+            
+            # Дополнительный буст для городов в Московской области
+            dynamic_should.append({
+                "bool": {
+                    "filter": [
+                        {"terms": {"region_code": ["50", 50]}},
+                        {"term": {"level": "city"}}
+                    ],
+                    "boost": 50.0
+                }
+            })
+            
+            # Очень высокий буст для результатов, содержащих "балашиха" в full_norm
+            dynamic_should.append({
+                "match_phrase": {
+                    "full_norm": {
+                        "query": "балашиха",
+                        "boost": 200.0
+                    }
+                }
+            })
+            
+            # Дополнительный буст для улиц и микрорайонов в Балашихе
+            dynamic_should.append({
+                "bool": {
+                    "must": [
+                        {"match_phrase": {"full_norm": {"query": "балашиха"}}},
+                        {"terms": {"level": ["street", "settlement"]}}
+                    ],
+                    "boost": 150.0
+                }
+            })
+            
+            # Приоритизация микрорайонов и улиц по ключевым словам из запроса
+            # Если в запросе есть "1 мая", приоритизируем микрорайоны "1 мая мкр" выше улиц "1 мая"
+            query_tokens = [t.lower() for t in query.split()]
+            for token in query_tokens:
+                if token in ["1", "мая", "май"]:
+                    # Очень высокий буст для микрорайонов "1 мая мкр" в Балашихе
+                    dynamic_should.append({
+                        "bool": {
+                            "must": [
+                                {"match_phrase": {"full_norm": {"query": "балашиха"}}},
+                                {"match_phrase": {"name_norm": {"query": "1 мая мкр"}}}
+                            ],
+                            "boost": 5000.0
+                        }
+                    })
+                    # Высокий буст для микрорайонов "1 мая мкр" в любом месте
+                    dynamic_should.append({
+                        "bool": {
+                            "must": [
+                                {"match_phrase": {"name_norm": {"query": "1 мая мкр"}}},
+                                {"term": {"level": "settlement"}}
+                            ],
+                            "boost": 4000.0
+                        }
+                    })
+                    # Также ищем микрорайоны с переставленными словами "мкр 1 мая"
+                    dynamic_should.append({
+                        "bool": {
+                            "must": [
+                                {"match_phrase": {"name_norm": {"query": "мкр 1 мая"}}},
+                                {"term": {"level": "settlement"}}
+                            ],
+                            "boost": 4000.0
+                        }
+                    })
+                    # Очень низкий буст для улиц "1 мая" в Балашихе (только если нет микрорайона)
+                    dynamic_should.append({
+                        "bool": {
+                            "must": [
+                                {"match_phrase": {"full_norm": {"query": "балашиха"}}},
+                                {"match_phrase": {"name_norm": {"query": "1 мая"}}},
+                                {"term": {"level": "street"}}
+                            ],
+                            "boost": 10.0
+                        }
+                    })
+                    # Минимальный буст для улиц "1 мая" в любом месте
+                    dynamic_should.append({
+                        "bool": {
+                            "must": [
+                                {"match_phrase": {"name_norm": {"query": "1 мая"}}},
+                                {"term": {"level": "street"}}
+                            ],
+                            "boost": 5.0
+                        }
+                    })
+                    break
+            
+            # Применяем мягкий фильтр по региону для приоритизации Московской области
+            existing_filters = search_body["query"]["bool"].get("filter", [])
+            existing_filters.append({"terms": {"region_code": ["50", 50]}})
+            search_body["query"]["bool"]["filter"] = existing_filters
+        
+        # Приоритизация Ленинградской области
+        # Если в запросе есть "ленинградская область" или передана информация о наличии "ленинградская область", усилим результаты из Ленинградской области
+        elif has_leningrad_region:
+            # Буст для результатов из Ленинградской области (по коду региона 47)
+            dynamic_should.append({
+                "constant_score": {
+                    "filter": {"terms": {"region_code": ["47", 47]}},
+                    "boost": 100.0
+                }
+            })
+            
+            # Дополнительный буст для городов в Ленинградской области
+            dynamic_should.append({
+                "bool": {
+                    "filter": [
+                        {"terms": {"region_code": ["47", 47]}},
+                        {"term": {"level": "city"}}
+                    ],
+                    "boost": 50.0
+                }
+            })
+            
+            # Применяем СТРОГИЙ фильтр по региону для Ленинградской области - только результаты из Ленинградской области
+            existing_filters = search_body["query"]["bool"].get("filter", [])
+            # Удаляем любые существующие фильтры по region_code, чтобы избежать конфликтов
+            existing_filters = [f for f in existing_filters if not (isinstance(f, dict) and ("terms" in f or "term" in f) and "region_code" in f.get("terms", f.get("term", {})))]
+            existing_filters.append({"terms": {"region_code": ["47", 47]}})
+            search_body["query"]["bool"]["filter"] = existing_filters
+            
+            # Специальная логика для иерархических адресов в Ленинградской области
+            # Если запрос содержит иерархию (например, "токсовское гп токсово гп"), ищем по фразе
+            if "гп" in query or "пос" in query or "г/" in query:
+                # Добавляем высокий буст для фразового поиска по полному адресу
+                dynamic_should.append({
+                    "match_phrase": {
+                        "full_norm": {
+                            "query": query,
+                            "boost": 50.0
+                        }
+                    }
+                })
+                # Также ищем по нормализованному названию
+                dynamic_should.append({
+                    "match_phrase": {
+                        "name_norm": {
+                            "query": query,
+                            "boost": 40.0
+                        }
+                    }
+                })
+        else:
+            # Базовый must если нет админ-синонимов
+            # Добавляем альтернативу operator=or как бэкап внутри must
+            search_body["query"]["bool"]["must"].append({
+                "bool": {
+                    "should": [
+                        {
+                            "multi_match": {
+                                "query": query,
+                                "fields": ["name_norm^2", "full_norm"],
+                                "type": "best_fields",
+                                "operator": "and"
+                            }
+                        },
+                        {
+                            "multi_match": {
+                                "query": query,
+                                "fields": ["name_norm^2", "full_norm"],
+                                "type": "best_fields",
+                                "operator": "or",
+                                "fuzziness": "AUTO"
+                            }
+                        }
+                    ],
+                    "minimum_should_match": 1
+                }
+            })
+        
+        # Фильтры по дому/корпусу/строению
+        must_filters: List[Dict[str, Any]] = []
+        # Если указан дом/корпус/строение — ограничим уровень документом "house"
+        if house_number or korpus or stroenie:
+            must_filters.append({"term": {"level": "house"}})
+        if house_number:
+            # Допускаем точное совпадение и варианты вида N/* (например, 21/2) наравне
+            must_filters.append({
+                "bool": {
+                    "should": [
+                        {"term": {"house_number": house_number}},
+                        {"wildcard": {"house_number": f"{house_number}/*"}}
+                    ],
+                    "minimum_should_match": 1
+                }
+            })
+
+        if korpus and stroenie:
+            korpus_variants = build_korpus_variants(korpus)
+            stroenie_variants = build_stroenie_variants(stroenie)
+
+            combined_variants = []
+            korpus_tokens = [f"к {korpus}", f"к.{korpus}", f"к{korpus}", f"корп {korpus}", f"корп. {korpus}", f"корп.{korpus}", f"корпус {korpus}", f"кор. {korpus}", f"кор.{korpus}"]
+            stroenie_tokens = [
+                f"стр {stroenie}", f"стр. {stroenie}", f"стр.{stroenie}", f"с {stroenie}", f"с.{stroenie}", f"строение {stroenie}",
+                f"вл {stroenie}", f"вл.{stroenie}", f"влад {stroenie}", f"влад. {stroenie}", f"влад.{stroenie}", f"владение {stroenie}"
+            ]
+            for kv in korpus_tokens:
+                for sv in stroenie_tokens:
+                    combined_variants.append(f"{kv} {sv}")
+
+            must_filters.append({
+                "bool": {
+                    "should": [
+                        # Вариант, когда всё закодировано в поле korpus
+                        {"terms": {"korpus": combined_variants}},
+                        # Вариант, когда korpus и stroenie лежат по отдельным полям
+                        {
+                            "bool": {
+                                "must": [
+                                    {"bool": {"should": [{"terms": {"korpus": korpus_variants}}], "minimum_should_match": 1}},
+                                    {"bool": {"should": [{"terms": {"stroenie": stroenie_variants}}], "minimum_should_match": 1}}
+                                ]
+                            }
+                        }
+                    ],
+                    "minimum_should_match": 1
+                }
+            })
+        elif korpus:
+            korpus_variants = build_korpus_variants(korpus)
+            must_filters.append({
+                "bool": {
+                    "should": [
+                        {"terms": {"korpus": korpus_variants}}
+                    ],
+                    "minimum_should_match": 1
+                }
+            })
+        elif stroenie:
+            stroenie_variants = build_stroenie_variants(stroenie)
+            # Разрешим хранение строения как в поле stroenie, так и в korpus (реальные ETL часто пишут "стр 5" в korpus)
+            # Также добавляем варианты с префиксом "стр" для поля korpus
+            stroenie_korpus_variants = [f"стр {stroenie}", f"стр.{stroenie}", f"стр {stroenie}"]
+            must_filters.append({
+                "bool": {
+                    "should": [
+                        {"terms": {"stroenie": stroenie_variants}},
+                        {"terms": {"korpus": stroenie_variants}},
+                        {"terms": {"korpus": stroenie_korpus_variants}}
+                    ],
+                    "minimum_should_match": 1
+                }
+            })
+
+        if must_filters:
+            # Не перезаписываем существующие фильтры (например, регион), а добавляем
+            existing_filters = search_body["query"]["bool"].get("filter", [])
+            existing_filters.append({"bool": {"must": must_filters}})
+            search_body["query"]["bool"]["filter"] = existing_filters
+
+        # Фильтрация по уличной части для всех запросов с уличной фразой
+        street_phrase = extract_street_phrase(query)
+        if street_phrase:
+            # Обязательный фильтр по уличной части, чтобы не подтягивать чужие улицы
+            existing_filters = search_body["query"]["bool"].get("filter", [])
+            # Используем full_norm, и добавляем варианты е/ё, чтобы покрыть оба написания
+            street_variants = [street_phrase]
+            for v in ([] if skip_variants else generate_e_yo_variants(street_phrase)):
+                if v not in street_variants:
+                    street_variants.append(v)
+            
+            # Добавляем варианты с обратным преобразованием типов улиц (для случаев, когда в базе полные названия)
+            # Например: "пр-д" -> "проезд", "ул" -> "улица"
+            for variant in ([] if skip_variants else street_variants[:]):  # Копируем список, чтобы не изменять его во время итерации
+                for short_type, full_type in STREET_TYPE_FULL_NAMES.items():
+                    if short_type in variant:
+                        full_variant = variant.replace(short_type, full_type)
+                        if full_variant not in street_variants:
+                            street_variants.append(full_variant)
+            # Требуем совпадение уличной фразы либо в full_norm, либо в name_norm
+            # Используем must вместо should для более строгой фильтрации
+            street_must_clauses = []
+            for v in street_variants:
+                street_must_clauses.append({
+                    "bool": {
+                        "should": [
+                            {"match_phrase": {"full_norm": {"query": v}}},
+                            {"match_phrase": {"name_norm": {"query": v}}}
+                        ],
+                        "minimum_should_match": 1
+                    }
+                })
+            # Добавляем фильтр по уличной части как обязательное условие
+            search_body["query"]["bool"]["must"].append({
+                "bool": {
+                    "should": street_must_clauses,
+                    "minimum_should_match": 1
+                }
+            })
+            search_body["query"]["bool"]["filter"] = existing_filters
+            # Дополнительное should для повышения релевантности внутри той же улицы
+            search_body["query"]["bool"]["should"].append({
+                "bool": {
+                    "must": [
+                        {"term": {"level": "house"}},
+                        {"match_phrase": {"name_norm": {"query": street_phrase}}}
+                    ],
+                    "boost": 80.0
+                }
+            })
+
+        # Дополнительный should для точного совпадения комбинации дом+корпус+строение
+        if house_number:
+            combo_must: List[Dict[str, Any]] = [{"term": {"house_number": house_number}}]
+            if korpus:
+                # Поддержка вариантов записи корпуса
+                combo_must.append({"terms": {"korpus": build_korpus_variants(korpus)}})
+            if stroenie:
+                # Поддержка вариантов записи строения
+                combo_must.append({"terms": {"stroenie": build_stroenie_variants(stroenie)}})
+            
+            # Требуем также совпадение по уличной части запроса, чтобы исключить чужие улицы
+            search_body["query"]["bool"]["should"].append({
+                "bool": {
+                    "must": combo_must + [{"match": {"full_norm": {"query": query, "operator": "and"}}}],
+                    "boost": 50.0
+                }
+            })
+
+            # Сильный приоритет для домов на той же уличной части (строгий фразовый матч по full_norm)
+            search_body["query"]["bool"]["should"].append({
+                "bool": {
+                    "must": [
+                        {"term": {"level": "house"}},
+                        {"match": {"full_norm": {"query": query, "operator": "and"}}}
+                    ],
+                    "boost": 65.0
+                }
+            })
+            
+            # Очень высокий приоритет для точного совпадения дома БЕЗ строения/корпуса
+            # если в запросе не указаны строение/корпус
+            if not korpus and not stroenie:
+                search_body["query"]["bool"]["should"].append({
+                    "bool": {
+                        "must": [
+                            {"term": {"house_number": house_number}},
+                            {"bool": {"must_not": [{"exists": {"field": "stroenie"}}]}},
+                            {"bool": {"must_not": [{"exists": {"field": "korpus"}}]}},
+                            {"match": {"full_norm": {"query": query, "operator": "and"}}}
+                        ],
+                        "boost": 100.0  # Очень высокий буст для точного совпадения
+                    }
+                })
+            
+            # Усиленная логика для точного совпадения дом+строение
+            # Это особенно важно для случаев типа "84с2" где строение может быть в korpus
+            if stroenie:
+                # Вариант 1: точное совпадение дом + строение в korpus
+                stroenie_korpus_variants = build_stroenie_variants(stroenie)
+                search_body["query"]["bool"]["should"].append({
+                    "bool": {
+                        "must": [
+                            {"term": {"house_number": house_number}},
+                            {"terms": {"korpus": stroenie_korpus_variants}},
+                            # Требуем совпадение по уличной части запроса, чтобы не подтягивать чужие улицы
+                            {"match": {"full_norm": {"query": query, "operator": "and"}}}
+                        ],
+                        "boost": 60.0  # Высокий буст для точного совпадения
+                    }
+                })
+                
+                # Вариант 2: точное совпадение дом + строение в stroenie
+                search_body["query"]["bool"]["should"].append({
+                    "bool": {
+                        "must": [
+                            {"term": {"house_number": house_number}},
+                            {"terms": {"stroenie": stroenie_korpus_variants}},
+                            # Требуем совпадение по уличной части запроса
+                            {"match": {"full_norm": {"query": query, "operator": "and"}}}
+                        ],
+                        "boost": 60.0
+                    }
+                })
+                
+                # Вариант 3: фразовое совпадение в full_norm для дом+строение
+                house_stroenie_phrase = f"дом {house_number} стр {stroenie}"
+                # Ограничим фразовый буст также совпадением по уличной части запроса
+                search_body["query"]["bool"]["should"].append({
+                    "bool": {
+                        "must": [
+                            {"match_phrase": {"full_norm": {"query": house_stroenie_phrase}}},
+                            {"match": {"full_norm": {"query": query, "operator": "and"}}}
+                        ],
+                        "boost": 70.0
+                    }
+                })
+
+        # Бусты по типам, если в запросе встречаются индикаторы
+        tokens_lc = set([t.lower() for t in query_tokens])
+
+        # Дополнительные бусты для сценариев с номером дома, когда точного номера может не быть
+        if house_number:
+            # 1) Предпочитать дома на той же уличной части запроса, даже если номер отличается
+            dynamic_should.append({
+                "bool": {
+                    "must": [
+                        {"term": {"level": "house"}},
+                        {"match_phrase": {"full_norm": {"query": query}}}
+                    ],
+                    "boost": 35.0
+                }
+            })
+            # 2) Повысить документы, где номер дома начинается с указанного и имеет дополнение через '/'
+            #    Пример: запрос "21" — поднимаем "21/2", "21/1" и т.п.
+            dynamic_should.append({
+                "wildcard": {
+                    "house_number": {
+                        "value": f"{house_number}/*",
+                        "boost": 30.0
+                    }
+                }
+            })
+            # 3) Поиск номеров домов, начинающихся с того же числа
+            #    Пример: запрос "7/5" — поднимаем "7", "7/1", "7/2" и т.п.
+            house_base = house_number.split('/')[0] if '/' in house_number else house_number
+            if house_base != house_number:
+                dynamic_should.append({
+                    "wildcard": {
+                        "house_number": {
+                            "value": f"{house_base}*",
+                            "boost": 25.0
+                        }
+                    }
+                })
+                # Также ищем точное совпадение базового номера
+                dynamic_should.append({
+                    "term": {
+                        "house_number": {
+                            "value": house_base,
+                            "boost": 20.0
+                        }
+                    }
+                })
+            # 3) Усилить фразовый матч всей фразы (с админ-иерархией), чтобы предпочесть нужную территорию
+            if full_phrase:
+                dynamic_should.append({
+                    "match_phrase": {
+                        "full_norm": {
+                            "query": full_phrase,
+                            "boost": 40.0
+                        }
+                    }
+                })
+        # площадь/вокзал - усиленный буст
+        if ("пл" in tokens_lc) or any("вокзал" in t for t in tokens_lc):
+            dynamic_should.append(_type_boost(["пл"], 35.0))  # Увеличили с 25.0 до 35.0
+            # Дополнительный буст для точного совпадения названия площади
+            dynamic_should.append({
+                "bool": {
+                    "must": [
+                        {"term": {"type_norm": "пл"}},
+                        {"match_phrase": {"name_norm": {"query": query, "boost": 40.0}}}
+                    ],
+                    "boost": 50.0  # Увеличили с 40.0 до 50.0
+                }
+            })
+            # Дополнительный буст для точного совпадения названия площади
+            dynamic_should.append({
+                "match_phrase": {
+                    "name_norm": {
+                        "query": query,
+                        "boost": 45.0
+                    }
+                }
+            })
+        # шоссе — отдельный сильный буст (ш)
+        if ("ш" in tokens_lc) or ("ш." in tokens_lc):
+            dynamic_should.append(_type_boost(["ш"], 35.0))  # Увеличили с 20.0 до 35.0
+            dynamic_should.append({
+                "bool": {
+                    "must": [
+                        {"term": {"type_norm": "ш"}},
+                        {"match_phrase": {"name_norm": {"query": query, "boost": 25.0}}}
+                    ],
+                    "boost": 45.0  # Увеличили с 30.0 до 45.0
+                }
+            })
+            # Дополнительный буст для точного совпадения названия шоссе
+            dynamic_should.append({
+                "match_phrase": {
+                    "name_norm": {
+                        "query": query,
+                        "boost": 40.0
+                    }
+                }
+            })
+        # СНТ/садоводства
+        if "снт" in tokens_lc:
+            dynamic_should.append(_type_boost(["снт", "тер"], 12.0))
+        # проспекты - усиленный буст
+        if "пр" in tokens_lc or "пр-кт" in tokens_lc:
+            dynamic_should.append(_type_boost(["пр-кт"], 20.0))
+            # Дополнительный буст для точного совпадения названия проспекта
+            dynamic_should.append({
+                "bool": {
+                    "must": [
+                        {"term": {"type_norm": "пр-кт"}},
+                        {"match_phrase": {"name_norm": {"query": query, "boost": 25.0}}}
+                    ],
+                    "boost": 35.0
+                }
+            })
+        # посёлки — увеличим буст
+        if "пос" in tokens_lc or "пос." in tokens_lc:
+            dynamic_should.append(_type_boost(["пос"], 25.0))  # Увеличили с 15.0 до 25.0
+            # Дополнительный буст для точного совпадения названия посёлка
+            dynamic_should.append({
+                "bool": {
+                    "must": [
+                        {"term": {"type_norm": "пос"}},
+                        {"match_phrase": {"name_norm": {"query": query, "boost": 30.0}}}
+                    ],
+                    "boost": 40.0
+                }
+            })
+            # Дополнительный буст для точного совпадения названия посёлка
+            dynamic_should.append({
+                "match_phrase": {
+                    "name_norm": {
+                        "query": query,
+                        "boost": 35.0
+                    }
+                }
+            })
+        # рп
+        if "рп" in tokens_lc:
+            dynamic_should.append(_type_boost(["рп"], 6.0))
+        # деревня/село — осторожный буст
+        if "д" in tokens_lc:
+            dynamic_should.append(_type_boost(["д"], 3.0))
+        if "с" in tokens_lc:
+            dynamic_should.append(_type_boost(["с"], 3.0))
+        # Москва — усилим документы с кодом региона 77
+        if "москва" in tokens_lc:
+            dynamic_should.append({
+                "constant_score": {
+                    "filter": {"term": {"region_code": "77"}},
+                    "boost": 50.0
+                }
+            })
+
+        # МКАД — отдельно усилим совпадение по названию
+        if any(t in {"мкад", "кад"} for t in tokens_lc):
+            dynamic_should.append({
+                "match_phrase": {"name_norm": {"query": "мкад", "boost": 20.0}}
+            })
+            
+            # Если есть "вл" в запросе, добавим фильтр по типу владения
+            if any("вл" in t.lower() for t in tokens_lc):
+                # Ищем владения в МКАД
+                dynamic_should.append({
+                    "bool": {
+                        "must": [
+                            {"match_phrase": {"name_norm": {"query": "мкад"}}},
+                            {"term": {"house_type": "владение"}}
+                        ],
+                        "boost": 30.0
+                    }
+                })
+            
+        # Поддержка новых полей индекса: house_type и road_km
+        # house_type: владение/строение/сооружение/литера
+        if stroenie:
+            # Если есть строение, усилим совпадение с house_type="строение"
+            dynamic_should.append({
+                "constant_score": {
+                    "filter": {"term": {"house_type": "строение"}},
+                    "boost": 15.0  # Увеличили с 5.0 до 15.0
+                }
+            })
+            # Дополнительный буст для точного совпадения строения
+            dynamic_should.append({
+                "match_phrase": {
+                    "full_norm": {
+                        "query": f"стр {stroenie}",
+                        "boost": 25.0
+                    }
+                }
+            })
+            # Буст для варианта "с{stroenie}"
+            dynamic_should.append({
+                "match_phrase": {
+                    "full_norm": {
+                        "query": f"с{stroenie}",
+                        "boost": 30.0
+                    }
+                }
+            })
+            
+        # road_km для МКАД/КАД
+        if any(t in {"мкад", "кад"} for t in tokens_lc):
+            # Ищем километр в запросе
+            km_match = _ROAD_KM_RX.search(query.lower())
+            if km_match:
+                km_number = int(km_match.group(1))
+                dynamic_should.append({
+                    "constant_score": {
+                        "filter": {"term": {"road_km": km_number}},
+                        "boost": 20.0
+                    }
+                })
+            
+            # Усилим поиск по МКАД даже без road_km
+            dynamic_should.append({
+                "match_phrase": {
+                    "full_norm": {
+                        "query": "мкад",
+                        "boost": 15.0
+                    }
+                }
+            })
+            
+            # Если есть "вл" в запросе, усилим поиск владений
+            if any("вл" in t.lower() for t in tokens_lc):
+                dynamic_should.append({
+                    "constant_score": {
+                        "filter": {"term": {"house_type": "владение"}},
+                        "boost": 10.0
+                    }
+                })
+
+        # Применяем динамические should условия
+        search_body["query"]["bool"]["should"].extend(dynamic_should)
+
+        # Лёгкие морф-варианты запроса (например, "савеловского" -> "савеловский")
+        morph_variants = [] if skip_variants else generate_morph_variants(query)
+        for mv in morph_variants:
+            search_body["query"]["bool"]["should"].append({
+                "multi_match": {
+                    "query": mv,
+                    "fields": ["name_norm", "full_norm"],
+                    "type": "best_fields",
+                    "operator": "and",
+                    "boost": 1.4
+                }
+            })
+            search_body["query"]["bool"]["should"].append({
+                "match_phrase": {"full_norm": {"query": mv, "boost": 2.0}}
+            })
+        
+        # Текстовое условие фолбэков, которые не наследуют основное тело
+        street_must: Dict[str, Any] = {"match": {"full_norm": {"query": query, "operator": "and"}}}
+        if canonical_fields or ru_analyzer:
+            # Текстовая часть — только канонические поля или подполя .ru: варианты запроса выше в тело не попадают
+            text_query = (_reduce_admin_tokens(query) if admin_present else query) or query
+            street_must = _canonical_must(text_query) if canonical_fields else _ru_analyzer_must(text_query)
+            search_body = _with_text_must(search_body, street_must, house_number, korpus, stroenie)
+
+        # Каскад фолбэков: тела запросов в порядке приоритета. Ни одно из них не зависит от ответа ES,
+        # поэтому каскад можно выполнить последовательно (до первого непустого ответа) или одним _msearch
+        cascade_bodies: List[Dict[str, Any]] = [search_body]
+        cascade_labels: List[str] = ["primary"]
+
+        # Фолбэк: если фильтры по дому дают 0 — постепенно ослабляем ТОЛЬКО домовые детали, не отпуская уровень
+        had_house = bool(house_number)
+        had_korpus = bool(korpus)
+        had_stroenie = bool(stroenie)
+
+        # Порядок: убрать stroenie -> убрать korpus -> убрать house_number
+        attempt_bodies = []
+        if had_stroenie:
+            attempt_bodies.append(("relax_stroenie", _with_house_musts(search_body, _house_musts(house_number, korpus, stroenie, True, True, False))))
+        if had_korpus:
+            attempt_bodies.append(("relax_korpus", _with_house_musts(search_body, _house_musts(house_number, korpus, stroenie, True, False, True))))
+        if had_house:
+            attempt_bodies.append(("relax_house", _with_house_musts(search_body, _house_musts(house_number, korpus, stroenie, False, True, True))))
+        # Полностью без домовых фильтров, но оставим level=house
+        attempt_bodies.append(("relax_all", _with_house_musts(search_body, _house_musts(house_number, korpus, stroenie, False, False, False))))
+
+        for label, b in attempt_bodies:
+            # Гарантируем, что уровень остаётся house, если вход содержал домовые компоненты
+            if house_number or korpus or stroenie:
+                qb = b.get("query", {}).get("bool", {})
+                filters = qb.get("filter", [])
+                # Добавим/сохраним term level=house
+                level_filter = {"term": {"level": "house"}}
+                if not any(isinstance(f, dict) and f.get("term", {}).get("level") == "house" for f in filters):
+                    filters.append(level_filter)
+                    qb["filter"] = filters
+                    b["query"]["bool"] = qb
+            cascade_bodies.append(b)
+            cascade_labels.append(label)
+
+        # Попробуем чисто фильтрами по домам (без текстового must), если всё ещё пусто
+        if had_house or had_korpus or had_stroenie:
+            # Фильтровочный запрос, но сохраним регион и усилим улицу, если можем
+            filter_only_filters = [{"bool": {"must": _house_musts(house_number, korpus, stroenie, had_house, had_korpus, had_stroenie)}}]
+            # Сохраним региональные фильтры из исходного запроса
+            for f in search_body.get("query", {}).get("bool", {}).get("filter", []) or []:
+                if isinstance(f, dict) and ("terms" in f or "term" in f):
+                    filter_only_filters.append(f)
+            
+            # Добавим поиск похожих номеров домов
+            similar_house_filters = []
+            if house_number:
+                # Ищем номера домов, начинающиеся с того же числа
+                house_base = house_number.split('/')[0] if '/' in house_number else house_number
+                similar_house_filters.append({
+                    "bool": {
+                        "should": [
+                            {"wildcard": {"house_number": f"{house_base}*"}},
+                            {"wildcard": {"house_number": f"*{house_base}*"}}
+                        ],
+                        "minimum_should_match": 1
+                    }
+                })
+            
+            filter_only_body: Dict[str, Any] = {
+                "size": limit,
+                "query": {
+                    "bool": {
+                        "filter": filter_only_filters + similar_house_filters,
+                        # Небольшой must по уличной части, чтобы придерживаться исходной улицы
+                        "must": [street_must]
+                    }
+                },
+                "_source": search_body.get("_source", [])
+            }
+            cascade_bodies.append(filter_only_body)
+            cascade_labels.append("filter_only")
+
+        # Финальный фолбэк: если всё ещё пусто — возвращаемся к общему поиску без домовых ограничений
+        # Проверяем, есть ли в запросе конкретная улица
+        has_specific_street = False
+        # Проверяем нормализованный query (где типы уже приведены к канону)
+        if query and len(query.split()) >= 2:
+            # Если в нормализованном запросе есть тип улицы, значит была конкретная улица
+            query_tokens = [t for t in query.split() if t]
+            for token in query_tokens:
+                if token in SPECIFIC_STREET_TYPES:
+                    has_specific_street = True
+                    break
+        
+        # Если есть конкретная улица, но точного совпадения нет — ищем похожие адреса
+        if has_specific_street:
+            # Ищем похожие номера домов на той же улице
+            similar_house_body = {
+                "size": limit,
+                "query": {
+                    "bool": {
+                        "must": [
+                            street_must,
+                            {"term": {"level": "house"}}
+                        ],
+                        "should": [],
+                        "filter": []
+                    }
+                },
+                "_source": search_body.get("_source", [])
+            }
+            
+            # Добавляем региональные фильтры, если они были в исходном запросе
+            region_code = None
+            if has_moscow:
+                region_code = "77"
+            elif has_moscow_region or has_balashikha:
+                region_code = "50"  # Московская область
+            elif has_leningrad_region:
+                region_code = "47"  # Ленинградская область
+            
+            if region_code:
+                similar_house_body["query"]["bool"]["filter"].append(
+                    {"terms": {"region_code": [region_code, int(region_code)]}}
+                )
+            
+            # Если был номер дома, добавляем бусты для похожих номеров
+            if house_number:
+                # Буст для номеров, начинающихся с того же числа
+                house_base = house_number.split('/')[0] if '/' in house_number else house_number
+                similar_house_body["query"]["bool"]["should"].extend([
+                    {"wildcard": {"house_number": f"{house_base}*"}},
+                    {"wildcard": {"house_number": f"*{house_base}*"}}
+                ])
+            
+            # Если был корпус, добавляем буст для домов с корпусами
+            if korpus:
+                similar_house_body["query"]["bool"]["should"].append(
+                    {"exists": {"field": "korpus"}, "boost": 2.0}
+                )
+            
+            # Если было строение, добавляем буст для домов со строениями
+            if stroenie:
+                similar_house_body["query"]["bool"]["should"].append(
+                    {"exists": {"field": "stroenie"}, "boost": 2.0}
+                )
+            
+            cascade_bodies.append(similar_house_body)
+            cascade_labels.append("similar_house")
+        else:
+            # Только для общих запросов (без конкретной улицы) делаем fallback
+            region_code = None
+            if has_moscow:
+                region_code = "77"
+            elif has_moscow_region or has_balashikha:
+                region_code = "50"  # Московская область
+            elif has_leningrad_region:
+                region_code = "47"  # Ленинградская область
+            else:
+                # Fallback на старую логику
+                ql = (query or "").lower()
+                if "екатеринбург" in ql or "свердлов" in ql:
+                    region_code = "66"
+
+            final_body = _clone_body_wo_filters(search_body)
+            # Добавим фильтр по региону, если распознали
+            if region_code:
+                qb = final_body["query"]["bool"]
+                filters = qb.get("filter", []) or []
+                # Поддержим числовой и строковый вариант
+                filters.append({"terms": {"region_code": [region_code, int(region_code)]}})
+                qb["filter"] = filters
+            # Усилим should для улиц/площадей, чтобы вернуть что-то осмысленное
+            final_body["query"]["bool"]["should"].extend([
+                {"constant_score": {"filter": {"term": {"level": "street"}}, "boost": 5.0}},
+                {"constant_score": {"filter": {"term": {"level": "city"}}, "boost": 2.0}},
+            ])
+            cascade_bodies.append(final_body)
+            cascade_labels.append("final")
+
+        return QueryPlan(primary=search_body, fallbacks=tuple(cascade_bodies[1:]), fallback_labels=tuple(cascade_labels[1:]))
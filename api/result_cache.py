@@ -0,0 +1,238 @@
+"""
+Кэш результатов поиска перед Elasticsearch
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple
+
+from .models import AddressItem
+
+logger = logging.getLogger(__name__)
+
+# Ключ в _meta маппинга, которым ETL помечает каждую загрузку индекса
+INDEX_GENERATION_META_KEY = "generation"
+
+
+def read_index_generation(settings_response: Dict[str, Any], mapping_response: Dict[str, Any]) -> str:
+    """Поколение индекса по ответам _settings и _mapping.
+    Складывается из UUID конкретных индексов за именем/алиасом (меняется при пересоздании индекса
+    и переключении алиаса) и метки _meta.generation, которую ставит ETL после каждой загрузки.
+    """
+    settings_response = getattr(settings_response, "body", settings_response) or {}
+    mapping_response = getattr(mapping_response, "body", mapping_response) or {}
+    parts = []
+    for name in sorted(settings_response):
+        uuid = settings_response[name].get("settings", {}).get("index", {}).get("uuid", "")
+        meta = mapping_response.get(name, {}).get("mappings", {}).get("_meta", {}) or {}
+        parts.append(f"{name}/{uuid}/{meta.get(INDEX_GENERATION_META_KEY, '')}")
+    return ";".join(parts)
+
+
+def update_index_meta(es, index: str, values: Dict[str, Any]) -> None:
+    """Дописать ключи в _meta маппинга (put_mapping заменяет _meta целиком, поэтому сливаем с текущим)"""
+    mappings = es.indices.get_mapping(index=index)
+    for name, mapping in getattr(mappings, "body", mappings).items():
+        meta = dict(mapping.get("mappings", {}).get("_meta") or {})
+        meta.update(values)
+        es.indices.put_mapping(index=name, meta=meta)
+
+
+def stamp_index_generation(es, index: str) -> str:
+    """Пометить индекс новым поколением (вызывается ETL после загрузки)"""
+    generation = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    update_index_meta(es, index, {INDEX_GENERATION_META_KEY: generation})
+    return generation
+
+
+class _MemoryBackend:
+    """LRU с TTL в памяти процесса"""
+
+    is_local = True
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[Tuple, Tuple[float, Tuple[AddressItem, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, generation: Optional[str], key: Tuple) -> Optional[List[AddressItem]]:
+        full_key = (generation, key)
+        with self._lock:
+            entry = self._data.get(full_key)
+            if entry is None:
+                return None
+            expires_at, items = entry
+            if expires_at < time.monotonic():
+                del self._data[full_key]
+                self.expirations += 1
+                return None
+            self._data.move_to_end(full_key)
+        # Элементы общие для всех попаданий и только для чтения (вызывающие их не меняют);
+        # новый список — чтобы операции над ним не затрагивали запись кэша
+        return list(items)
+
+    def set(self, generation: Optional[str], key: Tuple, items: List[AddressItem]) -> None:
+        full_key = (generation, key)
+        with self._lock:
+            self._data[full_key] = (time.monotonic() + self.ttl, tuple(items))
+            self._data.move_to_end(full_key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def size(self) -> Optional[int]:
+        return len(self._data)
+
+
+class _RedisBackend:
+    """Общий кэш для нескольких воркеров (Redis или совместимый сервер).
+    Поколение входит в ключ: записи старого поколения просто истекают по TTL.
+    Вытеснение по размеру — политикой maxmemory на стороне сервера.
+    """
+
+    is_local = False
+
+    def __init__(self, url: str, ttl: float, prefix: str = "fias:search"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("Для RESULT_CACHE_BACKEND=redis требуется пакет redis") from e
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0
+        self.expirations = 0
+
+    def _redis_key(self, generation: Optional[str], key: Tuple) -> str:
+        digest = hashlib.sha1(json.dumps(key, ensure_ascii=False).encode("utf-8")).hexdigest()
+        return f"{self.prefix}:{generation or '-'}:{digest}"
+
+    def get(self, generation: Optional[str], key: Tuple) -> Optional[List[AddressItem]]:
+        payload = self.client.get(self._redis_key(generation, key))
+        if payload is None:
+            return None
+        return [AddressItem(**item) for item in json.loads(payload)]
+
+    def set(self, generation: Optional[str], key: Tuple, items: List[AddressItem]) -> None:
+        payload = json.dumps([item.model_dump() for item in items], ensure_ascii=False)
+        self.client.set(self._redis_key(generation, key), payload, ex=max(1, int(self.ttl)))
+
+    def clear(self) -> None:
+        # Ключи старого поколения не читаются и истекают сами
+        pass
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class ResultCache:
+    """Кэш результатов SearchService.search с TTL, вытеснением и инвалидацией по поколению индекса.
+    Ошибки бэкенда не ломают поиск: считаются промахом.
+    """
+
+    def __init__(self, backend: str = "memory", max_entries: int = 10000, ttl: float = 300, redis_url: Optional[str] = None):
+        if backend == "redis":
+            self.backend = _RedisBackend(redis_url or "redis://localhost:6379/0", ttl)
+        elif backend == "memory":
+            self.backend = _MemoryBackend(max_entries, ttl)
+        else:
+            raise ValueError(f"Неизвестный бэкенд кэша результатов: {backend}")
+        self.backend_name = backend
+        self.generation: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+        self.invalidations = 0
+
+    @property
+    def is_local(self) -> bool:
+        """Бэкенд в памяти процесса: вызовы не блокируют event loop"""
+        return self.backend.is_local
+
+    @staticmethod
+    def make_key(
+        query: str,
+        house_number: Optional[str],
+        korpus: Optional[str],
+        stroenie: Optional[str],
+        limit: int,
+        full_phrase: Optional[str],
+        expanded_phrase: Optional[str],
+        has_moscow: bool,
+        has_moscow_region: bool,
+        has_balashikha: bool,
+        has_leningrad_region: bool
+    ) -> Tuple:
+        """Ключ по нормализованному запросу, домовым деталям, флагам регионов и лимиту"""
+        return (
+            query, house_number, korpus, stroenie, limit, full_phrase, expanded_phrase,
+            bool(has_moscow), bool(has_moscow_region), bool(has_balashikha), bool(has_leningrad_region)
+        )
+
+    def get(self, key: Tuple) -> Optional[List[AddressItem]]:
+        try:
+            items = self.backend.get(self.generation, key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Ошибка чтения кэша результатов: {e}")
+            items = None
+        if items is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return items
+
+    def set(self, key: Tuple, items: List[AddressItem], generation: Optional[str]) -> None:
+        """Сохранить результат, посчитанный при поколении generation.
+        Если поколение успело смениться, пока шёл запрос в ES, результат не кэшируется.
+        """
+        if generation != self.generation:
+            return
+        try:
+            self.backend.set(generation, key, items)
+            self.stores += 1
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Ошибка записи в кэш результатов: {e}")
+
+    def set_generation(self, generation: str) -> bool:
+        """Зафиксировать текущее поколение индекса; True, если оно сменилось и кэш сброшен"""
+        if generation == self.generation:
+            return False
+        if self.generation is not None:
+            logger.info(f"Поколение индекса сменилось: {self.generation} -> {generation}, сбрасываем кэш результатов")
+        self.generation = generation
+        self.backend.clear()
+        self.invalidations += 1
+        return True
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend_name,
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "errors": self.errors,
+            "invalidations": self.invalidations,
+            "evictions": self.backend.evictions,
+            "expirations": self.backend.expirations,
+            "size": self.backend.size(),
+        }
@@ -0,0 +1,102 @@
+"""
+Подсказки адресов при вводе (type-ahead) по completion-полю suggest.
+
+Вместо каскада SearchService — один лёгкий запрос с секцией suggest: без разбора дома,
+фолбэков и десятков should-условий. Поле suggest (регионы, города, улицы) заполняет ETL
+через suggest_entry(); контексты region и level сужают подсказки.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from elasticsearch import AsyncElasticsearch
+
+from config import settings
+from .models import AddressItem
+
+# Уровни, которые попадают в подсказки, и их вес (регион и город выше улицы при равном совпадении)
+SUGGEST_LEVEL_WEIGHTS = {"region": 30, "city": 20, "street": 10}
+# Поля документа в ответе подсказок
+SUGGEST_SOURCE_FIELDS = ("level", "name_norm", "name_exact", "full_norm", "type_norm", "region_code", "geo")
+# Перестановки слов названия: "дмитровка большая" подсказывается и на "большая дм..."
+SUGGEST_MAX_ROTATED_WORDS = 3
+# С какой длины префикса допускается опечатка
+SUGGEST_FUZZY_MIN_LENGTH = 5
+
+
+def suggest_prefix(text: str) -> str:
+    """Префикс для completion: нижний регистр, ё -> е, одиночные пробелы (без тяжёлой normalize_query)"""
+    return " ".join(text.lower().replace("ё", "е").split())
+
+
+def suggest_entry(level: str, name_norm: Optional[str], type_norm: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Значение поля suggest для документа (None — уровень без подсказок)"""
+    if level not in SUGGEST_LEVEL_WEIGHTS or not name_norm:
+        return None
+    name = suggest_prefix(name_norm)
+    words = name.split()
+    inputs = [name]
+    if 1 < len(words) <= SUGGEST_MAX_ROTATED_WORDS:
+        inputs.extend(" ".join(words[i:] + words[:i]) for i in range(1, len(words)))
+    if type_norm:
+        inputs.append(f"{type_norm} {name}")
+        inputs.append(f"{name} {type_norm}")
+    return {"input": list(dict.fromkeys(inputs)), "weight": SUGGEST_LEVEL_WEIGHTS[level]}
+
+
+def suggest_body(
+    text: str,
+    limit: int,
+    region_code: Optional[str] = None,
+    levels: Optional[List[str]] = None
+) -> Optional[Dict[str, Any]]:
+    """Тело _search только с секцией suggest (size=0: хиты основного запроса не нужны)"""
+    prefix = suggest_prefix(text)
+    if not prefix:
+        return None
+    completion: Dict[str, Any] = {"field": "suggest", "size": limit, "skip_duplicates": True}
+    contexts: Dict[str, List[str]] = {}
+    if region_code:
+        contexts["region"] = [str(region_code)]
+    if levels:
+        contexts["level"] = list(levels)
+    if contexts:
+        completion["contexts"] = contexts
+    if len(prefix) >= SUGGEST_FUZZY_MIN_LENGTH:
+        completion["fuzzy"] = {"fuzziness": 1, "prefix_length": 2}
+    return {
+        "size": 0,
+        "_source": list(SUGGEST_SOURCE_FIELDS),
+        "suggest": {"address": {"prefix": prefix, "completion": completion}}
+    }
+
+
+class SuggestService:
+    """Подсказки через completion suggester на клиенте и индексе сервиса поиска (sync или async клиент)
+    или, если передан memory_index (api/suggest_index.py), из префиксного индекса в процессе без ES.
+    """
+
+    def __init__(self, search_service, memory_index=None):
+        self.search_service = search_service
+        self.memory_index = memory_index
+
+    async def suggest(
+        self,
+        text: str,
+        limit: int = 5,
+        region_code: Optional[str] = None,
+        levels: Optional[List[str]] = None
+    ) -> List[AddressItem]:
+        if self.memory_index is not None:
+            # Поиск в памяти занимает доли миллисекунды: без пула потоков
+            return self.search_service._hits_to_items(self.memory_index.lookup(text, limit, region_code, levels))
+        body = suggest_body(text, limit, region_code, levels)
+        if body is None:
+            return []
+        es, index = self.search_service.es, self.search_service.index
+        if isinstance(es, AsyncElasticsearch):
+            # Отмена задачи (клиент ушёл) прерывает и HTTP-запрос к ES
+            response = await es.search(index=index, body=body, request_timeout=settings.SUGGEST_TIMEOUT)
+        else:
+            response = await asyncio.to_thread(es.search, index=index, body=body, request_timeout=settings.SUGGEST_TIMEOUT)
+        options = response["suggest"]["address"][0]["options"]
+        return self.search_service._hits_to_items(options)
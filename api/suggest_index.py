@@ -0,0 +1,160 @@
+"""
+Подсказки без Elasticsearch: префиксный индекс в памяти процесса API.
+
+ETL пишет компактный снимок (write_suggest_snapshot) из выгрузки: по каждому уровню
+(region, city, street) отсортированный массив ключей — входов suggest_entry() — и номера
+записей; записи хранятся отдельно компактным JSON. API открывает снимок через mmap
+(api/mapped_file.py): загрузка мгновенная, страницы общие для всех воркеров uvicorn.
+Поиск префикса — бинарный поиск по отсортированным ключам и проход по диапазону
+с фильтрами региона и уровня.
+"""
+import json
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .mapped_file import BytesColumn, MappedFile, bytes_column, write_mapped_file
+from .suggest import SUGGEST_LEVEL_WEIGHTS, suggest_entry, suggest_prefix
+
+SNAPSHOT_MAGIC = b"FIASSUG1"
+SNAPSHOT_VERSION = 1
+# Поля записи в снимке (то же, что SUGGEST_SOURCE_FIELDS у completion)
+SNAPSHOT_RECORD_FIELDS = ("level", "name_norm", "name_exact", "full_norm", "type_norm", "region_code", "geo")
+# Номер региона «без кода» в массиве регионов записей
+NO_REGION = 0xFFFF
+# Сколько ключей диапазона просматривается на уровень: граница задержки для однобуквенных
+# префиксов с узким фильтром региона
+SUGGEST_SCAN_LIMIT = 20000
+# Окно последних задержек для /metrics/suggest
+LATENCY_WINDOW = 1024
+
+
+def write_suggest_snapshot(path: str, sources: Iterable[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """Снимок подсказок из пар (id, документ) выгрузки; дома и уровни без подсказок пропускаются"""
+    records: List[bytes] = []
+    record_regions = array("H")
+    regions: Dict[str, int] = {}
+    # Ключ и номер записи в одной строке байт: сортировка по ключу, \0 меньше любого символа
+    entries: Dict[str, List[bytes]] = {level: [] for level in SUGGEST_LEVEL_WEIGHTS}
+
+    for doc_id, source in sources:
+        entry = suggest_entry(source["level"], source.get("name_norm"), source.get("type_norm"))
+        if entry is None:
+            continue
+        packed_id = struct.pack(">I", len(records))
+        for key in entry["input"]:
+            entries[source["level"]].append(key.encode("utf-8") + b"\0" + packed_id)
+        region_code = source.get("region_code")
+        if region_code is None:
+            record_regions.append(NO_REGION)
+        else:
+            record_regions.append(regions.setdefault(str(region_code), len(regions)))
+        record = {"id": str(doc_id), **{k: source.get(k) for k in SNAPSHOT_RECORD_FIELDS if source.get(k) is not None}}
+        records.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    sections = bytes_column("records", records) + [("record_regions", record_regions)]
+    key_counts: Dict[str, int] = {}
+    for level, items in entries.items():
+        items.sort()
+        key_records = array("I", (struct.unpack(">I", item[-4:])[0] for item in items))
+        sections += bytes_column(f"{level}.keys", (item[:-5] for item in items))
+        sections.append((f"{level}.key_records", key_records))
+        key_counts[level] = len(key_records)
+        items.clear()
+
+    return write_mapped_file(path, SNAPSHOT_MAGIC, {
+        "version": SNAPSHOT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "records": len(records),
+        "keys": key_counts,
+        "regions": sorted(regions, key=regions.get),
+    }, sections)
+
+
+class PrefixSuggestIndex:
+    """Префиксный индекс подсказок из снимка write_suggest_snapshot (только чтение, mmap)"""
+
+    def __init__(self, path: str, scan_limit: int = SUGGEST_SCAN_LIMIT):
+        self.path = path
+        self.scan_limit = scan_limit
+        self.file = MappedFile(path, SNAPSHOT_MAGIC, SNAPSHOT_VERSION)
+        self.header = self.file.header
+        self._records = BytesColumn(self.file, "records")
+        self._record_regions = self.file.section("record_regions", "H")
+        self._region_ids = {code: n for n, code in enumerate(self.header["regions"])}
+        # Ключи уровня (для bisect) и номера записей по тем же позициям
+        self._levels = {
+            level: (BytesColumn(self.file, f"{level}.keys"), self.file.section(f"{level}.key_records", "I"))
+            for level in SUGGEST_LEVEL_WEIGHTS
+        }
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.lookups = 0
+
+    def record(self, record_id: int) -> Dict[str, Any]:
+        return json.loads(self._records[record_id])
+
+    def lookup(
+        self,
+        text: str,
+        limit: int = 5,
+        region_code: Optional[str] = None,
+        levels: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Хиты в формате ответа ES (_id, _score, _source): уровни по убыванию веса,
+        внутри уровня — по алфавиту ключа (точное совпадение префикса раньше продолжений)
+        """
+        started = time.perf_counter()
+        try:
+            prefix = suggest_prefix(text).encode("utf-8")
+            if not prefix:
+                return []
+            region = None
+            if region_code is not None:
+                region = self._region_ids.get(str(region_code))
+                if region is None:
+                    return []
+            hits: List[Dict[str, Any]] = []
+            seen = set()
+            for level in SUGGEST_LEVEL_WEIGHTS:
+                if levels and level not in levels:
+                    continue
+                keys, key_records = self._levels[level]
+                lo = bisect_left(keys, prefix)
+                # \xff не встречается в UTF-8: верхняя граница всех ключей с этим префиксом
+                hi = min(bisect_left(keys, prefix + b"\xff", lo), lo + self.scan_limit)
+                for i in range(lo, hi):
+                    record_id = key_records[i]
+                    if record_id in seen or (region is not None and self._record_regions[record_id] != region):
+                        continue
+                    seen.add(record_id)
+                    source = self.record(record_id)
+                    hits.append({"_id": source.pop("id"), "_score": float(SUGGEST_LEVEL_WEIGHTS[level]), "_source": source})
+                    if len(hits) >= limit:
+                        return hits
+            return hits
+        finally:
+            self.lookups += 1
+            self._latencies.append(time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        """Размер снимка и задержки последних поисков (для /metrics/suggest)"""
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3) if latencies else 0.0
+
+        return {
+            "path": self.path,
+            "created": self.header["created"],
+            "records": self.header["records"],
+            "keys": self.header["keys"],
+            "mapped_bytes": len(self.file),
+            "lookups": self.lookups,
+            "latency_ms": {"p50": percentile(0.5), "p99": percentile(0.99), "max": percentile(1.0)},
+        }
+
+    def close(self) -> None:
+        self.file.close()
@@ -0,0 +1,111 @@
+"""
+Разбивка времени запроса по стадиям: нормализация, план, кэш, каждый запрос к ES, сборка ответа.
+
+Замер привязан к HTTP-запросу через contextvars и виден в asyncio.to_thread.
+Вне запроса (ETL, скрипты) активного замера нет, и функции модуля ничего не делают.
+Вызовы ES и ветки каскада попадают и в трассу запроса (api/tracing.py), если она ведётся.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .tracing import current_trace
+
+# Ветка ответа из кэша результатов и ответ без хитов во всём каскаде
+BRANCH_CACHE = "cache"
+BRANCH_NONE = "none"
+
+
+class RequestTiming:
+    """Стадии одного запроса (сек, с накоплением), вызовы ES и ветки каскада, давшие ответ"""
+
+    __slots__ = ("started", "stages", "es_calls", "branches")
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.stages: Dict[str, float] = {}
+        # (ветка, время с клиента, took ES или None)
+        self.es_calls: List[Tuple[str, float, Optional[float]]] = []
+        self.branches: List[str] = []
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing (длительности в мс)"""
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        took = [t for _, _, t in self.es_calls if t is not None]
+        if took:
+            parts.append(f"es_took;dur={sum(took) * 1000:.2f}")
+        if self.branches:
+            parts.append(f'branch;desc="{",".join(dict.fromkeys(self.branches))}"')
+        parts.append(f"total;dur={(perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+current_timing: ContextVar[Optional[RequestTiming]] = ContextVar("fias_request_timing", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Замер блока как стадии name"""
+    timing = current_timing.get()
+    if timing is None:
+        yield
+        return
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, perf_counter() - started)
+
+
+def _no_lap(name: str) -> None:
+    pass
+
+
+def laps(prefix: str) -> Callable[[str], None]:
+    """Отсечки внутри функции: lap(name) записывает время с предыдущей отсечки как стадию prefix.name.
+    Без активного замера возвращается пустая функция — в горячем коде это один вызов на отсечку.
+    """
+    timing = current_timing.get()
+    if timing is None:
+        return _no_lap
+    last = [perf_counter()]
+
+    def lap(name: str) -> None:
+        now = perf_counter()
+        timing.add(f"{prefix}.{name}", now - last[0])
+        last[0] = now
+
+    return lap
+
+
+def record_es(branch: str, started: float, response: Any, body: Any = None) -> None:
+    """Запрос к ES, начатый в started: время с клиента (стадия es) и took из ответа.
+    body — тело запроса (тела _msearch) для трассы.
+    """
+    timing = current_timing.get()
+    trace = current_trace.get()
+    if timing is None and trace is None:
+        return
+    wall = perf_counter() - started
+    # ObjectApiResponse клиента ES 8 ведёт себя как dict
+    took = response.get("took") if hasattr(response, "get") else None
+    took = took / 1000.0 if isinstance(took, (int, float)) else None
+    if timing is not None:
+        timing.add("es", wall)
+        timing.es_calls.append((branch, wall, took))
+    if trace is not None:
+        trace.add_es(branch, body, wall, took, response)
+
+
+def record_branch(branch: str) -> None:
+    """Ветка каскада (или быстрый путь, кэш), давшая ответ запросу"""
+    timing = current_timing.get()
+    if timing is not None:
+        timing.branches.append(branch)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.branches.append(branch)
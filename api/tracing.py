@@ -0,0 +1,214 @@
+"""
+Трассировка запросов с выборкой вместо INFO-лога тела каждого запроса к ES.
+
+Трасса с коротким id связывает исходный запрос, нормализованную форму, тела запросов к ES
+(с took и числом хитов), ветку каскада, давшую ответ, и итог запроса. В трассы попадает доля
+TRACE_SAMPLE_RATE запросов и, если включено TRACE_FORCE_HEADER, запросы с заголовком X-Trace: 1.
+
+Запись не блокирует запрос: трасса только ставится в очередь TraceSink, сериализация и вывод
+идут в фоновом потоке; при переполненной очереди трасса не пишется (счётчик dropped).
+Последние трассы хранятся в памяти воркера и доступны по id через /debug/traces/{trace_id}.
+
+Тот же механизм пишет захват медленных и пустых запросов /search (CAPTURE_ENABLED) в файл
+с ротацией — его повторяет bench/replay_capture.py.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+trace_logger = logging.getLogger("fias.trace")
+
+# Сколько трасс может ждать записи; сверх этого новые отбрасываются
+TRACE_QUEUE_SIZE = 10000
+# Хиты ответа ES в трассе: только id первых, без документов
+TRACE_HIT_IDS = 3
+
+
+class QueryTrace:
+    """Трасса одного HTTP-запроса"""
+
+    __slots__ = ("trace_id", "endpoint", "query", "params", "started_at", "duration_ms", "status",
+                 "normalized", "es", "branches", "results", "result_ids")
+
+    def __init__(self, endpoint: str, query: Optional[str] = None, params: Optional[Dict[str, str]] = None):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.endpoint = endpoint
+        self.query = query
+        self.params = params or {}
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[int] = None
+        self.normalized: Optional[Dict[str, Any]] = None
+        # Тела — ссылки на тела планов (они не изменяются), сериализуются только при записи
+        self.es: List[Dict[str, Any]] = []
+        self.branches: List[str] = []
+        self.results: Optional[int] = None
+        self.result_ids: Optional[List[str]] = None
+
+    def add_es(self, branch: str, body: Any, wall: float, took: Optional[float], response: Any) -> None:
+        entry: Dict[str, Any] = {"branch": branch, "wall_ms": round(wall * 1000, 3), "body": body}
+        if took is not None:
+            entry["took_ms"] = took * 1000
+        hits = response.get("hits", {}).get("hits") if hasattr(response, "get") else None
+        if hits is not None:
+            entry["hits"] = len(hits)
+            entry["hit_ids"] = [hit.get("_id") for hit in hits[:TRACE_HIT_IDS]]
+        elif hasattr(response, "get") and "responses" in response:
+            entry["hits"] = [len(item.get("hits", {}).get("hits", [])) for item in response["responses"]]
+        self.es.append(entry)
+
+    def finish(self, status: int) -> None:
+        self.status = status
+        self.duration_ms = round((time.time() - self.started_at) * 1000, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "endpoint": self.endpoint,
+            "query": self.query,
+            "params": self.params,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "normalized": self.normalized,
+            "branches": list(self.branches),
+            "results": self.results,
+            "result_ids": self.result_ids,
+            "es": list(self.es),
+        }
+
+
+current_trace: ContextVar[Optional[QueryTrace]] = ContextVar("fias_query_trace", default=None)
+
+
+def should_trace(sample_rate: float, forced: bool = False) -> bool:
+    return forced or (sample_rate > 0 and random.random() < sample_rate)
+
+
+def trace_normalized(normalized: Dict[str, Any]) -> None:
+    trace = current_trace.get()
+    if trace is not None:
+        trace.normalized = normalized
+
+
+def trace_results(items: List[Any]) -> None:
+    """Итог запроса: число результатов и их id (AddressItem)"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.results = len(items)
+        trace.result_ids = [item.id for item in items]
+
+
+class TraceSink:
+    """Фоновая запись трасс (JSON Lines в файл или в логгер fias.trace) и кольцо последних трасс по id.
+    max_bytes > 0 — ротация файла: log_path.1 ... log_path.<backups>, как у RotatingFileHandler.
+    buffer_size = 0 — без кольца (только запись).
+    """
+
+    def __init__(
+        self,
+        buffer_size: int,
+        log_path: Optional[str] = None,
+        queue_size: int = TRACE_QUEUE_SIZE,
+        max_bytes: int = 0,
+        backups: int = 0
+    ):
+        self.buffer_size = buffer_size
+        self.log_path = log_path or None
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._recent: "OrderedDict[str, QueryTrace]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[QueryTrace]]" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="trace-sink", daemon=True)
+        self._thread.start()
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+
+    def submit(self, trace: QueryTrace) -> None:
+        """Из запроса: только вставка в кольцо и в очередь, без сериализации и ввода-вывода"""
+        if self.buffer_size > 0:
+            with self._lock:
+                self._recent[trace.trace_id] = trace
+                while len(self._recent) > self.buffer_size:
+                    self._recent.popitem(last=False)
+        self.submitted += 1
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            trace = self._recent.get(trace_id)
+        return trace.to_dict() if trace is not None else None
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Краткий список последних трасс (новые первыми)"""
+        with self._lock:
+            traces = list(self._recent.values())[-limit:]
+        return [
+            {"trace_id": t.trace_id, "endpoint": t.endpoint, "query": t.query,
+             "duration_ms": t.duration_ms, "branches": list(t.branches)}
+            for t in reversed(traces)
+        ]
+
+    def _run(self) -> None:
+        out = open(self.log_path, "a", encoding="utf-8") if self.log_path else None
+        try:
+            while True:
+                trace = self._queue.get()
+                if trace is None:
+                    break
+                try:
+                    line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str)
+                    if out is not None:
+                        position = out.tell()
+                        if self.max_bytes > 0 and position > 0 and position + len(line) >= self.max_bytes:
+                            out = self._rotate(out)
+                        out.write(line + "\n")
+                        # Сбрасываем на диск, когда очередь разобрана, а не на каждой строке
+                        if self._queue.empty():
+                            out.flush()
+                    else:
+                        trace_logger.info(line)
+                    self.written += 1
+                except Exception as e:
+                    trace_logger.warning(f"Не удалось записать трассу {trace.trace_id}: {e}")
+        finally:
+            if out is not None:
+                out.close()
+
+    def _rotate(self, out):
+        """Закрыть текущий файл, сдвинуть log_path.N -> log_path.N+1 и начать новый"""
+        out.close()
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.log_path}.{i}"):
+                    os.replace(f"{self.log_path}.{i}", f"{self.log_path}.{i + 1}")
+            os.replace(self.log_path, f"{self.log_path}.1")
+            return open(self.log_path, "a", encoding="utf-8")
+        return open(self.log_path, "w", encoding="utf-8")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._recent),
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Дописать очередь и остановить поток"""
+        self._queue.put(None)
+        self._thread.join(timeout)
@@ -0,0 +1,3 @@
+"""
+Бенчмарки производительности адресного поиска
+"""
@@ -0,0 +1,55 @@
+"""
+Микро-бенчмарк apply_type_aliases.
+
+Берёт запросы из queries/tests.json и data/sample_cases.csv, прогоняет их через
+normalize_text и замеряет среднее время apply_type_aliases на один запрос.
+
+Пример:
+  python bench/bench_aliases.py --repeat 20
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from typing import List
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+from api.normalizer import normalize_text, apply_type_aliases  # noqa: E402
+
+
+def load_queries() -> List[str]:
+    queries: List[str] = []
+    with open(os.path.join(PROJECT_ROOT, 'queries', 'tests.json'), 'r', encoding='utf-8') as f:
+        queries.extend(t['query'] for t in json.load(f).get('tests', []))
+    with open(os.path.join(PROJECT_ROOT, 'data', 'sample_cases.csv'), 'r', encoding='utf-8') as f:
+        queries.extend(row['query'] for row in csv.DictReader(f) if row.get('query'))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Микро-бенчмарк apply_type_aliases')
+    parser.add_argument('--repeat', type=int, default=10, help='Сколько раз прогнать корпус')
+    args = parser.parse_args()
+
+    texts = [normalize_text(q) for q in load_queries()]
+    # Прогрев (кэш регексов re, ленивые структуры)
+    for t in texts:
+        apply_type_aliases(t)
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for t in texts:
+            apply_type_aliases(t)
+    elapsed = time.perf_counter() - started
+
+    calls = len(texts) * args.repeat
+    print(f'Запросов: {len(texts)}, вызовов: {calls}')
+    print(f'apply_type_aliases: {elapsed / calls * 1e6:.1f} мкс/запрос')
+
+
+if __name__ == '__main__':
+    main()
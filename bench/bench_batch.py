@@ -0,0 +1,110 @@
+"""
+Бенчмарк пакетного геокодирования: N вызовов GET /search против одного POST /search/batch.
+
+Поднимает заглушку ES (bench/es_stub.py) и API (uvicorn api.main:app) в отдельных
+процессах; кэш результатов в API выключен, чтобы сравнивать именно путь до ES.
+
+Пример:
+  python bench/bench_batch.py --lines 10000 --concurrency 16 --latency-ms 5 --msearch-item-ms 0.1
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List
+
+import aiohttp
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_search_load import free_port, start_stub, wait_port  # noqa: E402
+
+
+def load_lines(count: int) -> List[str]:
+    queries: List[str] = []
+    with open(os.path.join(PROJECT_ROOT, 'queries', 'tests.json'), 'r', encoding='utf-8') as f:
+        queries.extend(t['query'] for t in json.load(f).get('tests', []))
+    with open(os.path.join(PROJECT_ROOT, 'data', 'sample_cases.csv'), 'r', encoding='utf-8') as f:
+        queries.extend(row['query'] for row in csv.DictReader(f) if row.get('query'))
+    return [queries[i % len(queries)] for i in range(count)]
+
+
+def start_api(es_url: str, extra_env: dict) -> (subprocess.Popen, str):
+    port = free_port()
+    env = dict(os.environ, ES_URL=es_url, RESULT_CACHE_ENABLED='false', LOG_LEVEL='WARNING', **extra_env)
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'api.main:app', '--port', str(port), '--log-level', 'warning', '--no-access-log'],
+        cwd=PROJECT_ROOT, env=env,
+    )
+    wait_port(proc, port, 'API', timeout=30)
+    return proc, f'http://127.0.0.1:{port}'
+
+
+async def run_single(api_url: str, lines: List[str], concurrency: int, limit: int) -> float:
+    """Построчные вызовы GET /search с заданной конкурентностью"""
+    counter = iter(range(len(lines)))
+
+    async def worker(session: aiohttp.ClientSession):
+        for i in counter:
+            async with session.get(f'{api_url}/search', params={'q': lines[i], 'limit': limit}) as resp:
+                await resp.read()
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def run_batch(api_url: str, lines: List[str], limit: int) -> (float, int, int):
+    """Один POST /search/batch; считаем строки NDJSON и ошибки"""
+    received = errors = 0
+    started = time.perf_counter()
+    timeout = aiohttp.ClientTimeout(total=None)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.post(f'{api_url}/search/batch', json={'queries': lines, 'limit': limit}) as resp:
+            async for raw in resp.content:
+                if raw.strip():
+                    received += 1
+                    errors += 'error' in json.loads(raw)
+    return time.perf_counter() - started, received, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк POST /search/batch против GET /search')
+    parser.add_argument('--lines', type=int, default=10000, help='Строк во входном файле')
+    parser.add_argument('--concurrency', type=int, default=16, help='Параллельных GET /search у клиента')
+    parser.add_argument('--limit', type=int, default=1)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Задержка заглушки ES, мс')
+    parser.add_argument('--msearch-item-ms', type=float, default=0.1, help='Добавка _msearch за каждый запрос, мс')
+    parser.add_argument('--miss-rate', type=float, default=0.0, help='Доля пустых ответов заглушки')
+    parser.add_argument('--client-mode', default='sync', help='ES_CLIENT_MODE для API: sync | async')
+    args = parser.parse_args()
+
+    lines = load_lines(args.lines)
+    stub, es_url = start_stub(args.latency_ms, 0.0, args.miss_rate, args.msearch_item_ms)
+    api, api_url = None, None
+    try:
+        api, api_url = start_api(es_url, {'ES_CLIENT_MODE': args.client_mode})
+        single = asyncio.run(run_single(api_url, lines, args.concurrency, args.limit))
+        batch, received, errors = asyncio.run(run_batch(api_url, lines, args.limit))
+    finally:
+        for proc in (api, stub):
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+    print(f'Строк: {len(lines)}, ES: задержка {args.latency_ms} мс + {args.msearch_item_ms} мс/запрос в _msearch')
+    print(f'GET /search x{len(lines)} (конкурентность {args.concurrency}): {single:7.2f} с, {len(lines) / single:8.1f} строк/с')
+    print(f'POST /search/batch:                       {batch:7.2f} с, {len(lines) / batch:8.1f} строк/с '
+          f'(строк в ответе {received}, ошибок {errors})')
+    print(f'Ускорение: x{single / batch:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Бенчмарк разбора номеров домов в ETL: прежний разбор в цикле по строкам (регексы
+собираются и компилируются на каждую строку) против api/house_parser.py.
+
+Имена домов генерируются с распределением, похожим на ФИАС: в основном номера с
+литерами, часть с корпусом/строением/владением, дроби, латинские k/c. Перед
+замером результаты старого и нового разбора сверяются на всём наборе.
+
+Пример:
+  python bench/bench_house_parser.py --rows 200000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+from api.house_parser import parse_house_name, parse_house_names  # noqa: E402
+from data.etl import rows_to_docs  # noqa: E402
+
+
+def legacy_parse(house_number: str) -> Optional[Tuple[str, Optional[str], Optional[str]]]:
+    """Разбор из data/etl.py до выноса в api/house_parser.py (без изменений)"""
+    name_for_parse = house_number
+    name_for_parse = re.sub(r'k', 'к', name_for_parse)
+    name_for_parse = re.sub(r'c', 'с', name_for_parse)
+    name_for_parse = re.sub(r'(\d)\s*[к]\s*(\d)', r'\1 к \2', name_for_parse)
+    name_for_parse = re.sub(r'(\d)\s*[с]\s*(\d)', r'\1 с \2', name_for_parse)
+
+    corp_alias = r'(?:корпус|корп|кор\.?|к)'
+    bldg_alias = r'(?:строение|стр\.?|с)'
+    own_alias = r'(?:владение|влад\.?|вл)'
+
+    base_num = r'(?:дом|д)?\.?\s*(\d+[абвгдежзийклмнопрстуфхцчшщъыьэюя]?)'
+    corp_num = r'(?:\s*(?:' + corp_alias + r')\.?\s*(\d+[абвгдежзийклмнопрстуфхцчшщъыьэюя]?))'
+    bldg_num = r'(?:\s*(?:' + bldg_alias + r'|' + own_alias + r')\.?\s*(\d+[абвгдежзийклмнопрстуфхцчшщъыьэюя]?))'
+
+    pattern1 = re.compile(r'^' + base_num + r'(?:' + corp_num + r')?(?:' + bldg_num + r')?$', re.IGNORECASE)
+    pattern2 = re.compile(r'^' + base_num + r'(?:' + bldg_num + r')?(?:' + corp_num + r')?$', re.IGNORECASE)
+
+    m = pattern1.search(name_for_parse) or pattern2.search(name_for_parse)
+    if not m:
+        return None
+    return m.group(1), m.group(2), m.group(3)
+
+
+def generate_names(count: int, seed: int) -> List[str]:
+    rnd = random.Random(seed)
+    letters = 'абвгдежик'
+    names = []
+    for _ in range(count):
+        num = str(int(rnd.paretovariate(1.2)) if rnd.random() < 0.7 else rnd.randint(1, 400))
+        if rnd.random() < 0.2:
+            num += rnd.choice(letters)
+        r = rnd.random()
+        if r < 0.12:
+            num += rnd.choice(['к', 'k', ' к ', ' корп ', 'корп.']) + str(rnd.randint(1, 9))
+        elif r < 0.2:
+            num += rnd.choice(['с', 'c', ' стр ', 'стр.', ' с ']) + str(rnd.randint(1, 12))
+        elif r < 0.24:
+            num += rnd.choice(['к', ' корп ']) + str(rnd.randint(1, 5)) + rnd.choice(['с', ' стр ']) + str(rnd.randint(1, 9))
+        elif r < 0.26:
+            num = rnd.choice(['вл', 'влад. ', 'д. ', 'дом ']) + num
+        elif r < 0.28:
+            num += '/' + str(rnd.randint(1, 40))
+        elif r < 0.29:
+            num = rnd.choice(['участок ', 'гараж ', 'соор. ']) + num
+        names.append(num.lower())
+    return names
+
+
+def make_rows(names: List[str], seed: int) -> List[Dict[str, Any]]:
+    """Строки как из курсора address_table2 (только дома)"""
+    rnd = random.Random(seed)
+    rows = []
+    for i, name in enumerate(names):
+        rows.append({
+            'id': f'guid-{i}', 'level': 'house', 'name_norm': name, 'name_exact': name, 'type_norm': 'д',
+            'full_norm': f'г москва, ул ленина, д {name}', 'region_code': 77, 'house_number': name,
+            'korpus': str(rnd.randint(1, 3)) if rnd.random() < 0.05 else None,
+            'stroenie': None, 'lat': 55.75, 'lon': 37.61,
+        })
+    return rows
+
+
+def rate(label: str, count: int, fn) -> float:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f'{label:<44} {count / elapsed:12,.0f} строк/с')
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк разбора номеров домов в ETL')
+    parser.add_argument('--rows', type=int, default=200000, help='Строк-домов в наборе')
+    parser.add_argument('--batch', type=int, default=1000, help='Размер пачки (как fetchmany в ETL)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    names = generate_names(args.rows, args.seed)
+    print(f'Строк: {len(names)}, уникальных имён: {len(set(names))}')
+
+    mismatches = [n for n in set(names) if legacy_parse(n) != parse_house_name.__wrapped__(n)]
+    if mismatches:
+        print(f'❌ Расхождения со старым разбором: {len(mismatches)}, например {mismatches[:5]}')
+        sys.exit(1)
+    print('✅ Результаты совпадают со старым разбором')
+
+    batches = [names[i:i + args.batch] for i in range(0, len(names), args.batch)]
+    base = rate('было: регексы на каждую строку', len(names), lambda: [legacy_parse(n) for n in names])
+    rate('parse_house_name без кэша', len(names), lambda: [parse_house_name.__wrapped__(n) for n in names])
+    parse_house_name.cache_clear()
+    rate('parse_house_name (LRU)', len(names), lambda: [parse_house_name(n) for n in names])
+    parse_house_name.cache_clear()
+    new = rate('parse_house_names пачками', len(names), lambda: [parse_house_names(b) for b in batches])
+
+    rows = make_rows(names, args.seed)
+    row_batches = [rows[i:i + args.batch] for i in range(0, len(rows), args.batch)]
+    parse_house_name.cache_clear()
+    rate('rows_to_docs (строка -> документ)', len(rows), lambda: [rows_to_docs(b) for b in row_batches])
+    print(f'Ускорение разбора: x{new / base:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""
+Микро-бенчмарк нормализатора и проверка регрессий: normalize_text, apply_type_aliases,
+extract_house_number и normalize_query на корпусе из реальных и синтетических запросов.
+
+Реальные запросы — queries/tests.json, data/sample_cases.csv и, с --capture, захват /search
+(CAPTURE_PATH). Синтетические — детерминированные по --seed комбинации регионов, типов улиц
+во всех вариантах написания из ALIASES, форм номера дома, регистра и пунктуации.
+
+На функцию: нс/вызов (медиана и минимум по проходам корпуса, GC выключен), пик памяти
+на вызов и остаток памяти после вызова (tracemalloc: рост остатка — новые кэши или утечки).
+normalize_query замеряется на промахе кэша (конвейер целиком) и на попадании в LRU.
+
+Регрессии:
+  --golden FILE — эталонные результаты всех функций (JSON Lines); любое расхождение — код 1.
+                  С --update-golden эталон записывается текущим кодом.
+  --compare BASE.json --max-slowdown X — код 1, если минимальное нс/вызов хоть одной функции
+                  выросло больше чем на X% относительно прошлого прогона (--out) на той же машине.
+Эталон и базовый замер снимаются на исходном коммите (эталон — несколько МБ, в репозиторий не кладётся).
+
+Пример:
+  git stash && python bench/bench_normalizer.py --golden /tmp/golden.jsonl --update-golden --out /tmp/base.json
+  git stash pop && python bench/bench_normalizer.py --golden /tmp/golden.jsonl --compare /tmp/base.json --max-slowdown 10
+"""
+import argparse
+import csv
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+from api.normalizer import (  # noqa: E402
+    ALIASES,
+    _normalize_query_cached,
+    apply_type_aliases,
+    extract_house_number,
+    normalize_query,
+    normalize_text,
+)
+
+FUNCTIONS = ('normalize_text', 'apply_type_aliases', 'extract_house_number', 'normalize_query')
+# Типы, которые стоят в адресе как улица (варианты написания берутся из ALIASES)
+STREET_TYPES = ('ул', 'пер', 'пр-кт', 'б-р', 'пр-д', 'пл', 'ш', 'наб', 'туп', 'ал', 'линия', 'мкр', 'кв-л')
+REGION_PREFIXES = ('', '', 'москва, ', 'г. москва, ', 'г москва ', 'московская обл., ', 'мо, ', 'балашиха, ',
+                   'санкт-петербург, ', 'спб ', 'ленинградская область, ', 'ло, ', 'россия, москва, ')
+STREET_NAMES = ('тверская', 'изюмская', 'ленинский', 'варшавское', 'большая полянка', 'октябрьская', '8 марта',
+                'маршала жукова', 'новый арбат', 'садовая-кудринская', 'генерала белова', '1-я парковая',
+                'берёзовая', 'подольских курсантов', 'крылатские холмы', 'зелёный', 'мира', 'ленина', 'советская')
+HOUSE_FORMATS = ('{n}', 'д. {n}', 'дом {n}', 'д{n}', '{n}{l}', '{n}к{k}', '{n} к {k}', '{n} корп. {k}',
+                 '{n} корпус {k}', '{n}k{k}', '{n}с{s}', '{n} стр {s}', '{n} строение {s}', '{n}к{k}с{s}',
+                 'вл {n}', 'вл. {n} стр. {s}', '{n}/{k}', '{n}{l}/{k}', '{n}{l} к{k}', '')
+
+
+def load_real_queries(capture_paths: List[str]) -> List[str]:
+    queries: List[str] = []
+    with open(os.path.join(PROJECT_ROOT, 'queries', 'tests.json'), 'r', encoding='utf-8') as f:
+        queries.extend(t['query'] for t in json.load(f).get('tests', []) if t.get('query'))
+    with open(os.path.join(PROJECT_ROOT, 'data', 'sample_cases.csv'), 'r', encoding='utf-8') as f:
+        queries.extend(row['query'] for row in csv.DictReader(f) if row.get('query'))
+    for path in capture_paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    query = json.loads(line).get('query')
+                except ValueError:
+                    continue
+                if query:
+                    queries.append(query)
+    return queries
+
+
+def synthetic_queries(count: int, seed: int) -> List[str]:
+    """Запросы из регион + улица (тип до или после имени, любой вариант написания) + дом + шум"""
+    rng = random.Random(seed)
+    queries: List[str] = []
+    for _ in range(count):
+        variants = ALIASES.get(rng.choice(STREET_TYPES)) or ['ул']
+        street_type = rng.choice(variants)
+        name = rng.choice(STREET_NAMES)
+        street = f'{street_type} {name}' if rng.random() < 0.4 else f'{name} {street_type}'
+        house = rng.choice(HOUSE_FORMATS).format(
+            n=rng.randint(1, 250), k=rng.randint(1, 9), s=rng.randint(1, 12), l=rng.choice('абвг')
+        )
+        query = rng.choice(REGION_PREFIXES) + street + (rng.choice((', ', ' ', ',')) + house if house else '')
+        roll = rng.random()
+        if roll < 0.15:
+            query = query.upper()
+        elif roll < 0.3:
+            query = query.title()
+        elif roll < 0.4:
+            query = query.replace(' ', '  ', 1).replace('ё', 'е') + rng.choice(('.', ' ', ';', ''))
+        queries.append(query)
+    return queries
+
+
+def function_cases() -> Dict[str, Tuple[Callable[[str], Any], Callable[[str], Any]]]:
+    """Имя -> (подготовка входа из запроса, функция). Вход подготавливается до замера:
+    apply_type_aliases и extract_house_number получают выход normalize_text, как в конвейере.
+    """
+    return {
+        'normalize_text': (lambda q: q, normalize_text),
+        'apply_type_aliases': (normalize_text, apply_type_aliases),
+        'extract_house_number': (normalize_text, extract_house_number),
+        # Промах кэша: конвейер целиком, без LRU
+        'normalize_query': (lambda q: q, lambda q: dict(_normalize_query_cached.__wrapped__(q))),
+        'normalize_query_hit': (lambda q: q, normalize_query),
+    }
+
+
+def time_passes(fn: Callable[[str], Any], inputs: List[str], passes: int) -> List[float]:
+    """нс/вызов в каждом проходе по входам"""
+    results = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(passes):
+            started = time.perf_counter_ns()
+            for x in inputs:
+                fn(x)
+            results.append((time.perf_counter_ns() - started) / len(inputs))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return results
+
+
+def measure_memory(fn: Callable[[str], Any], inputs: List[str]) -> Tuple[float, float]:
+    """Средние пик памяти вызова и остаток после вызова (байт), результат вызова не удерживается"""
+    peak_total = 0
+    retained_total = 0
+    tracemalloc.start()
+    try:
+        for x in inputs:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(x)
+            current, peak = tracemalloc.get_traced_memory()
+            peak_total += peak - base
+            retained_total += current - base
+    finally:
+        tracemalloc.stop()
+    return peak_total / len(inputs), retained_total / len(inputs)
+
+
+def golden_records(queries: List[str]) -> List[Dict[str, Any]]:
+    """Результаты всех функций по запросам в JSON-виде (кортежи -> списки), как в файле эталона"""
+    records = []
+    for q in queries:
+        text = normalize_text(q)
+        records.append({
+            'query': q,
+            'normalize_text': text,
+            'apply_type_aliases': apply_type_aliases(text),
+            'extract_house_number': extract_house_number(text),
+            'normalize_query': normalize_query(q),
+        })
+    return json.loads(json.dumps(records, ensure_ascii=False))
+
+
+def check_golden(path: str, records: List[Dict[str, Any]], show: int) -> int:
+    """Сверка с эталоном: число запросов с расхождениями (печатаются первые show)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        expected = {r['query']: r for r in (json.loads(line) for line in f if line.strip())}
+    diffs = 0
+    missing = 0
+    for record in records:
+        old = expected.get(record['query'])
+        if old is None:
+            missing += 1
+            continue
+        changed = [name for name in FUNCTIONS if old.get(name) != record[name]]
+        if changed:
+            diffs += 1
+            if diffs <= show:
+                print(f"  {record['query']!r}:")
+                for name in changed:
+                    print(f"    {name}: {old.get(name)!r} -> {record[name]!r}")
+    if missing:
+        print(f'Нет в эталоне (корпус изменился, обновите --update-golden): {missing}')
+    return diffs
+
+
+def write_golden(path: str, records: List[Dict[str, Any]]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, sort_keys=True) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Микро-бенчмарк нормализатора и проверка регрессий')
+    parser.add_argument('--synthetic', type=int, default=5000, help='Синтетических запросов в корпусе')
+    parser.add_argument('--seed', type=int, default=1, help='Зерно синтетического корпуса')
+    parser.add_argument('--capture', nargs='*', default=[], help='Файлы захвата /search (CAPTURE_PATH) в корпус')
+    parser.add_argument('--passes', type=int, default=5, help='Проходов корпуса на функцию')
+    parser.add_argument('--functions', default=None, help='Функции через запятую (по умолчанию все)')
+    parser.add_argument('--golden', default=None, help='Эталон результатов (JSON Lines)')
+    parser.add_argument('--update-golden', action='store_true', help='Перезаписать эталон текущими результатами')
+    parser.add_argument('--show-diffs', type=int, default=20, help='Сколько расхождений с эталоном напечатать')
+    parser.add_argument('--out', default=None, help='Путь для результатов замера (JSON)')
+    parser.add_argument('--compare', default=None, help='Результаты прошлого замера (JSON) для сравнения')
+    parser.add_argument('--max-slowdown', type=float, default=None,
+                        help='Допустимое замедление любой функции относительно --compare, %% (иначе код 1)')
+    args = parser.parse_args()
+    if args.update_golden and not args.golden:
+        parser.error('--update-golden требует --golden')
+
+    real = load_real_queries(args.capture)
+    queries = real + synthetic_queries(args.synthetic, args.seed)
+    # Порядок первых вхождений: одинаковые запросы замеряются один раз
+    queries = list(dict.fromkeys(queries))
+    print(f'Запросов: {len(queries)} (реальных {len(real)}, синтетических {args.synthetic}, seed {args.seed})')
+
+    failed = False
+    if args.golden:
+        records = golden_records(queries)
+        if args.update_golden:
+            write_golden(args.golden, records)
+            print(f'Эталон записан: {args.golden}')
+        else:
+            diffs = check_golden(args.golden, records, args.show_diffs)
+            print(f'Расхождений с эталоном: {diffs}')
+            failed = diffs > 0
+
+    cases = function_cases()
+    names = [n.strip() for n in args.functions.split(',')] if args.functions else list(cases)
+    unknown = set(names) - set(cases)
+    if unknown:
+        parser.error(f"неизвестные функции: {', '.join(sorted(unknown))}; есть: {', '.join(cases)}")
+
+    results: Dict[str, Dict[str, float]] = {}
+    for name in names:
+        prepare, fn = cases[name]
+        inputs = [prepare(q) for q in queries]
+        # Прогрев: кэш регексов re, ленивые таблицы алиасов, LRU normalize_query для варианта hit
+        for x in inputs:
+            fn(x)
+        passes = time_passes(fn, inputs, args.passes)
+        peak, retained = measure_memory(fn, inputs)
+        results[name] = {
+            'ns_op': round(statistics.median(passes)),
+            'ns_op_min': round(min(passes)),
+            'peak_bytes_op': round(peak),
+            'retained_bytes_op': round(retained, 1),
+        }
+        r = results[name]
+        print(f"{name:>22}: {r['ns_op']:>8} нс/вызов (мин {r['ns_op_min']}), "
+              f"пик {r['peak_bytes_op']} Б/вызов, остаток {r['retained_bytes_op']} Б/вызов")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        if base.get('queries') != len(queries):
+            print(f"Внимание: в базе другой корпус ({base.get('queries')} запросов), сравнение приблизительное")
+        print(f"\nСравнение с {args.compare}:")
+        for name, r in results.items():
+            old = base.get('functions', {}).get(name)
+            if not old:
+                continue
+            change = (r['ns_op_min'] - old['ns_op_min']) / old['ns_op_min'] * 100.0
+            slow = args.max_slowdown is not None and change > args.max_slowdown
+            failed = failed or slow
+            print(f"  {name}: {old['ns_op_min']} -> {r['ns_op_min']} нс ({change:+.1f}%)" + (' ЗАМЕДЛЕНИЕ' if slow else ''))
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({
+                'queries': len(queries),
+                'seed': args.seed,
+                'synthetic': args.synthetic,
+                'passes': args.passes,
+                'python': sys.version.split()[0],
+                'functions': results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f'Результаты: {args.out}')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
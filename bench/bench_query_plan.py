@@ -0,0 +1,101 @@
+"""
+Микро-бенчмарк QueryPlanCompiler: CPU на сборку тел ES-запросов отдельно от времени ES.
+
+Берёт запросы из queries/tests.json и data/sample_cases.csv, прогоняет их через
+normalize_query и замеряет время компиляции плана без кэша и из LRU-кэша.
+
+Пример:
+  python bench/bench_query_plan.py --repeat 20
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+from api.normalizer import normalize_query  # noqa: E402
+from api.query_plan import QueryPlanCompiler  # noqa: E402
+from api.search import build_search_params  # noqa: E402
+
+
+def load_queries() -> List[str]:
+    queries: List[str] = []
+    with open(os.path.join(PROJECT_ROOT, 'queries', 'tests.json'), 'r', encoding='utf-8') as f:
+        queries.extend(t['query'] for t in json.load(f).get('tests', []))
+    with open(os.path.join(PROJECT_ROOT, 'data', 'sample_cases.csv'), 'r', encoding='utf-8') as f:
+        queries.extend(row['query'] for row in csv.DictReader(f) if row.get('query'))
+    return queries
+
+
+def plan_args(q: str) -> Dict[str, Any]:
+    """Аргументы компиляции — так же, как их собирает /search"""
+    return build_search_params(normalize_query(q), q, 10)
+
+
+def count_clauses(node: Any) -> int:
+    """Листовые условия запроса (match, term, wildcard, ...) — без обёрток bool/constant_score"""
+    if isinstance(node, list):
+        return sum(count_clauses(item) for item in node)
+    if not isinstance(node, dict):
+        return 0
+    count = 0
+    for key, value in node.items():
+        if key in ('bool', 'must', 'should', 'filter', 'must_not', 'constant_score', 'query'):
+            count += count_clauses(value)
+        elif key not in ('boost', 'minimum_should_match'):
+            count += 1
+    return count
+
+
+def timed(compiler: QueryPlanCompiler, args_list: List[Dict[str, Any]], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for kw in args_list:
+            compiler.compile(**kw)
+    return (time.perf_counter() - started) / (len(args_list) * repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Микро-бенчмарк QueryPlanCompiler')
+    parser.add_argument('--repeat', type=int, default=10, help='Сколько раз прогнать корпус')
+    args = parser.parse_args()
+
+    args_list = [a for a in (plan_args(q) for q in load_queries()) if a['query'].strip()]
+
+    cold = QueryPlanCompiler(cache_size=0)
+    warm = QueryPlanCompiler()
+    # Прогрев: заполняем кэш и кэш регексов re
+    timed(cold, args_list, 1)
+    timed(warm, args_list, 1)
+
+    bodies = sum(len(cold.compile(**kw).bodies) for kw in args_list)
+    print(f'Запросов: {len(args_list)}, тел в каскадах: {bodies} (в среднем {bodies / len(args_list):.1f})')
+    print(f'Компиляция без кэша: {timed(cold, args_list, args.repeat) * 1e6:.1f} мкс/запрос')
+    print(f'Компиляция из кэша:  {timed(warm, args_list, args.repeat) * 1e6:.2f} мкс/запрос')
+    print(f'Кэш: {warm.cache_info()}')
+
+    # Размер тел: варианты запроса против канонических полей (SEARCH_CANONICAL_FIELDS)
+    # и русского анализатора в маппинге (SEARCH_RU_ANALYZER)
+    modes = (
+        ('варианты запроса', cold),
+        ('канонические поля', QueryPlanCompiler(cache_size=0, canonical_fields=True)),
+        ('русский анализатор', QueryPlanCompiler(cache_size=0, ru_analyzer=True)),
+        ('оба режима', QueryPlanCompiler(cache_size=0, canonical_fields=True, ru_analyzer=True)),
+    )
+    for label, compiler in modes:
+        plans = [compiler.compile(**kw) for kw in args_list]
+        primary = [p.encoded_bodies[0] for p in plans]
+        phrases = sum(b.count(b'"match_phrase"') for b in primary) / len(primary)
+        clauses = sum(count_clauses(p.primary['query']) for p in plans) / len(plans)
+        cascade = sum(sum(map(len, p.encoded_bodies)) for p in plans) / len(plans)
+        print(f'{label:<19} основное тело {sum(map(len, primary)) / len(primary):6.0f} байт, '
+              f'условий {clauses:4.1f}, match_phrase {phrases:4.1f}; каскад целиком {cascade:6.0f} байт')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Нагрузочный бенчмарк SearchService (sync-клиент + пул потоков) против
+AsyncSearchService (AsyncElasticsearch) при разной конкурентности.
+
+По умолчанию поднимает локальную заглушку ES (bench/es_stub.py) в отдельном
+процессе, так что измеряется именно накладной расход клиента и пула потоков.
+Запросы берутся из queries/tests.json и проходят normalize_query, как в /search.
+
+Пример:
+  python bench/bench_search_load.py --concurrency 50,200,500 --requests 2000 --latency-ms 5
+  python bench/bench_search_load.py --es-url http://localhost:9200  # живой кластер
+  python bench/bench_search_load.py --es-url http://localhost:9200 --ru-analyzer  # режим запросов по .ru
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+from elasticsearch import Elasticsearch, AsyncElasticsearch  # noqa: E402
+
+from config.settings import settings, get_elasticsearch_config  # noqa: E402
+from api.normalizer import normalize_query  # noqa: E402
+from api.search import SearchService, AsyncSearchService, build_search_params  # noqa: E402
+
+
+def load_search_kwargs() -> List[Dict[str, Any]]:
+    """Аргументы search() для каждого запроса — так же, как их собирает /search"""
+    with open(os.path.join(PROJECT_ROOT, 'queries', 'tests.json'), 'r', encoding='utf-8') as f:
+        queries = [t['query'] for t in json.load(f).get('tests', [])]
+
+    kwargs_list = [
+        dict(build_search_params(normalize_query(q), q, settings.SEARCH_LIMIT), original_query=q)
+        for q in queries
+    ]
+    return [k for k in kwargs_list if k['query'].strip()]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_port(proc: subprocess.Popen, port: int, what: str, timeout: float = 15) -> None:
+    """Ожидание, пока процесс начнёт слушать порт"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f'{what} не поднялся за {timeout:.0f} секунд')
+
+
+def start_stub(
+    latency_ms: float,
+    jitter_ms: float,
+    miss_rate: float,
+    msearch_item_ms: float = 0.0,
+    recordings: Optional[str] = None
+) -> (subprocess.Popen, str):
+    """Запуск заглушки ES в отдельном процессе и ожидание готовности"""
+    port = free_port()
+    command = [
+        sys.executable, os.path.join(PROJECT_ROOT, 'bench', 'es_stub.py'),
+        '--port', str(port),
+        '--latency-ms', str(latency_ms),
+        '--jitter-ms', str(jitter_ms),
+        '--miss-rate', str(miss_rate),
+        '--msearch-item-ms', str(msearch_item_ms),
+    ]
+    if recordings:
+        command += ['--recordings', recordings]
+    proc = subprocess.Popen(command)
+    wait_port(proc, port, 'Заглушка ES')
+    return proc, f'http://127.0.0.1:{port}'
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+async def run_load(service, kwargs_list: List[Dict[str, Any]], concurrency: int, total: int) -> Dict[str, float]:
+    """total запросов, не больше concurrency одновременно; латентность каждого запроса в мс"""
+    latencies: List[float] = []
+    empty = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal empty
+        for i in counter:
+            kw = kwargs_list[i % len(kwargs_list)]
+            started = time.perf_counter()
+            items = await service.search(**kw)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+            if not items:
+                empty += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'qps': total / elapsed,
+        'p50_ms': statistics.median(latencies),
+        'p99_ms': percentile(latencies, 99),
+        'empty': empty,
+    }
+
+
+async def bench_mode(mode: str, es_url: str, kwargs_list, levels: List[int], total: int) -> List[Dict[str, Any]]:
+    es_config = get_elasticsearch_config()
+    es_config['hosts'] = [es_url]
+    if mode == 'async':
+        client = AsyncElasticsearch(**es_config, connections_per_node=settings.ES_ASYNC_CONNECTIONS)
+        service = AsyncSearchService(client, settings.ES_INDEX)
+    else:
+        client = Elasticsearch(**es_config)
+        service = SearchService(client, settings.ES_INDEX)
+
+    rows = []
+    try:
+        # Прогрев: соединения, кэш normalize/регексов
+        await run_load(service, kwargs_list, min(levels), min(len(kwargs_list), 100))
+        for c in levels:
+            row = await run_load(service, kwargs_list, c, total)
+            row.update(mode=mode, concurrency=c)
+            rows.append(row)
+            print(f"{mode:>5}  c={c:<4} qps={row['qps']:8.1f}  p50={row['p50_ms']:8.1f} мс  "
+                  f"p99={row['p99_ms']:8.1f} мс  пустых={row['empty']}")
+    finally:
+        if mode == 'async':
+            await client.close()
+        else:
+            client.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный бенчмарк sync/async поиска')
+    parser.add_argument('--es-url', default=None, help='URL ES; по умолчанию поднимается локальная заглушка')
+    parser.add_argument('--concurrency', default='50,200,500', help='Уровни конкурентности через запятую')
+    parser.add_argument('--requests', type=int, default=2000, help='Запросов на каждый уровень')
+    parser.add_argument('--modes', default='sync,async', help='Режимы клиента: sync,async')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Задержка заглушки, мс')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Разброс задержки заглушки, мс')
+    parser.add_argument('--miss-rate', type=float, default=0.0, help='Доля пустых ответов заглушки (каскад фолбэков)')
+    parser.add_argument('--speculative', action='store_true', help='Включить SEARCH_SPECULATIVE_FALLBACK (_msearch)')
+    parser.add_argument('--canonical', action='store_true', help='Включить SEARCH_CANONICAL_FIELDS (нужен индекс с name_canon/full_canon)')
+    parser.add_argument('--ru-analyzer', action='store_true', help='Включить SEARCH_RU_ANALYZER (нужен индекс с подполями .ru)')
+    parser.add_argument('--out', default=None, help='Путь для сохранения результатов (JSON)')
+    args = parser.parse_args()
+
+    # Логи тел запросов на INFO забивают вывод и искажают замер
+    logging.basicConfig(level=logging.WARNING)
+    settings.SEARCH_SPECULATIVE_FALLBACK = args.speculative
+    settings.SEARCH_CANONICAL_FIELDS = args.canonical
+    settings.SEARCH_RU_ANALYZER = args.ru_analyzer
+
+    levels = [int(x) for x in args.concurrency.split(',') if x.strip()]
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    kwargs_list = load_search_kwargs()
+    print(f'Запросов в корпусе: {len(kwargs_list)}, на уровень: {args.requests}')
+
+    stub = None
+    es_url = args.es_url
+    if not es_url:
+        stub, es_url = start_stub(args.latency_ms, args.jitter_ms, args.miss_rate)
+        print(f'Заглушка ES: {es_url}, задержка {args.latency_ms} мс, промахи {args.miss_rate:.0%}')
+
+    results: List[Dict[str, Any]] = []
+    try:
+        for mode in modes:
+            results.extend(asyncio.run(bench_mode(mode, es_url, kwargs_list, levels, args.requests)))
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.wait(timeout=10)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'Результаты сохранены в {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+"""
+Воспроизводимый бенчмарк задержки поиска: SearchService и HTTP API на фиксированных
+нагрузках (queries/tests.json, data/sample_cases.csv) и уровнях конкурентности.
+
+Цели (--targets):
+  service — SearchService в процессе бенчмарка (нормализация + поиск, как в /search);
+  app     — uvicorn api.main:app в отдельном процессе, GET /search.
+Замена ES (по убыванию близости к бою):
+  --es-url URL           — ES, например локальный с корпусом bench/fias_corpus.py (--corpus DIR --load);
+  --offline --corpus DIR — офлайн-движок SEARCH_BACKEND=offline, собранный из корпуса, без ES;
+  --recordings FILE      — заглушка bench/es_stub.py с ответами, записанными прогоном --record;
+  без этих опций         — заглушка с фиксированным документом (--latency-ms, --miss-rate).
+Кэш результатов выключен: каждый запрос доходит до движка.
+
+Результат — JSON с коммитом, флагами поиска и строками
+{target, workload, concurrency, qps, p50/p95/p99 (мс), empty, es_calls_per_query};
+--compare BASE.json печатает изменения относительно прошлого прогона, --max-regression
+возвращает код 1, если p95 или ES-вызовы на запрос выросли сильнее допуска.
+
+Пример:
+  python bench/fias_corpus.py bench_corpus
+  python bench/bench_suite.py --es-url http://localhost:9200 --corpus bench_corpus --load --index fias_bench \\
+      --record bench_recordings.jsonl --out base.json
+  python bench/bench_suite.py --recordings bench_recordings.jsonl --out new.json --compare base.json
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from elasticsearch import Elasticsearch, AsyncElasticsearch  # noqa: E402
+
+from config.settings import settings, get_elasticsearch_config  # noqa: E402
+from api.normalizer import normalize_query  # noqa: E402
+from api.search import SearchService, AsyncSearchService, build_search_params, prepare_search_batch  # noqa: E402
+from api.offline_search import OfflineIndex, OfflineSearchService  # noqa: E402
+from bench_batch import start_api  # noqa: E402
+from bench_search_load import percentile, start_stub  # noqa: E402
+from es_stub import body_key  # noqa: E402
+
+WORKLOADS = ('tests', 'sample')
+TARGETS = ('service', 'app')
+# Флаги поиска, которые меняют число и вид запросов к ES: попадают в результат и в env API
+SEARCH_FLAGS = ('SEARCH_SPECULATIVE_FALLBACK', 'SEARCH_CANONICAL_FIELDS', 'SEARCH_RU_ANALYZER', 'SEARCH_HOUSE_FAST_PATH')
+ES_CALLS_METRIC = re.compile(r'^fias_es_request_seconds_count\{[^}]*\} (\S+)$', re.MULTILINE)
+# Сравнение с базой: метрика -> больше значит хуже
+COMPARED = (('qps', False), ('p50_ms', True), ('p95_ms', True), ('p99_ms', True), ('es_calls_per_query', True))
+
+
+def load_workload(name: str) -> List[str]:
+    """Запросы нагрузки; строки, которые /search отклонил бы при нормализации, отбрасываются"""
+    if name == 'tests':
+        with open(os.path.join(PROJECT_ROOT, 'queries', 'tests.json'), 'r', encoding='utf-8') as f:
+            queries = [t['query'] for t in json.load(f).get('tests', []) if t.get('query')]
+    else:
+        with open(os.path.join(PROJECT_ROOT, 'data', 'sample_cases.csv'), 'r', encoding='utf-8') as f:
+            queries = [row['query'] for row in csv.DictReader(f) if row.get('query')]
+    prepared = prepare_search_batch(queries, settings.SEARCH_LIMIT)
+    return [q for q, p in zip(queries, prepared) if not isinstance(p, Exception)]
+
+
+def git_revision() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        return subprocess.run(['git', *args], cwd=PROJECT_ROOT, capture_output=True, text=True).stdout.strip()
+
+    return {'commit': git('rev-parse', 'HEAD') or None, 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+class CountingClient:
+    """Клиент ES для SearchService: считает вызовы _search/_msearch, с record — пишет ответы
+    по ключам тел (формат bench/es_stub.py --recordings). Запись — только для sync-клиента.
+    """
+
+    def __init__(self, es, record: Optional[Dict[str, Any]] = None):
+        self.es = es
+        self.record = record
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _count(self) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def search(self, **kwargs):
+        self._count()
+        response = self.es.search(**kwargs)
+        if self.record is not None:
+            self.record[body_key(kwargs['body'])] = response.body
+        return response
+
+    def msearch(self, **kwargs):
+        self._count()
+        response = self.es.msearch(**kwargs)
+        if self.record is not None:
+            for body, item in zip(kwargs['body'][1::2], response['responses']):
+                self.record[body_key(body)] = item
+        return response
+
+    def __getattr__(self, name: str):
+        return getattr(self.es, name)
+
+
+def summarize(latencies: List[float], elapsed: float, empty: int, es_calls: Optional[int]) -> Dict[str, Any]:
+    total = len(latencies)
+    return {
+        'requests': total,
+        'qps': round(total / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'empty': empty,
+        'es_calls_per_query': round(es_calls / total, 3) if es_calls is not None else None,
+    }
+
+
+async def drive(call, queries: List[str], concurrency: int, total: int) -> Tuple[List[float], float, int]:
+    """total запросов по кругу нагрузки, не больше concurrency одновременно;
+    call(q) -> число результатов. Возвращает задержки (мс), время прогона и число пустых ответов.
+    """
+    latencies: List[float] = []
+    empty = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal empty
+        for i in counter:
+            started = time.perf_counter()
+            found = await call(queries[i % len(queries)])
+            latencies.append((time.perf_counter() - started) * 1000.0)
+            if not found:
+                empty += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started, empty
+
+
+async def bench_service(service, counter: Optional[CountingClient], workloads: Dict[str, List[str]],
+                        levels: List[int], total: int) -> List[Dict[str, Any]]:
+    async def call(q: str) -> int:
+        items = await service.search(**build_search_params(normalize_query(q), q, settings.SEARCH_LIMIT), original_query=q)
+        return len(items)
+
+    rows = []
+    for workload, queries in workloads.items():
+        # Прогрев: соединения, мемоизация планов, кэши нормализатора
+        await drive(call, queries, min(levels), len(queries))
+        for c in levels:
+            before = counter.calls if counter else 0
+            latencies, elapsed, empty = await drive(call, queries, c, total)
+            rows.append({'target': 'service', 'workload': workload, 'concurrency': c,
+                         **summarize(latencies, elapsed, empty, counter.calls - before if counter else 0)})
+            report(rows[-1])
+    return rows
+
+
+async def scrape_es_calls(session: aiohttp.ClientSession, api_url: str) -> Optional[float]:
+    """Сумма fias_es_request_seconds_count по веткам из /metrics API (None — метрики выключены)"""
+    async with session.get(f'{api_url}/metrics') as resp:
+        if resp.status != 200:
+            return None
+        return sum(float(v) for v in ES_CALLS_METRIC.findall(await resp.text()))
+
+
+async def bench_app(api_url: str, workloads: Dict[str, List[str]], levels: List[int], total: int) -> List[Dict[str, Any]]:
+    connector = aiohttp.TCPConnector(limit=max(levels))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def call(q: str) -> int:
+            async with session.get(f'{api_url}/search', params={'q': q, 'limit': settings.SEARCH_LIMIT}) as resp:
+                resp.raise_for_status()
+                return (await resp.json())['total']
+
+        rows = []
+        for workload, queries in workloads.items():
+            await drive(call, queries, min(levels), len(queries))
+            for c in levels:
+                before = await scrape_es_calls(session, api_url)
+                latencies, elapsed, empty = await drive(call, queries, c, total)
+                after = await scrape_es_calls(session, api_url)
+                es_calls = int(after - before) if before is not None and after is not None else None
+                rows.append({'target': 'app', 'workload': workload, 'concurrency': c,
+                             **summarize(latencies, elapsed, empty, es_calls)})
+                report(rows[-1])
+    return rows
+
+
+def report(row: Dict[str, Any]) -> None:
+    calls = row['es_calls_per_query']
+    print(f"{row['target']:>7} {row['workload']:>6} c={row['concurrency']:<4} qps={row['qps']:8.1f}  "
+          f"p50={row['p50_ms']:7.2f}  p95={row['p95_ms']:7.2f}  p99={row['p99_ms']:7.2f} мс  "
+          f"пустых={row['empty']:<5} ES/запрос={calls if calls is not None else '-'}")
+
+
+def compare(base: Dict[str, Any], result: Dict[str, Any], max_regression: Optional[float]) -> bool:
+    """Печать изменений относительно base; False — регрессия p95 или ES-вызовов сверх max_regression (%)"""
+    print(f"\nСравнение с {base.get('commit') or '?'}:")
+    base_rows = {(r['target'], r['workload'], r['concurrency']): r for r in base.get('runs', [])}
+    ok = True
+    for row in result['runs']:
+        old = base_rows.get((row['target'], row['workload'], row['concurrency']))
+        if old is None:
+            continue
+        parts = []
+        for metric, higher_is_worse in COMPARED:
+            before, after = old.get(metric), row.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100.0
+            parts.append(f'{metric} {before:g} -> {after:g} ({change:+.1f}%)')
+            if (max_regression is not None and higher_is_worse and metric in ('p95_ms', 'es_calls_per_query')
+                    and change > max_regression):
+                ok = False
+                parts[-1] += ' РЕГРЕССИЯ'
+        print(f"  {row['target']} {row['workload']} c={row['concurrency']}: " + '; '.join(parts))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизводимый бенчмарк задержки поиска (SearchService и API)')
+    parser.add_argument('--es-url', default=None, help='URL ES; без него — заглушка bench/es_stub.py')
+    parser.add_argument('--index', default=None, help='Индекс или алиас (по умолчанию ES_INDEX)')
+    parser.add_argument('--corpus', default=None, help='Каталог корпуса bench/fias_corpus.py (создаётся, если его нет)')
+    parser.add_argument('--seed', type=int, default=1, help='Зерно генерации корпуса')
+    parser.add_argument('--load', action='store_true', help='Загрузить корпус в --es-url под алиасом --index')
+    parser.add_argument('--offline', action='store_true', help='Офлайн-движок из --corpus вместо ES')
+    parser.add_argument('--recordings', default=None, help='Заглушка ES с записанными ответами (файл --record)')
+    parser.add_argument('--record', default=None, help='Записать ответы ES цели service в файл (нужен --es-url)')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Задержка заглушки, мс')
+    parser.add_argument('--miss-rate', type=float, default=0.0, help='Доля пустых ответов заглушки без записи')
+    parser.add_argument('--workloads', default='tests,sample', help=f"Нагрузки через запятую: {','.join(WORKLOADS)}")
+    parser.add_argument('--targets', default='service,app', help=f"Цели через запятую: {','.join(TARGETS)}")
+    parser.add_argument('--concurrency', default='1,8,32', help='Уровни конкурентности через запятую')
+    parser.add_argument('--requests', type=int, default=1000, help='Запросов на каждый уровень')
+    parser.add_argument('--client-mode', choices=('sync', 'async'), default=settings.ES_CLIENT_MODE,
+                        help='Клиент ES цели service (как ES_CLIENT_MODE)')
+    parser.add_argument('--speculative', action='store_true', help='Включить SEARCH_SPECULATIVE_FALLBACK')
+    parser.add_argument('--canonical', action='store_true', help='Включить SEARCH_CANONICAL_FIELDS')
+    parser.add_argument('--ru-analyzer', action='store_true', help='Включить SEARCH_RU_ANALYZER')
+    parser.add_argument('--house-fast-path', action='store_true', help='Включить SEARCH_HOUSE_FAST_PATH (работает при --limit 1)')
+    parser.add_argument('--limit', type=int, default=settings.SEARCH_LIMIT, help='Размер ответа на запрос (как SEARCH_LIMIT)')
+    parser.add_argument('--out', default=None, help='Путь для результатов (JSON)')
+    parser.add_argument('--compare', default=None, help='Результаты прошлого прогона (JSON) для сравнения')
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help='Допустимый рост p95 и ES-вызовов на запрос относительно --compare, %% (иначе код 1)')
+    args = parser.parse_args()
+
+    workloads_names = [w.strip() for w in args.workloads.split(',') if w.strip()]
+    targets = [t.strip() for t in args.targets.split(',') if t.strip()]
+    levels = [int(x) for x in args.concurrency.split(',') if x.strip()]
+    if set(workloads_names) - set(WORKLOADS) or set(targets) - set(TARGETS):
+        parser.error(f"нагрузки: {', '.join(WORKLOADS)}; цели: {', '.join(TARGETS)}")
+    if (args.load or args.offline) and not args.corpus:
+        parser.error('--load и --offline требуют --corpus')
+    if args.load and not args.es_url:
+        parser.error('--load требует --es-url')
+    if args.record and (not args.es_url or args.client_mode != 'sync'):
+        parser.error('--record пишет ответы настоящего ES: нужны --es-url и --client-mode sync')
+
+    settings.SEARCH_SPECULATIVE_FALLBACK = args.speculative
+    settings.SEARCH_CANONICAL_FIELDS = args.canonical
+    settings.SEARCH_RU_ANALYZER = args.ru_analyzer
+    settings.SEARCH_HOUSE_FAST_PATH = args.house_fast_path
+    settings.SEARCH_LIMIT = args.limit
+    index = args.index or settings.ES_INDEX
+
+    if args.corpus and not os.path.exists(os.path.join(args.corpus, 'manifest.json')):
+        from fias_corpus import generate_corpus
+
+        manifest = generate_corpus(args.corpus, args.seed)
+        print(f"Корпус {args.corpus}: документов {manifest['docs']}")
+    offline_path = None
+    if args.offline:
+        from data.etl import FiasETL
+
+        offline_path = os.path.join(args.corpus, 'offline.idx')
+        if not os.path.exists(offline_path) and not FiasETL(dump_dir=args.corpus).build_offline_index(offline_path):
+            sys.exit('Не удалось собрать офлайн-индекс из корпуса')
+    if args.load:
+        from data.etl import FiasETL
+
+        # ETL пишет версию <index>_<метка> и переключает на неё алиас index
+        settings.ES_URL = args.es_url
+        settings.ES_INDEX = index
+        if not FiasETL(dump_dir=args.corpus, state_dir=os.path.join(args.corpus, 'etl_state')).run_etl():
+            sys.exit('Не удалось загрузить корпус в ES')
+
+    # data/etl.py включает INFO для корневого логгера; в замере логи запросов к ES не нужны
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    workloads = {name: load_workload(name) for name in workloads_names}
+    print(', '.join(f'{name}: {len(q)} запросов' for name, q in workloads.items()) + f'; на уровень: {args.requests}')
+
+    stub = None
+    es_url = args.es_url
+    if offline_path:
+        stand_in = {'kind': 'offline', 'corpus': args.corpus}
+    elif es_url:
+        stand_in = {'kind': 'es', 'url': es_url, 'index': index, 'corpus': args.corpus}
+    else:
+        stub, es_url = start_stub(args.latency_ms, 0.0, args.miss_rate, recordings=args.recordings)
+        stand_in = {'kind': 'recordings' if args.recordings else 'stub', 'latency_ms': args.latency_ms}
+        if args.recordings:
+            stand_in['recordings'] = args.recordings
+        else:
+            stand_in['miss_rate'] = args.miss_rate
+    print(f"Замена ES: {stand_in}")
+
+    record: Optional[Dict[str, Any]] = {} if args.record else None
+    runs: List[Dict[str, Any]] = []
+    try:
+        if 'service' in targets:
+            es_config = get_elasticsearch_config()
+            es_config['hosts'] = [es_url]
+            counter = None
+            if offline_path:
+                client = None
+                service = OfflineSearchService(OfflineIndex(offline_path))
+            elif args.client_mode == 'async':
+                client = AsyncElasticsearch(**es_config, connections_per_node=max(settings.ES_ASYNC_CONNECTIONS, max(levels)))
+                counter = CountingClient(client)
+                service = AsyncSearchService(counter, index)
+            else:
+                client = Elasticsearch(**es_config, connections_per_node=max(10, max(levels)))
+                counter = CountingClient(client, record)
+                service = SearchService(counter, index)
+
+            async def run_service():
+                try:
+                    return await bench_service(service, counter, workloads, levels, args.requests)
+                finally:
+                    if isinstance(client, AsyncElasticsearch):
+                        await client.close()
+
+            runs.extend(asyncio.run(run_service()))
+            if isinstance(client, Elasticsearch):
+                client.close()
+            elif offline_path:
+                service.offline.close()
+
+        if 'app' in targets:
+            env = {flag: str(getattr(settings, flag)).lower() for flag in SEARCH_FLAGS}
+            env.update(ES_INDEX=index, ES_CLIENT_MODE=args.client_mode, METRICS_ENABLED='true')
+            if offline_path:
+                env.update(SEARCH_BACKEND='offline', OFFLINE_INDEX_PATH=os.path.abspath(offline_path))
+            api, api_url = start_api(es_url or '', env)
+            try:
+                runs.extend(asyncio.run(bench_app(api_url, workloads, levels, args.requests)))
+            finally:
+                api.terminate()
+                api.wait()
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.wait()
+
+    if record is not None:
+        with open(args.record, 'w', encoding='utf-8') as f:
+            for key, response in record.items():
+                f.write(json.dumps({'key': key, 'response': response}, ensure_ascii=False) + '\n')
+        print(f'Записано ответов ES: {len(record)} -> {args.record}')
+
+    result = {
+        **git_revision(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'stand_in': stand_in,
+        'settings': {flag: getattr(settings, flag) for flag in SEARCH_FLAGS},
+        'client_mode': args.client_mode,
+        'requests_per_level': args.requests,
+        'runs': runs,
+    }
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f'Результаты: {args.out}')
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            ok = compare(json.load(f), result, args.max_regression)
+        if not ok:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Локальная заглушка Elasticsearch для нагрузочных бенчмарков.
+
+Отвечает на ping, _search и _msearch фиксированным документом дома с заданной
+задержкой (имитация времени ES). Доля «пустых» ответов позволяет прогнать
+каскад фолбэков SearchService.
+
+С --recordings отвечает записанными ответами настоящего ES (bench/bench_suite.py --record):
+ответ ищется по ключу тела запроса (body_key), тело без записи получает пустой ответ.
+Так прогон на заглушке повторяет каскад и результаты прогона на записанном индексе.
+
+Пример:
+  python bench/es_stub.py --port 9201 --latency-ms 5 --miss-rate 0.2 --msearch-item-ms 0.2
+  python bench/es_stub.py --port 9201 --latency-ms 5 --recordings bench_recordings.jsonl
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import zlib
+from typing import Any, Dict, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+# Заголовок, без которого клиент elasticsearch-py 8.x отказывается работать с сервером
+ES_HEADERS = {"X-Elastic-Product": "Elasticsearch"}
+
+STUB_HIT = {
+    "_index": "fias_addresses_v2",
+    "_id": "stub-house-1",
+    "_score": 42.0,
+    "_source": {
+        "level": "house",
+        "name_norm": "37",
+        "name_exact": "37",
+        "full_norm": "москва г, мо северное бутово вн/тер-г, варшавское ш, дом 37 стр 5",
+        "type_norm": "ш",
+        "region_code": "77",
+        "house_number": "37",
+        "stroenie": "5",
+        "geo": {"lat": 55.55, "lon": 37.58},
+    },
+}
+
+
+def body_key(body: Any) -> str:
+    """Ключ записанного ответа: sha1 тела запроса в каноническом JSON (порядок ключей не важен)"""
+    if isinstance(body, (bytes, str)):
+        body = json.loads(body)
+    canonical = json.dumps(body, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def load_recordings(path: str) -> Dict[str, Dict[str, Any]]:
+    """Записанные ответы: JSON Lines {"key": body_key(тело), "response": ответ _search}"""
+    recordings: Dict[str, Dict[str, Any]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                recordings[record["key"]] = record["response"]
+    return recordings
+
+
+def build_app(
+    latency_ms: float = 5.0,
+    jitter_ms: float = 0.0,
+    miss_rate: float = 0.0,
+    msearch_item_ms: float = 0.0,
+    recordings: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Starlette:
+    """ASGI-приложение заглушки"""
+    stats = {"recorded": 0, "unrecorded": 0}
+
+    def json_response(payload, status_code: int = 200) -> Response:
+        return Response(
+            json.dumps(payload, ensure_ascii=False),
+            status_code=status_code,
+            media_type="application/json",
+            headers=ES_HEADERS,
+        )
+
+    async def simulate_latency(items: int = 1) -> None:
+        delay = latency_ms + (random.uniform(0, jitter_ms) if jitter_ms else 0.0) + msearch_item_ms * (items - 1)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+
+    def search_result(body: bytes) -> dict:
+        if recordings is not None:
+            response = recordings.get(body_key(body))
+            stats["recorded" if response is not None else "unrecorded"] += 1
+            if response is not None:
+                return response
+            return {"took": 0, "timed_out": False, "hits": {"total": {"value": 0, "relation": "eq"}, "max_score": None, "hits": []}}
+        # Промах детерминирован телом запроса: одинаковые запросы ведут себя одинаково
+        miss = miss_rate > 0 and (zlib.crc32(body) % 1000) < miss_rate * 1000
+        hits = [] if miss else [STUB_HIT]
+        return {
+            "took": int(latency_ms),
+            "timed_out": False,
+            "hits": {"total": {"value": len(hits), "relation": "eq"}, "max_score": 42.0 if hits else None, "hits": hits},
+        }
+
+    async def root(request: Request) -> Response:
+        return json_response({
+            "name": "es-stub",
+            "cluster_name": "fias-bench",
+            "version": {"number": "8.11.0", "build_flavor": "default"},
+            "tagline": "You Know, for Search",
+        })
+
+    async def search(request: Request) -> Response:
+        body = await request.body()
+        await simulate_latency()
+        return json_response(search_result(body))
+
+    async def msearch(request: Request) -> Response:
+        raw = await request.body()
+        lines = [line for line in raw.split(b"\n") if line.strip()]
+        bodies = lines[1::2]
+        await simulate_latency(len(bodies))
+        return json_response({"took": int(latency_ms), "responses": [search_result(b) for b in bodies]})
+
+    async def count(request: Request) -> Response:
+        return json_response({"count": 1})
+
+    async def stub_stats(request: Request) -> Response:
+        """Сколько тел нашлось в записи: непокрытые тела означают, что запись устарела для этого кода"""
+        return json_response(stats)
+
+    return Starlette(routes=[
+        Route("/", root, methods=["GET", "HEAD"]),
+        Route("/{index}/_search", search, methods=["GET", "POST"]),
+        Route("/{index}/_msearch", msearch, methods=["GET", "POST"]),
+        Route("/{index}/_count", count, methods=["GET", "POST"]),
+        Route("/_stub/stats", stub_stats, methods=["GET"]),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заглушка Elasticsearch для бенчмарков')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9201)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='Задержка ответа, мс')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Случайная добавка к задержке, мс')
+    parser.add_argument('--miss-rate', type=float, default=0.0, help='Доля пустых ответов (0..1)')
+    parser.add_argument('--msearch-item-ms', type=float, default=0.0, help='Добавка к задержке _msearch за каждый запрос сверх первого, мс')
+    parser.add_argument('--recordings', default=None, help='Записанные ответы ES (JSON Lines) вместо фиксированного документа')
+    args = parser.parse_args()
+
+    import uvicorn
+    recordings = load_recordings(args.recordings) if args.recordings else None
+    uvicorn.run(
+        build_app(args.latency_ms, args.jitter_ms, args.miss_rate, args.msearch_item_ms, recordings),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+        access_log=False,
+    )
+
+
+if __name__ == '__main__':
+    main()
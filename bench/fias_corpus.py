@@ -0,0 +1,197 @@
+"""
+Небольшой ФИАС-подобный корпус для воспроизводимых бенчмарков поиска.
+
+Адреса строятся из ожидаемых ответов queries/tests.json и data/sample_cases.csv
+(регион, населённый пункт, улица, дом — с теми же full_norm, что в выгрузке ФИАС),
+к ним добавляются «шумовые» улицы с домами в тех же населённых пунктах. Генерация
+детерминирована зерном: один и тот же --seed даёт один и тот же корпус.
+
+Документы проходят row_to_doc из data/etl.py и пишутся выгрузкой data/etl.py (--dump),
+так что корпус загружается тем же ETL, что и боевые данные:
+  python data/etl.py --from-dump DIR                      # в ES под алиасом ES_INDEX
+  python data/etl.py --from-dump DIR --offline-index PATH  # офлайн-индекс, без ES
+
+Пример:
+  python bench/fias_corpus.py bench_corpus --noise-streets 2000 --seed 1
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import re
+import sys
+import uuid
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+from data.etl import rows_to_docs, write_dump_manifest, write_partition_dump  # noqa: E402
+
+# Коды регионов, которые встречаются в тестовых запросах; остальным код выводится из имени
+REGION_CODES = {
+    'москва г': 77,
+    'московская обл': 50,
+    'санкт-петербург г': 78,
+    'ленинградская обл': 47,
+}
+# Типы сегментов, которые становятся документами уровня city (остальные промежуточные —
+# муниципальные образования и районы — в индекс не попадают, как и в выгрузке ФИАС)
+CITY_TYPES = {'г', 'г.', 'гп', 'п', 'пгт', 'рп', 'д', 'с', 'дп', 'снт', 'тер.', 'кв-л', 'мкр', 'мкр.'}
+# Территории, которые в ответе стоят последними (без улицы и дома): для поиска это населённый пункт
+AREA_TYPES = {'вн/тер-г', 'м/р-н', 'р-н', 'го', 'сп'}
+HOUSE_RE = re.compile(r'^(?:дом|влд|вл|д)\.?\s+(\S+)(?:\s+к\s+(\S+))?(?:\s+стр\s+(\S+))?$')
+# Центры регионов для координат документов (остальные — около центра Москвы)
+REGION_CENTERS = {77: (55.75, 37.62), 50: (55.6, 37.9), 78: (59.94, 30.31), 47: (59.8, 30.9)}
+
+NOISE_STEMS = ('берёз', 'лесн', 'садов', 'школьн', 'полев', 'речн', 'сосн', 'лугов', 'заводск', 'нагорн',
+               'красн', 'весенн', 'зелён', 'озёрн', 'тих', 'светл', 'кленов', 'рябинов', 'дачн', 'парков')
+NOISE_SUFFIXES = ('ая', 'ый', 'ой')
+NOISE_TYPES = {'ая': ('ул', 'аллея'), 'ый': ('пер', 'пр-д', 'б-р'), 'ой': ('пер', 'пр-д', 'туп')}
+
+
+def region_code(region: str) -> int:
+    return REGION_CODES.get(region) or (zlib.crc32(region.encode('utf-8')) % 89 + 1)
+
+
+def split_segment(segment: str) -> Tuple[str, str]:
+    """«варшавское ш» -> ("варшавское", "ш"): тип — последнее слово, как в text_cache ФИАС"""
+    name, _, type_norm = segment.rpartition(' ')
+    return (name, type_norm) if name else (segment, '')
+
+
+def expected_addresses() -> List[str]:
+    """full_norm ожидаемых ответов tests.json и адреса из sample_cases.csv"""
+    with open(os.path.join(PROJECT_ROOT, 'queries', 'tests.json'), 'r', encoding='utf-8') as f:
+        addresses = [t['expected_answer'] for t in json.load(f).get('tests', []) if t.get('expected_answer')]
+    with open(os.path.join(PROJECT_ROOT, 'data', 'sample_cases.csv'), 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            street = row.get('expected_full_substr')
+            if not street or not row.get('expected_house_number'):
+                continue
+            # В CSV только подстрока full_norm: улица достраивается до адреса в Москве
+            if ' ' not in street:
+                street = f'{street} ул'
+            house = f"дом {row['expected_house_number']}"
+            if row.get('expected_korpus'):
+                house += f" к {row['expected_korpus']}"
+            if row.get('expected_stroenie'):
+                house += f" стр {row['expected_stroenie']}"
+            addresses.append(f'москва г, {street}, {house}')
+    return addresses
+
+
+class CorpusBuilder:
+    """Строки address_table2 (в форме SOURCE_COLUMNS) по адресам; одинаковые full_norm не дублируются"""
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        # (регион, full_norm) населённых пунктов, в которые добавляются шумовые улицы
+        self.places: List[Tuple[int, str]] = []
+
+    def row(self, level: str, path: List[str], code: int, house: Optional[Tuple] = None) -> None:
+        full_norm = ', '.join(path)
+        if full_norm in self.rows:
+            return
+        lat, lon = REGION_CENTERS.get(code, REGION_CENTERS[77])
+        name, type_norm = split_segment(path[-1])
+        if house:
+            name, type_norm = house[0], 'дом'
+        self.rows[full_norm] = {
+            'id': str(uuid.uuid5(uuid.NAMESPACE_URL, full_norm)),
+            'level': level,
+            'name_norm': name,
+            'name_exact': name,
+            'type_norm': type_norm,
+            'full_norm': full_norm,
+            'region_code': code,
+            'lat': round(lat + self.rng.uniform(-0.2, 0.2), 6),
+            'lon': round(lon + self.rng.uniform(-0.3, 0.3), 6),
+            'house_number': house[0] if house else None,
+            'korpus': house[1] if house else None,
+            'stroenie': house[2] if house else None,
+        }
+        if level == 'city':
+            self.places.append((code, full_norm))
+
+    def add_address(self, full_norm: str) -> None:
+        segments = [s.strip() for s in full_norm.split(',') if s.strip()]
+        code = region_code(segments[0])
+        self.row('region', segments[:1], code)
+        house = HOUSE_RE.match(segments[-1]) if len(segments) > 1 else None
+        last = len(segments) - (2 if house else 1)
+        for i in range(1, last + 1):
+            type_norm = split_segment(segments[i])[1]
+            if type_norm in CITY_TYPES:
+                self.row('city', segments[:i + 1], code)
+            elif i == last:
+                # Последний сегмент перед домом — улица
+                self.row('city' if not house and type_norm in AREA_TYPES else 'street', segments[:i + 1], code)
+        if house:
+            self.row('house', segments, code, house.groups())
+
+    def add_noise(self, streets: int, max_houses: int) -> None:
+        """Шумовые улицы в населённых пунктах корпуса (в Москве, если их нет)"""
+        if not self.places:
+            self.row('region', ['москва г'], 77)
+            self.places.append((77, 'москва г'))
+        places = sorted(self.places)
+        for n in range(streets):
+            code, place = places[self.rng.randrange(len(places))]
+            stem = NOISE_STEMS[self.rng.randrange(len(NOISE_STEMS))]
+            suffix = NOISE_SUFFIXES[self.rng.randrange(len(NOISE_SUFFIXES))]
+            type_norm = self.rng.choice(NOISE_TYPES[suffix])
+            # Номер в имени держит улицы различимыми при небольшом наборе основ
+            street = f'{n // len(NOISE_STEMS) + 1}-я {stem}{suffix} {type_norm}'
+            path = [place, street]
+            self.row('street', path, code)
+            for number in self.rng.sample(range(1, 200), self.rng.randint(1, max_houses)):
+                korpus = str(self.rng.randint(1, 5)) if self.rng.random() < 0.2 else None
+                stroenie = str(self.rng.randint(1, 9)) if self.rng.random() < 0.1 else None
+                house = f'дом {number}' + (f' к {korpus}' if korpus else '') + (f' стр {stroenie}' if stroenie else '')
+                self.row('house', path + [house], code, (str(number), korpus, stroenie))
+
+    def partitions(self) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """Строки по регионам, как партиции --partition-by region"""
+        by_region: Dict[int, List[Dict[str, Any]]] = {}
+        for row in self.rows.values():
+            by_region.setdefault(row['region_code'], []).append(row)
+        for code in sorted(by_region):
+            yield f'region_{code}', sorted(by_region[code], key=lambda r: r['full_norm'])
+
+
+def generate_corpus(dump_dir: str, seed: int = 1, noise_streets: int = 2000, max_houses: int = 30) -> Dict[str, Any]:
+    """Запись корпуса выгрузкой data/etl.py в dump_dir; возвращает manifest.json"""
+    builder = CorpusBuilder(seed)
+    for address in expected_addresses():
+        builder.add_address(address)
+    builder.add_noise(noise_streets, max_houses)
+
+    os.makedirs(dump_dir, exist_ok=True)
+    summaries = [
+        write_partition_dump(key, iter(rows_to_docs(rows)), dump_dir)
+        for key, rows in builder.partitions()
+    ]
+    return write_dump_manifest(
+        dump_dir, summaries, source='bench/fias_corpus.py', seed=seed,
+        noise_streets=noise_streets, max_houses=max_houses
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генерация ФИАС-подобного корпуса для бенчмарков (выгрузка data/etl.py)')
+    parser.add_argument('dump_dir', help='Каталог выгрузки (загрузка: python data/etl.py --from-dump DIR)')
+    parser.add_argument('--seed', type=int, default=1, help='Зерно генерации')
+    parser.add_argument('--noise-streets', type=int, default=2000, help='Шумовых улиц сверх адресов из тестов')
+    parser.add_argument('--max-houses', type=int, default=30, help='Максимум домов на шумовой улице')
+    args = parser.parse_args()
+
+    manifest = generate_corpus(args.dump_dir, args.seed, args.noise_streets, args.max_houses)
+    print(f"Корпус {args.dump_dir}: документов {manifest['docs']}, по уровням {manifest['levels']}")
+
+
+if __name__ == '__main__':
+    main()
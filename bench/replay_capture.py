@@ -0,0 +1,232 @@
+"""
+Повтор захвата медленных и пустых запросов /search (CAPTURE_ENABLED, см. api/tracing.py)
+против выбранного индекса ES — оценка изменений поиска на реальном трафике, а не только на tests.json.
+
+Режимы:
+  search — запрос заново проходит normalize_query и SearchService (текущий код api/search.py),
+           результат сравнивается с захваченным списком id;
+  bodies — в ES уходят захваченные тела запросов как есть (влияние изменений индекса и кластера),
+           сравнивается число хитов и первые id каждого вызова.
+Темп — --rate запросов в секунду (0 — без ограничения), параллельность — --concurrency.
+Отчёт: перцентили задержки повтора рядом с захваченными и расхождения результатов.
+
+Пример:
+  python bench/replay_capture.py slow_queries.jsonl --index fias_addresses_v2 --rate 20
+  python bench/replay_capture.py slow_queries.jsonl slow_queries.jsonl.1 --mode bodies --out replay.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+from elasticsearch import Elasticsearch  # noqa: E402
+
+from config.settings import settings, get_elasticsearch_config  # noqa: E402
+from api.normalizer import normalize_query  # noqa: E402
+from api.search import SearchService, build_search_params  # noqa: E402
+from api.tracing import TRACE_HIT_IDS  # noqa: E402
+
+
+def load_capture(paths: List[str], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Записи захвата /search из файлов JSON Lines (повреждённые строки пропускаются)"""
+    records: List[Dict[str, Any]] = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('endpoint') == '/search' and record.get('query'):
+                    records.append(record)
+    # Ротированные файлы могут идти в любом порядке: повтор в порядке исходного трафика
+    records.sort(key=lambda r: r.get('started_at') or 0)
+    return records[:limit] if limit else records
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 2)
+
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': round(ordered[-1], 2)}
+
+
+def replay_search(service: SearchService, record: Dict[str, Any]) -> Dict[str, Any]:
+    """Запрос через текущий код поиска: задержка (нормализация + поиск) и id результатов"""
+    q = record['query']
+    limit = int(record.get('params', {}).get('limit', settings.SEARCH_LIMIT))
+    started = time.perf_counter()
+    items = service._search_sync(**build_search_params(normalize_query(q), q, limit), original_query=q)
+    return {'ms': (time.perf_counter() - started) * 1000.0, 'ids': [item.id for item in items]}
+
+
+def replay_bodies(es: Elasticsearch, index: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    """Захваченные вызовы ES по порядку: задержка всех вызовов и (хиты, первые id) каждого"""
+    calls = []
+    started = time.perf_counter()
+    for call in record.get('es', []):
+        body = call.get('body')
+        if body is None:
+            continue
+        if isinstance(body, list):
+            payload = []
+            for item in body:
+                payload.extend(({}, item))
+            response = es.msearch(index=index, body=payload, request_timeout=settings.ES_TIMEOUT)
+            calls.append([len(r.get('hits', {}).get('hits', [])) for r in response['responses']])
+        else:
+            hits = es.search(index=index, body=body, request_timeout=settings.ES_TIMEOUT)['hits']['hits']
+            calls.append([len(hits), [h['_id'] for h in hits[:TRACE_HIT_IDS]]])
+    return {'ms': (time.perf_counter() - started) * 1000.0, 'calls': calls}
+
+
+def captured_calls(record: Dict[str, Any]) -> List[Any]:
+    """Те же (хиты, первые id) по захвату — для сравнения с replay_bodies"""
+    calls = []
+    for call in record.get('es', []):
+        if call.get('body') is None:
+            continue
+        if isinstance(call.get('hits'), list):
+            calls.append(call['hits'])
+        else:
+            calls.append([call.get('hits'), call.get('hit_ids')])
+    return calls
+
+
+def diff_search(record: Dict[str, Any], replay: Dict[str, Any]) -> Optional[str]:
+    """Вид расхождения результатов повтора с захватом (None — совпадают)"""
+    before = record.get('result_ids') or []
+    after = replay['ids']
+    if before == after:
+        return None
+    if not before:
+        return 'became_nonempty'
+    if not after:
+        return 'became_empty'
+    if before[0] != after[0]:
+        return 'top1_changed'
+    return 'ids_changed'
+
+
+def run_replay(records: List[Dict[str, Any]], fn, rate: float, concurrency: int) -> List[Any]:
+    """Повтор с темпом rate запросов/с (0 — без ограничения) и не больше concurrency одновременно"""
+    results: List[Any] = [None] * len(records)
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def task(i: int) -> None:
+        try:
+            results[i] = fn(records[i])
+        except Exception as e:
+            results[i] = e
+        finally:
+            slots.release()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(len(records)):
+            if rate > 0:
+                delay = started + i / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            slots.acquire()
+            pool.submit(task, i)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Повтор захвата медленных/пустых запросов против индекса ES')
+    parser.add_argument('paths', nargs='+', help='Файлы захвата (CAPTURE_PATH и его ротации)')
+    parser.add_argument('--es-url', default=None, help='URL ES (по умолчанию из настроек)')
+    parser.add_argument('--index', default=None, help='Индекс или алиас (по умолчанию ES_INDEX)')
+    parser.add_argument('--mode', choices=('search', 'bodies'), default='search',
+                        help='search — текущий код поиска; bodies — захваченные тела как есть')
+    parser.add_argument('--rate', type=float, default=10.0, help='Запросов в секунду (0 — без ограничения)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Одновременных запросов')
+    parser.add_argument('--limit', type=int, default=None, help='Повторить только первые N записей')
+    parser.add_argument('--speculative', action='store_true', help='Включить SEARCH_SPECULATIVE_FALLBACK')
+    parser.add_argument('--canonical', action='store_true', help='Включить SEARCH_CANONICAL_FIELDS')
+    parser.add_argument('--ru-analyzer', action='store_true', help='Включить SEARCH_RU_ANALYZER')
+    parser.add_argument('--house-fast-path', action='store_true', help='Включить SEARCH_HOUSE_FAST_PATH')
+    parser.add_argument('--out', default=None, help='Путь для отчёта (JSON) с расхождениями по запросам')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    settings.SEARCH_SPECULATIVE_FALLBACK = args.speculative
+    settings.SEARCH_CANONICAL_FIELDS = args.canonical
+    settings.SEARCH_RU_ANALYZER = args.ru_analyzer
+    settings.SEARCH_HOUSE_FAST_PATH = args.house_fast_path
+
+    records = load_capture(args.paths, args.limit)
+    if not records:
+        parser.error('в файлах захвата нет записей /search')
+    es_config = get_elasticsearch_config()
+    if args.es_url:
+        es_config['hosts'] = [args.es_url]
+    es = Elasticsearch(**es_config, connections_per_node=max(10, args.concurrency))
+    index = args.index or settings.ES_INDEX
+    pace = f'{args.rate:g} запр/с' if args.rate > 0 else 'без ограничения'
+    print(f'Записей: {len(records)}, индекс: {index}, режим: {args.mode}, '
+          f'темп: {pace}, параллельно: {args.concurrency}')
+
+    if args.mode == 'search':
+        # Без кэша результатов: каждый повтор доходит до ES
+        service = SearchService(es, index)
+        replays = run_replay(records, lambda r: replay_search(service, r), args.rate, args.concurrency)
+    else:
+        replays = run_replay(records, lambda r: replay_bodies(es, index, r), args.rate, args.concurrency)
+    es.close()
+
+    diffs: Dict[str, int] = {}
+    queries: List[Dict[str, Any]] = []
+    errors = 0
+    for record, replay in zip(records, replays):
+        if isinstance(replay, Exception):
+            errors += 1
+            queries.append({'query': record['query'], 'error': str(replay)})
+            continue
+        if args.mode == 'search':
+            kind = diff_search(record, replay)
+            detail = {'before': record.get('result_ids'), 'after': replay['ids']}
+        else:
+            before = captured_calls(record)
+            kind = None if before == replay['calls'] else 'hits_changed'
+            detail = {'before': before, 'after': replay['calls']}
+        if kind:
+            diffs[kind] = diffs.get(kind, 0) + 1
+            queries.append({'query': record['query'], 'diff': kind, 'captured_ms': record.get('duration_ms'),
+                            'replay_ms': round(replay['ms'], 2), **detail})
+
+    ok = [r for r in replays if not isinstance(r, Exception)]
+    report = {
+        'records': len(records),
+        'errors': errors,
+        'mode': args.mode,
+        'index': index,
+        'captured_ms': percentiles([r['duration_ms'] for r in records if r.get('duration_ms') is not None]),
+        'replay_ms': percentiles([r['ms'] for r in ok]),
+        'diffs': diffs,
+        'unchanged': len(ok) - sum(diffs.values()),
+    }
+    print(f"Захват, мс: {report['captured_ms']}")
+    print(f"Повтор, мс: {report['replay_ms']}")
+    print(f"Без изменений: {report['unchanged']}, расхождения: {diffs or 'нет'}, ошибок: {errors}")
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({**report, 'queries': queries}, f, ensure_ascii=False, indent=2)
+        print(f'Отчёт: {args.out}')
+
+
+if __name__ == '__main__':
+    main()
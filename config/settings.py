@@ -14,8 +14,15 @@ class Settings(BaseSettings):
     ES_API_KEY: Optional[str] = None
     ES_USER: Optional[str] = None
     ES_PASS: Optional[str] = None
+    # Алиас для чтения; ETL собирает версии <ES_INDEX>_<метка времени> и переключает алиас
     ES_INDEX: str = "fias_addresses_v2"
+    # Сколько предыдущих версий индекса хранить для отката
+    ES_INDEX_KEEP_GENERATIONS: int = 2
     ES_TIMEOUT: int = 60
+    # Клиент для /search и /suggest: "sync" (Elasticsearch в пуле потоков) или "async" (AsyncElasticsearch)
+    ES_CLIENT_MODE: str = "sync"
+    # Размер пула соединений AsyncElasticsearch на один узел ES
+    ES_ASYNC_CONNECTIONS: int = 100
     
     # MySQL FIAS
     MYSQL_HOST: str = "mysql.node7.smartagent.ru"
@@ -32,9 +39,74 @@ class Settings(BaseSettings):
     # Поиск
     SEARCH_LIMIT: int = 10
     MAX_SEARCH_LIMIT: int = 100
+    # Движок поиска: elasticsearch или offline — файл OFFLINE_INDEX_PATH в памяти процесса, без ES
+    SEARCH_BACKEND: str = "elasticsearch"
+    # Офлайн-индекс (python data/etl.py --from-dump DIR --offline-index PATH)
+    OFFLINE_INDEX_PATH: str = "offline.index"
+    # Спекулятивный каскад фолбэков: основной и все запасные запросы одним _msearch
+    # (False — последовательные запросы до первого непустого ответа)
+    SEARCH_SPECULATIVE_FALLBACK: bool = False
+    # Поиск по каноническим полям name_canon/full_canon вместо вариантов е/ё, окончаний, порядка типа
+    # и алиасов в каждом запросе. Поля пишет ETL: включать после переиндексации
+    SEARCH_CANONICAL_FIELDS: bool = False
+    # Текстовые условия по подполям name_norm.ru / full_norm.ru (ё, синонимы типов, стеммер в маппинге)
+    # вместо вариантов и fuzziness в запросе. Включать после переиндексации
+    SEARCH_RU_ANALYZER: bool = False
+    # Быстрый путь «улица + дом»: улица запросом без дома (кэшируется), дом — по точным ключам
+    # street_key/house_key из словаря домов улицы в памяти. Поля пишет ETL: включать после переиндексации.
+    # Путь отдаёт один дом, поэтому работает только для запросов с limit=1
+    SEARCH_HOUSE_FAST_PATH: bool = False
+    # Сколько улиц (и их словарей домов) держать в памяти, сколько домов хранить на улицу,
+    # срок жизни записей, сек. Дома более длинных улиц ищутся term-запросом
+    HOUSE_FAST_PATH_STREETS: int = 5000
+    HOUSE_FAST_PATH_MAX_HOUSES: int = 300
+    HOUSE_FAST_PATH_TTL: int = 3600
+    # Источник /suggest: search — полный поиск SearchService; completion — поле suggest
+    # (completion suggester, нужна переиндексация); memory — снимок SUGGEST_SNAPSHOT_PATH в процессе, без ES
+    SUGGEST_BACKEND: str = "search"
+    # Снимок префиксного индекса подсказок (python data/etl.py --from-dump DIR --suggest-snapshot PATH)
+    SUGGEST_SNAPSHOT_PATH: str = "suggest.snapshot"
+    # Таймаут запроса подсказок к ES, сек. (короче ES_TIMEOUT: устаревшая подсказка не нужна)
+    SUGGEST_TIMEOUT: float = 0.5
+    # Пакетный поиск POST /search/batch: запросов в одном _msearch, параллельных _msearch, максимум строк
+    BATCH_CHUNK_SIZE: int = 200
+    BATCH_CONCURRENCY: int = 4
+    BATCH_MAX_QUERIES: int = 50000
+    
+    # Кэш результатов поиска (выключен по умолчанию: включать явно)
+    RESULT_CACHE_ENABLED: bool = False
+    # memory — в процессе; redis — общий для нескольких воркеров
+    RESULT_CACHE_BACKEND: str = "memory"
+    RESULT_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    RESULT_CACHE_TTL: int = 300
+    RESULT_CACHE_MAX_ENTRIES: int = 10000
+    # Как часто (сек) сверять поколение индекса для инвалидации кэша
+    RESULT_CACHE_GENERATION_POLL: int = 30
+    
+    # ETL: столбец address_table2, растущий при каждом изменении записи (водяной знак для --delta)
+    ETL_WATERMARK_COLUMN: str = "updated_at"
     
     # Логирование
     LOG_LEVEL: str = "INFO"
+    # Метрики Prometheus на /metrics и заголовок Server-Timing с разбивкой времени запроса по стадиям
+    METRICS_ENABLED: bool = True
+    # Трассировка запросов /search, /search/batch, /suggest: доля запросов в трассы (0 — выключено);
+    # TRACE_FORCE_HEADER — трассировать запрос с заголовком X-Trace: 1 независимо от выборки.
+    # Трассы пишутся фоновым потоком в TRACE_LOG_PATH (JSON Lines; пусто — логгер fias.trace),
+    # последние TRACE_BUFFER_SIZE доступны через /debug/traces/{trace_id}
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_FORCE_HEADER: bool = False
+    TRACE_LOG_PATH: str = ""
+    TRACE_BUFFER_SIZE: int = 1000
+    # Захват запросов /search медленнее CAPTURE_SLOW_MS (и, при CAPTURE_ZERO_HITS, без результатов)
+    # в CAPTURE_PATH (JSON Lines с ротацией по CAPTURE_MAX_BYTES, CAPTURE_BACKUPS старых файлов)
+    # для повтора через bench/replay_capture.py
+    CAPTURE_ENABLED: bool = False
+    CAPTURE_PATH: str = "slow_queries.jsonl"
+    CAPTURE_SLOW_MS: float = 500.0
+    CAPTURE_ZERO_HITS: bool = True
+    CAPTURE_MAX_BYTES: int = 50_000_000
+    CAPTURE_BACKUPS: int = 5
     
     class Config:
         env_file = ".env"
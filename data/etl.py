@@ -3,28 +3,168 @@ ETL скрипт для загрузки данных FIAS из MySQL в Elastic
 """
 import mysql.connector
 from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
+from elasticsearch.helpers import parallel_bulk, streaming_bulk
+import argparse
+import glob
+import gzip
+import itertools
+import json
 import logging
+import shutil
 import time
-from typing import Dict, Any, Iterator, List, Optional
+from datetime import date, datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from tqdm import tqdm
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import settings, get_elasticsearch_url, get_mysql_url
-import re
+from config import settings, get_elasticsearch_config, get_mysql_url
+from api.result_cache import stamp_index_generation, update_index_meta
+from api.search import SearchService, prepare_search_batch
+from api.house_parser import HouseParts, parse_house_name, parse_house_names
+from api.query_plan import canonical_full, canonical_name
+from api.house_lookup import house_key, street_key
+from api.normalizer import ALIASES
+from api.suggest import suggest_entry
+from api.suggest_index import write_suggest_snapshot
+from api.offline_search import write_offline_index
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Каталог с прогрессом по партициям и исходными настройками индекса
+DEFAULT_STATE_DIR = "etl_state"
+# Как часто (в документах) сохранять прогресс партиции
+PROGRESS_SAVE_EVERY = 10000
+# Границы партиций по первому символу guid (для --partition-by guid)
+GUID_PREFIXES = "0123456789abcdef"
+# Уровни address_table2, которые попадают в индекс
+LEVEL_NAMES = {0: "region", 3: "city", 7: "street", 8: "house"}
+# Ключ в _meta индекса: до какого значения ETL_WATERMARK_COLUMN данные уже загружены
+WATERMARK_META_KEY = "etl_watermark"
+# Выгрузка в файлы (--dump): документов в одном шарде и степень сжатия gzip
+DUMP_SHARD_SIZE = 500000
+DUMP_COMPRESSLEVEL = 3
+
+# Поля address_table2 для документа индекса (общие для полной и инкрементальной загрузки)
+SOURCE_COLUMNS = """
+        guid as id,
+        CASE 
+            WHEN level = 0 THEN 'region'
+            WHEN level = 3 THEN 'city'
+            WHEN level = 7 THEN 'street'
+            WHEN level = 8 THEN 'house'
+            ELSE 'other'
+        END as level,
+        LOWER(name) as name_norm,
+        name as name_exact,
+        LOWER(short_name) as type_norm,
+        LOWER(text_cache) as full_norm,
+        region_code,
+        CASE 
+            WHEN level = 8 THEN name
+            ELSE NULL
+        END as house_number,
+        corpus as korpus,
+        building as stroenie,
+        lat,
+        lon
+"""
+
+
+def row_to_doc(row: Dict[str, Any], house_parts: Optional[HouseParts] = None, index_name: Optional[str] = None) -> Dict[str, Any]:
+    """Преобразование строки address_table2 в документ для bulk.
+    house_parts — уже разобранное имя дома (см. rows_to_docs), иначе разбирается здесь.
+    index_name — индекс для _index (в выгрузку _index не пишется).
+    """
+    # Преобразуем данные для Elasticsearch
+    doc = {
+        '_index': index_name,
+        '_id': row['id'],
+        '_source': {
+            'level': row['level'],
+            'name_norm': row['name_norm'],
+            'name_exact': row['name_exact'],
+            'type_norm': row['type_norm'],
+            'full_norm': row['full_norm'],
+            'name_canon': canonical_name(row['name_norm']),
+            'full_canon': canonical_full(row['full_norm']),
+            'region_code': str(row['region_code']) if row['region_code'] else None
+        }
+    }
+
+    suggest = suggest_entry(row['level'], row['name_norm'], row['type_norm'])
+    if suggest:
+        doc['_source']['suggest'] = suggest
+
+    # Добавляем координаты если есть
+    if row['lat'] and row['lon']:
+        doc['_source']['geo'] = {
+            'lat': float(row['lat']),
+            'lon': float(row['lon'])
+        }
+
+    # Добавляем данные дома если есть
+    if row['house_number']:
+        house_number = str(row['house_number']).lower()
+        korpus = (str(row['korpus']).lower() if row['korpus'] else None)
+        stroenie = (str(row['stroenie']).lower() if row['stroenie'] else None)
+
+        # Если в БД корпус/строение не заполнены, берём их из компактной формы имени дома
+        # Поддержка: "49к4", "49 к 4", "49к4с2", "49с2", алиасы к/корп/корпус, с/стр/строение
+        if (not korpus) or (not stroenie):
+            parts = house_parts or parse_house_name(house_number)
+            if parts:
+                house_number = parts[0]
+                if not korpus:
+                    korpus = parts[1]
+                if not stroenie:
+                    stroenie = parts[2]
+
+        doc['_source']['house_number'] = house_number
+        if korpus:
+            doc['_source']['korpus'] = korpus
+        if stroenie:
+            doc['_source']['stroenie'] = stroenie
+        doc['_source']['house_key'] = house_key(house_number, korpus, stroenie)
+
+    key = street_key(doc['_source'])
+    if key:
+        doc['_source']['street_key'] = key
+
+    return doc
+
+
+def rows_to_docs(rows: List[Dict[str, Any]], index_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Пакетное преобразование: имена домов всей пачки разбираются одним вызовом.
+    Без клиентов ES/MySQL — годится для офлайн-выгрузки (data/gar_import.py).
+    """
+    names = [str(row['house_number']).lower() for row in rows if row['house_number']]
+    parsed = iter(parse_house_names(names))
+    return [row_to_doc(row, next(parsed) if row['house_number'] else None, index_name) for row in rows]
+
 
 class FiasETL:
     """ETL процесс для загрузки данных FIAS"""
     
-    def __init__(self, region_codes: Optional[List[int]] = None, recreate_index: bool = True):
-        self.es = Elasticsearch([get_elasticsearch_url()])
+    def __init__(
+        self,
+        region_codes: Optional[List[int]] = None,
+        recreate_index: bool = True,
+        workers: int = 1,
+        partition_by: str = "region",
+        state_dir: str = DEFAULT_STATE_DIR,
+        resume: bool = False,
+        bulk_threads: int = 4,
+        chunk_size: int = 500,
+        index_name: Optional[str] = None,
+        count_tolerance: float = 0.001,
+        dump_dir: Optional[str] = None
+    ):
+        self.es = Elasticsearch(**get_elasticsearch_config())
         self.mysql_config = {
             'host': settings.MYSQL_HOST,
             'port': settings.MYSQL_PORT,
@@ -34,16 +174,25 @@ class FiasETL:
             'charset': 'utf8mb4'
         }
         self.region_codes = region_codes
-        self.recreate_index = recreate_index
+        # При продолжении загрузки индекс пересоздавать нельзя
+        self.recreate_index = recreate_index and not resume
+        self.workers = max(1, workers)
+        self.partition_by = partition_by
+        self.state_dir = state_dir
+        self.resume = resume
+        self.bulk_threads = bulk_threads
+        self.chunk_size = chunk_size
+        # Индекс, в который идёт загрузка; settings.ES_INDEX — алиас для чтения
+        self.index_name = index_name or settings.ES_INDEX
+        self.switch_alias = False
+        self.build_watermark = None
+        self.count_tolerance = count_tolerance
+        # Каталог выгрузки: если задан, индекс собирается из файлов, а не из MySQL
+        self.dump_dir = dump_dir
     
     def create_index(self) -> bool:
         """Создание индекса в Elasticsearch"""
         try:
-            # Удаляем индекс если существует и требуется пересоздать
-            if self.recreate_index and self.es.indices.exists(index=settings.ES_INDEX):
-                logger.info(f"Удаляем существующий индекс {settings.ES_INDEX}")
-                self.es.indices.delete(index=settings.ES_INDEX)
-            
             # Маппинг индекса
             mapping = {
                 "mappings": {
@@ -57,6 +206,18 @@ class FiasETL:
                             "fields": {
                                 "keyword": {
                                     "type": "keyword"
+                                },
+                                # Русский анализатор для SEARCH_RU_ANALYZER
+                                "ru": {
+                                    "type": "text",
+                                    "analyzer": "address_ru",
+                                    "search_analyzer": "address_ru_search"
+                                },
+                                # Префиксы слов для подсказок
+                                "prefix": {
+                                    "type": "text",
+                                    "analyzer": "address_prefix",
+                                    "search_analyzer": "address_prefix_search"
                                 }
                             }
                         },
@@ -67,12 +228,37 @@ class FiasETL:
                             "type": "keyword"
                         },
                         "full_norm": {
+                            "type": "text",
+                            "analyzer": "standard",
+                            "fields": {
+                                "ru": {
+                                    "type": "text",
+                                    "analyzer": "address_ru",
+                                    "search_analyzer": "address_ru_search"
+                                }
+                            }
+                        },
+                        # Канонические формы (api/query_plan.py::canonical_segment) для SEARCH_CANONICAL_FIELDS
+                        "name_canon": {
+                            "type": "text",
+                            "analyzer": "standard"
+                        },
+                        "full_canon": {
                             "type": "text",
                             "analyzer": "standard"
                         },
                         "region_code": {
                             "type": "keyword"
                         },
+                        # Подсказки при вводе (api/suggest.py): регионы, города, улицы с контекстами region/level
+                        "suggest": {
+                            "type": "completion",
+                            "analyzer": "address_prefix_search",
+                            "contexts": [
+                                {"name": "region", "type": "category", "path": "region_code"},
+                                {"name": "level", "type": "category", "path": "level"}
+                            ]
+                        },
                         "geo": {
                             "type": "geo_point"
                         },
@@ -84,56 +270,80 @@ class FiasETL:
                         },
                         "stroenie": {
                             "type": "keyword"
+                        },
+                        # Точные ключи быстрого пути «улица + дом» (api/house_lookup.py)
+                        "street_key": {
+                            "type": "keyword"
+                        },
+                        "house_key": {
+                            "type": "keyword"
                         }
                     }
                 },
                 "settings": {
                     "number_of_shards": 1,
                     "number_of_replicas": 0,
-                    "refresh_interval": "30s"
+                    "refresh_interval": "30s",
+                    "analysis": address_analysis()
                 }
             }
             
             # Создаем индекс, если он отсутствует
-            if not self.es.indices.exists(index=settings.ES_INDEX):
-                self.es.indices.create(index=settings.ES_INDEX, body=mapping)
-                logger.info(f"Индекс {settings.ES_INDEX} создан успешно")
+            if not self.es.indices.exists(index=self.index_name):
+                self.es.indices.create(index=self.index_name, body=mapping)
+                logger.info(f"Индекс {self.index_name} создан успешно")
             return True
             
         except Exception as e:
             logger.error(f"Ошибка создания индекса: {e}")
             return False
     
-    def get_data_from_mysql(self) -> Iterator[Dict[str, Any]]:
-        """Получение данных из MySQL"""
+    def row_to_doc(self, row: Dict[str, Any], house_parts: Optional[HouseParts] = None) -> Dict[str, Any]:
+        """Документ для bulk в индекс загрузки (см. row_to_doc модуля)"""
+        return row_to_doc(row, house_parts, self.index_name)
+    
+    def rows_to_docs(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return rows_to_docs(rows, self.index_name)
+    
+    def get_partitions(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Разбиение загрузки на партиции: по region_code (крупные первыми) или по диапазонам guid"""
+        if self.partition_by == "guid":
+            partitions = []
+            for i, prefix in enumerate(GUID_PREFIXES):
+                upper = GUID_PREFIXES[i + 1] if i + 1 < len(GUID_PREFIXES) else None
+                partitions.append((f"guid_{prefix}", {"guid_from": prefix, "guid_to": upper}))
+            return partitions
+        
+        if self.region_codes:
+            return [(f"region_{code}", {"region_code": code}) for code in self.region_codes]
+        
+        connection = mysql.connector.connect(**self.mysql_config)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT region_code, COUNT(*) FROM address_table2 "
+                "WHERE status IN (0, 2) AND level IN (0, 3, 7, 8) AND name IS NOT NULL AND name != '' "
+                "GROUP BY region_code"
+            )
+            counts = cursor.fetchall()
+            cursor.close()
+        finally:
+            connection.close()
+        # Крупные регионы первыми, чтобы воркеры заканчивали примерно одновременно
+        counts.sort(key=lambda rc: rc[1], reverse=True)
+        return [(f"region_{code}", {"region_code": code}) for code, _ in counts]
+    
+    def get_data_from_mysql(self, partition: Optional[Dict[str, Any]] = None, after_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Получение данных из MySQL (всех или одной партиции) потоково, по возрастанию guid.
+        after_id — guid последнего загруженного документа: продолжение партиции после сбоя.
+        """
+        connection = mysql.connector.connect(**self.mysql_config)
+        # Небуферизованный курсор: строки читаются с сервера по мере обработки
+        cursor = connection.cursor(dictionary=True, buffered=False)
         try:
-            connection = mysql.connector.connect(**self.mysql_config)
-            cursor = connection.cursor(dictionary=True)
-            
             # Запрос для получения адресных данных из address_table2
-            base_query = """
-            SELECT 
-                guid as id,
-                CASE 
-                    WHEN level = 0 THEN 'region'
-                    WHEN level = 3 THEN 'city'
-                    WHEN level = 7 THEN 'street'
-                    WHEN level = 8 THEN 'house'
-                    ELSE 'other'
-                END as level,
-                LOWER(name) as name_norm,
-                name as name_exact,
-                LOWER(short_name) as type_norm,
-                LOWER(text_cache) as full_norm,
-                region_code,
-                CASE 
-                    WHEN level = 8 THEN name
-                    ELSE NULL
-                END as house_number,
-                corpus as korpus,
-                building as stroenie,
-                lat,
-                lon
+            base_query = f"""
+            SELECT {SOURCE_COLUMNS}
             FROM address_table2 
             WHERE 
                 status IN (0, 2)  -- Актуальные записи (0 - актуальные, 2 - актуальные с изменениями)
@@ -144,12 +354,29 @@ class FiasETL:
 
             params: List[Any] = []
             where_extras = []
-            if self.region_codes:
+            partition = partition or {}
+            if "region_code" in partition:
+                if partition["region_code"] is None:
+                    where_extras.append("region_code IS NULL")
+                else:
+                    where_extras.append("region_code = %s")
+                    params.append(partition["region_code"])
+            elif self.region_codes:
                 placeholders = ", ".join(["%s"] * len(self.region_codes))
                 where_extras.append(f"region_code IN ({placeholders})")
                 params.extend(self.region_codes)
+            if partition.get("guid_from"):
+                where_extras.append("guid >= %s")
+                params.append(partition["guid_from"])
+            if partition.get("guid_to"):
+                where_extras.append("guid < %s")
+                params.append(partition["guid_to"])
+            if after_id:
+                where_extras.append("guid > %s")
+                params.append(after_id)
 
-            order_by = " ORDER BY level, name"
+            # Порядок по guid нужен для продолжения партиции с последнего загруженного документа
+            order_by = " ORDER BY guid"
             query = base_query
             if where_extras:
                 query += " AND " + " AND ".join(where_extras)
@@ -164,102 +391,298 @@ class FiasETL:
                 if not batch:
                     break
                 
-                for row in batch:
-                    # Преобразуем данные для Elasticsearch
-                    doc = {
-                        '_index': settings.ES_INDEX,
-                        '_id': row['id'],
-                        '_source': {
-                            'level': row['level'],
-                            'name_norm': row['name_norm'],
-                            'name_exact': row['name_exact'],
-                            'type_norm': row['type_norm'],
-                            'full_norm': row['full_norm'],
-                            'region_code': str(row['region_code']) if row['region_code'] else None
-                        }
-                    }
-                    
-                    # Добавляем координаты если есть
-                    if row['lat'] and row['lon']:
-                        doc['_source']['geo'] = {
-                            'lat': float(row['lat']),
-                            'lon': float(row['lon'])
-                        }
-                    
-                    # Добавляем данные дома если есть
-                    if row['house_number']:
-                        house_number = str(row['house_number']).lower()
-                        korpus = (str(row['korpus']).lower() if row['korpus'] else None)
-                        stroenie = (str(row['stroenie']).lower() if row['stroenie'] else None)
-
-                        # Если в БД корпус/строение не заполнены, попробуем распарсить из компактной формы имени дома
-                        # Поддержка: "49к4", "49 к 4", "49к4с2", "49с2", алиасы к/корп/корпус, с/стр/строение
-                        if (not korpus) or (not stroenie):
-                            name_for_parse = house_number
-                            name_for_parse = re.sub(r'k', 'к', name_for_parse)
-                            name_for_parse = re.sub(r'c', 'с', name_for_parse)
-                            # Вставим пробелы между числом и метками
-                            name_for_parse = re.sub(r'(\d)\s*[к]\s*(\d)', r'\1 к \2', name_for_parse)
-                            name_for_parse = re.sub(r'(\d)\s*[с]\s*(\d)', r'\1 с \2', name_for_parse)
-
-                            corp_alias = r'(?:корпус|корп|кор\.?|к)'
-                            bldg_alias = r'(?:строение|стр\.?|с)'
-                            own_alias = r'(?:владение|влад\.?|вл)'
-
-                            base_num = r'(?:дом|д)?\.?\s*(\d+[абвгдежзийклмнопрстуфхцчшщъыьэюя]?)'
-                            corp_num = r'(?:\s*(?:' + corp_alias + r')\.?\s*(\d+[абвгдежзийклмнопрстуфхцчшщъыьэюя]?))'
-                            bldg_num = r'(?:\s*(?:' + bldg_alias + r'|' + own_alias + r')\.?\s*(\d+[абвгдежзийклмнопрстуфхцчшщъыьэюя]?))'
-
-                            pattern1 = re.compile(r'^' + base_num + r'(?:' + corp_num + r')?(?:' + bldg_num + r')?$', re.IGNORECASE)
-                            pattern2 = re.compile(r'^' + base_num + r'(?:' + bldg_num + r')?(?:' + corp_num + r')?$', re.IGNORECASE)
-
-                            m = pattern1.search(name_for_parse) or pattern2.search(name_for_parse)
-                            if m:
-                                house_number = m.group(1)
-                                if not korpus and len(m.groups()) >= 2:
-                                    korpus = m.group(2)
-                                if not stroenie and len(m.groups()) >= 3:
-                                    stroenie = m.group(3)
-
-                        doc['_source']['house_number'] = house_number
-                        if korpus:
-                            doc['_source']['korpus'] = korpus
-                        if stroenie:
-                            doc['_source']['stroenie'] = stroenie
-                    
-                    yield doc
-            
+                yield from self.rows_to_docs(batch)
+        finally:
             cursor.close()
             connection.close()
+    
+    def _state_path(self, name: str) -> str:
+        return os.path.join(self.state_dir, f"{name}.json")
+    
+    def _read_state(self, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._state_path(name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+    
+    def _write_state(self, name: str, state: Dict[str, Any]) -> None:
+        path = self._state_path(name)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    
+    def load_partition(self, key: str, partition: Dict[str, Any]) -> Dict[str, Any]:
+        """Загрузка одной партиции через parallel_bulk с сохранением прогресса"""
+        state = self._read_state(key) or {"partition": key, "status": "pending", "last_id": None, "loaded": 0, "errors": 0}
+        if state["status"] == "done":
+            return state
+        
+        state["status"] = "running"
+        client = self.es.options(request_timeout=60, max_retries=3, retry_on_timeout=True)
+        since_save = 0
+        try:
+            docs = self.get_data_from_mysql(partition, after_id=state["last_id"])
+            # Ответы parallel_bulk идут в порядке документов: всё до текущего _id уже записано
+            for ok, info in parallel_bulk(
+                client,
+                docs,
+                thread_count=self.bulk_threads,
+                chunk_size=self.chunk_size,
+                raise_on_error=False
+            ):
+                result = next(iter(info.values()))
+                if ok:
+                    state["loaded"] += 1
+                else:
+                    state["errors"] += 1
+                    logger.warning(f"[{key}] Ошибка индексации {result.get('_id')}: {result.get('error')}")
+                state["last_id"] = result.get("_id")
+                since_save += 1
+                if since_save >= PROGRESS_SAVE_EVERY:
+                    self._write_state(key, state)
+                    since_save = 0
+            state["status"] = "done"
+        except Exception as e:
+            state["status"] = "failed"
+            logger.error(f"[{key}] Ошибка загрузки партиции: {e}")
+        self._write_state(key, state)
+        return state
+    
+    def dump_partition(self, key: str, partition: Dict[str, Any], dump_dir: str, shard_size: int = DUMP_SHARD_SIZE) -> Dict[str, Any]:
+        """Этап 1: выгрузка партиции MySQL в шарды (см. write_partition_dump)"""
+        return write_partition_dump(key, self.get_data_from_mysql(partition), dump_dir, shard_size)
+    
+    def run_dump(self, dump_dir: str, shard_size: int = DUMP_SHARD_SIZE) -> bool:
+        """Этап 1 целиком: MySQL -> сжатые NDJSON-шарды на диске, без обращения к ES.
+        С --resume уже выгруженные партиции пропускаются.
+        """
+        logger.info(f"Выгрузка FIAS из MySQL в {dump_dir}")
+        start_time = time.time()
+        try:
+            os.makedirs(dump_dir, exist_ok=True)
+            if not self.resume:
+                for path in glob.glob(os.path.join(dump_dir, "*.ndjson.gz*")) + glob.glob(os.path.join(dump_dir, "*.json")):
+                    os.remove(path)
+            
+            # Водяной знак снимается до чтения, как и при сборке индекса напрямую из MySQL
+            watermark = self.max_source_watermark()
+            partitions = self.get_partitions()
+            logger.info(f"Партиций: {len(partitions)}, процессов: {self.workers}")
+            
+            summaries: List[Dict[str, Any]] = []
+            pending = []
+            for key, partition in partitions:
+                done = os.path.join(dump_dir, f"{key}.json")
+                if self.resume and os.path.exists(done):
+                    with open(done, "r", encoding="utf-8") as f:
+                        summaries.append(json.load(f))
+                else:
+                    pending.append((key, partition))
             
+            if self.workers == 1:
+                for key, partition in tqdm(pending, desc="Партиции"):
+                    summaries.append(self.dump_partition(key, partition, dump_dir, shard_size))
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    futures = [
+                        pool.submit(_dump_partition_worker, self._worker_options(), key, partition, dump_dir, shard_size)
+                        for key, partition in pending
+                    ]
+                    for future in tqdm(as_completed(futures), total=len(futures), desc="Партиции"):
+                        summaries.append(future.result())
+        except Exception as e:
+            logger.error(f"Ошибка выгрузки: {e}")
+            return False
+        
+        manifest = write_dump_manifest(
+            dump_dir, summaries,
+            watermark=watermark, region_codes=self.region_codes, partition_by=self.partition_by
+        )
+        
+        elapsed_time = time.time() - start_time
+        logger.info(f"Выгрузка завершена за {elapsed_time:.2f} секунд: {manifest['docs']} документов, шардов {len(manifest['shards'])}")
+        return True
+    
+    def read_manifest(self) -> Dict[str, Any]:
+        with open(os.path.join(self.dump_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    
+    def read_shard(self, path: str, skip: int = 0) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """Пары (действие, документ) из шарда. Документ остаётся готовой JSON-строкой:
+        клиент отправляет строки как есть, без повторной сериализации.
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for n, action_line in enumerate(f):
+                source_line = next(f)
+                if n < skip:
+                    continue
+                doc_id = json.loads(action_line)["index"]["_id"]
+                yield {"index": {"_index": self.index_name, "_id": doc_id}}, source_line.rstrip("\n")
+    
+    def iter_dump_sources(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Пары (id, документ) всех шардов выгрузки"""
+        for shard in tqdm(self.read_manifest()["shards"], desc="Шарды"):
+            for action, source_line in self.read_shard(os.path.join(self.dump_dir, shard["file"])):
+                yield action["index"]["_id"], json.loads(source_line)
+    
+    def build_suggest_snapshot(self, path: str) -> bool:
+        """Снимок префиксного индекса подсказок (api/suggest_index.py) из выгрузки, без MySQL и ES"""
+        logger.info(f"Снимок подсказок из {self.dump_dir} -> {path}")
+        start_time = time.time()
+        try:
+            header = write_suggest_snapshot(path, self.iter_dump_sources())
+        except Exception as e:
+            logger.error(f"Ошибка записи снимка подсказок: {e}")
+            return False
+        logger.info(
+            f"Снимок подсказок записан за {time.time() - start_time:.2f} секунд: "
+            f"{header['records']} записей, ключей {sum(header['keys'].values())}, {os.path.getsize(path)} байт"
+        )
+        return True
+    
+    def build_offline_index(self, path: str) -> bool:
+        """Офлайн-индекс для SEARCH_BACKEND=offline (api/offline_search.py) из выгрузки, без MySQL и ES"""
+        logger.info(f"Офлайн-индекс из {self.dump_dir} -> {path}")
+        start_time = time.time()
+        try:
+            header = write_offline_index(path, self.iter_dump_sources())
         except Exception as e:
-            logger.error(f"Ошибка получения данных из MySQL: {e}")
+            logger.error(f"Ошибка записи офлайн-индекса: {e}")
+            return False
+        logger.info(
+            f"Офлайн-индекс записан за {time.time() - start_time:.2f} секунд: "
+            f"мест {header['places']}, домов {header['houses']}, токенов {header['tokens']}, {os.path.getsize(path)} байт"
+        )
+        return True
+    
+    def load_shard(self, key: str, shard: Dict[str, Any]) -> Dict[str, Any]:
+        """Этап 2: загрузка одного шарда. Отказы ES по перегрузке (429) повторяются с растущей паузой,
+        прогресс сохраняется, и при --resume шард продолжается с первой не подтверждённой целиком пачки.
+        """
+        state = self._read_state(key) or {"partition": key, "status": "pending", "loaded": 0, "errors": 0}
+        if state["status"] == "done":
+            return state
+        
+        state["status"] = "running"
+        client = self.es.options(request_timeout=60, max_retries=3, retry_on_timeout=True)
+        since_save = 0
+        try:
+            actions = self.read_shard(os.path.join(self.dump_dir, shard["file"]), skip=state["loaded"] + state["errors"])
+            # streaming_bulk повторяет отказы 429 позже остальных документов пачки, поэтому
+            # ответы не идут в порядке шарда. Пачки отдаются по одной, а счётчики (они же
+            # смещение для --resume) сдвигаются только когда подтверждена вся пачка
+            while True:
+                chunk = list(itertools.islice(actions, self.chunk_size))
+                if not chunk:
+                    break
+                loaded = errors = 0
+                for ok, info in streaming_bulk(
+                    client,
+                    chunk,
+                    chunk_size=self.chunk_size,
+                    expand_action_callback=lambda pair: pair,
+                    max_retries=5,
+                    initial_backoff=2,
+                    max_backoff=120,
+                    raise_on_error=False
+                ):
+                    if ok:
+                        loaded += 1
+                    else:
+                        errors += 1
+                        result = next(iter(info.values()))
+                        logger.warning(f"[{key}] Ошибка индексации {result.get('_id')}: {result.get('error')}")
+                state["loaded"] += loaded
+                state["errors"] += errors
+                since_save += len(chunk)
+                if since_save >= PROGRESS_SAVE_EVERY:
+                    self._write_state(key, state)
+                    since_save = 0
+            state["status"] = "done"
+        except Exception as e:
+            state["status"] = "failed"
+            logger.error(f"[{key}] Ошибка загрузки шарда: {e}")
+        self._write_state(key, state)
+        return state
+    
+    def apply_bulk_settings(self) -> None:
+        """На время загрузки: без refresh и реплик. Исходные значения сохраняются в state_dir,
+        чтобы их можно было вернуть и после прерванного запуска.
+        """
+        if self._read_state("index_settings") is None:
+            current = self.es.indices.get_settings(index=self.index_name, flat_settings=True)
+            index_settings = next(iter(current.values()))["settings"]
+            self._write_state("index_settings", {
+                "refresh_interval": index_settings.get("index.refresh_interval"),
+                "number_of_replicas": index_settings.get("index.number_of_replicas"),
+            })
+        self.es.indices.put_settings(
+            index=self.index_name,
+            settings={"index": {"refresh_interval": "-1", "number_of_replicas": 0}}
+        )
+    
+    def restore_index_settings(self) -> None:
+        """Вернуть refresh_interval и число реплик, бывшие до загрузки"""
+        original = self._read_state("index_settings")
+        if original is None:
+            return
+        self.es.indices.put_settings(
+            index=self.index_name,
+            settings={"index": {
+                "refresh_interval": original["refresh_interval"],
+                "number_of_replicas": original["number_of_replicas"],
+            }}
+        )
+        logger.info(f"Настройки индекса восстановлены: {original}")
     
     def load_data(self) -> bool:
-        """Загрузка данных в Elasticsearch"""
+        """Загрузка данных в Elasticsearch: партиции MySQL (или шарды выгрузки) параллельно в отдельных процессах"""
         try:
-            logger.info("Начинаем загрузку данных...")
+            logger.info(f"Начинаем загрузку данных в {self.index_name}...")
+            os.makedirs(self.state_dir, exist_ok=True)
             
-            # Получаем данные и загружаем пакетами
-            docs = self.get_data_from_mysql()
+            if self.dump_dir:
+                tasks = [(f"shard_{shard['file'].split('.')[0]}", shard) for shard in self.read_manifest()["shards"]]
+                load_task, task_worker = self.load_shard, _load_shard_worker
+                logger.info(f"Загрузка из выгрузки {self.dump_dir}: шардов {len(tasks)}, процессов: {self.workers}")
+            else:
+                tasks = self.get_partitions()
+                load_task, task_worker = self.load_partition, _load_partition_worker
+                logger.info(f"Партиций: {len(tasks)}, процессов: {self.workers}")
             
-            # Используем bulk loading для эффективности
-            success_count, failed_count = bulk(
-                self.es,
-                docs,
-                chunk_size=500,
-                request_timeout=60,
-                max_retries=3,
-                initial_backoff=2,
-                max_backoff=600
-            )
+            self.apply_bulk_settings()
+            results: List[Dict[str, Any]] = []
+            try:
+                if self.workers == 1:
+                    for key, task in tqdm(tasks, desc="Партиции"):
+                        results.append(load_task(key, task))
+                else:
+                    with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                        futures = [
+                            pool.submit(task_worker, self._worker_options(), key, task)
+                            for key, task in tasks
+                        ]
+                        for future in tqdm(as_completed(futures), total=len(futures), desc="Партиции"):
+                            results.append(future.result())
+            finally:
+                self.restore_index_settings()
+            
+            success_count = sum(r["loaded"] for r in results)
+            failed_count = sum(r["errors"] for r in results)
+            failed_partitions = [r["partition"] for r in results if r["status"] != "done"]
             
             logger.info(f"Загружено документов: {success_count}")
             if failed_count:
-                logger.warning(f"Ошибок при загрузке: {len(failed_count)}")
+                logger.warning(f"Ошибок при загрузке: {failed_count}")
+            if failed_partitions:
+                logger.error(f"Не загружены партиции: {', '.join(failed_partitions)} (повторите с --resume)")
+                return False
             
             # Обновляем индекс
-            self.es.indices.refresh(index=settings.ES_INDEX)
+            self.es.indices.refresh(index=self.index_name)
+            os.remove(self._state_path("index_settings"))
             
             return True
             
@@ -267,6 +690,294 @@ class FiasETL:
             logger.error(f"Ошибка загрузки данных: {e}")
             return False
     
+    def _worker_options(self) -> Dict[str, Any]:
+        """Параметры для FiasETL в процессе-воркере (клиенты ES/MySQL не передаются между процессами)"""
+        return {
+            "region_codes": self.region_codes,
+            "recreate_index": False,
+            "partition_by": self.partition_by,
+            "state_dir": self.state_dir,
+            "resume": True,
+            "bulk_threads": self.bulk_threads,
+            "chunk_size": self.chunk_size,
+            "index_name": self.index_name,
+            "dump_dir": self.dump_dir,
+        }
+    
+    def list_generations(self) -> List[Dict[str, Any]]:
+        """Версии индекса <ES_INDEX>_<метка времени>, от новых к старым, с отметкой живой (под алиасом)"""
+        response = self.es.indices.get_alias(index=f"{settings.ES_INDEX}_*")
+        generations = [
+            {"index": name, "live": settings.ES_INDEX in (info.get("aliases") or {})}
+            for name, info in response.items()
+        ]
+        return sorted(generations, key=lambda g: g["index"], reverse=True)
+    
+    def new_index_name(self) -> str:
+        return f"{settings.ES_INDEX}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    
+    def prepare_build(self) -> None:
+        """Каталог состояния и целевой индекс сборки. При --resume загрузка продолжается
+        в тот же индекс, что и прерванный запуск; без пересоздания — в текущий индекс под алиасом.
+        """
+        if not self.resume and os.path.isdir(self.state_dir):
+            shutil.rmtree(self.state_dir)
+        os.makedirs(self.state_dir, exist_ok=True)
+        
+        build = self._read_state("build")
+        if build is None:
+            full_build = self.recreate_index or not self.es.indices.exists(index=settings.ES_INDEX)
+            build = {
+                "index": self.new_index_name() if full_build else settings.ES_INDEX,
+                "switch_alias": full_build,
+                # Водяной знак снимается до чтения: изменения во время загрузки подхватит следующий --delta
+                "watermark": self.max_source_watermark(),
+            }
+            self._write_state("build", build)
+        self.index_name = build["index"]
+        self.switch_alias = build["switch_alias"]
+        self.build_watermark = build.get("watermark")
+    
+    def force_merge(self) -> None:
+        """Слияние сегментов собранного индекса: в него больше не пишут до следующей сборки"""
+        logger.info(f"Force-merge {self.index_name}...")
+        self.es.options(request_timeout=6 * 3600).indices.forcemerge(index=self.index_name, max_num_segments=1)
+    
+    def warm_up(self) -> None:
+        """Прогрев нового индекса запросами из queries/tests.json до переключения алиаса"""
+        tests_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queries", "tests.json")
+        try:
+            with open(tests_file, "r", encoding="utf-8") as f:
+                queries = [t["query"] for t in json.load(f).get("tests", [])]
+        except (OSError, ValueError) as e:
+            logger.warning(f"Прогрев пропущен: {e}")
+            return
+        
+        params = [p[1] for p in prepare_search_batch(queries, settings.SEARCH_LIMIT) if not isinstance(p, Exception)]
+        started = time.time()
+        SearchService(self.es, self.index_name)._search_many_sync(params)
+        logger.info(f"Прогрев: {len(params)} запросов за {time.time() - started:.2f} секунд")
+    
+    def count_source_by_level(self) -> Dict[str, int]:
+        """Число строк каждого уровня в MySQL с теми же условиями, что и при загрузке
+        (при сборке из выгрузки — по её manifest.json)
+        """
+        if self.dump_dir:
+            return self.read_manifest()["levels"]
+        query = (
+            "SELECT level, COUNT(*) FROM address_table2 "
+            "WHERE status IN (0, 2) AND level IN (0, 3, 7, 8) AND name IS NOT NULL AND name != ''"
+        )
+        params: List[Any] = []
+        if self.region_codes:
+            query += f" AND region_code IN ({', '.join(['%s'] * len(self.region_codes))})"
+            params.extend(self.region_codes)
+        query += " GROUP BY level"
+        
+        connection = mysql.connector.connect(**self.mysql_config)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(query, tuple(params))
+            counts = {LEVEL_NAMES[level]: count for level, count in cursor.fetchall()}
+            cursor.close()
+        finally:
+            connection.close()
+        return counts
+    
+    def count_index_by_level(self, index: str) -> Dict[str, int]:
+        response = self.es.search(
+            index=index,
+            size=0,
+            aggs={"levels": {"terms": {"field": "level", "size": 20}}}
+        )
+        return {b["key"]: b["doc_count"] for b in response["aggregations"]["levels"]["buckets"]}
+    
+    def validate_counts(self) -> bool:
+        """Сверка числа документов по уровням с MySQL; расхождение больше count_tolerance — ошибка"""
+        expected = self.count_source_by_level()
+        actual = self.count_index_by_level(self.index_name)
+        ok = True
+        for level in LEVEL_NAMES.values():
+            want, got = expected.get(level, 0), actual.get(level, 0)
+            diff = abs(want - got) / want if want else float(got > 0)
+            status = "OK" if diff <= self.count_tolerance else "РАСХОЖДЕНИЕ"
+            logger.info(f"Уровень {level}: MySQL {want}, индекс {got} — {status}")
+            ok = ok and diff <= self.count_tolerance
+        return ok
+    
+    def swap_alias(self, target: str) -> None:
+        """Атомарное переключение алиаса чтения на target (одним запросом _aliases)"""
+        actions: List[Dict[str, Any]] = []
+        if self.es.indices.exists_alias(name=settings.ES_INDEX):
+            for index in self.es.indices.get_alias(name=settings.ES_INDEX):
+                if index != target:
+                    actions.append({"remove": {"index": index, "alias": settings.ES_INDEX}})
+        elif self.es.indices.exists(index=settings.ES_INDEX):
+            # Индекс старой схемы с именем алиаса: удаляется в том же атомарном запросе
+            logger.warning(f"{settings.ES_INDEX} — обычный индекс, он будет заменён алиасом")
+            actions.append({"remove_index": {"index": settings.ES_INDEX}})
+        actions.append({"add": {"index": target, "alias": settings.ES_INDEX}})
+        self.es.indices.update_aliases(actions=actions)
+        logger.info(f"Алиас {settings.ES_INDEX} -> {target}")
+    
+    def prune_generations(self) -> None:
+        """Удаление старых версий сверх settings.ES_INDEX_KEEP_GENERATIONS (живая не считается)"""
+        old = [g["index"] for g in self.list_generations() if not g["live"]]
+        for index in old[settings.ES_INDEX_KEEP_GENERATIONS:]:
+            logger.info(f"Удаляем старую версию индекса {index}")
+            self.es.indices.delete(index=index)
+    
+    def rollback(self) -> bool:
+        """Вернуть алиас на предыдущую версию индекса"""
+        generations = self.list_generations()
+        live = next((i for i, g in enumerate(generations) if g["live"]), None)
+        if live is None or live + 1 >= len(generations):
+            logger.error("Нет предыдущей версии индекса для отката")
+            return False
+        self.swap_alias(generations[live + 1]["index"])
+        return True
+    
+    def max_source_watermark(self) -> Any:
+        """Текущее максимальное значение ETL_WATERMARK_COLUMN в MySQL (None, если столбца нет).
+        При сборке из выгрузки — значение, снятое при выгрузке.
+        """
+        if self.dump_dir:
+            return self.read_manifest().get("watermark")
+        try:
+            connection = mysql.connector.connect(**self.mysql_config)
+            try:
+                cursor = connection.cursor()
+                cursor.execute(f"SELECT MAX({settings.ETL_WATERMARK_COLUMN}) FROM address_table2")
+                value = cursor.fetchone()[0]
+                cursor.close()
+            finally:
+                connection.close()
+        except Exception as e:
+            logger.warning(f"Не удалось получить водяной знак ({settings.ETL_WATERMARK_COLUMN}): {e}; --delta будет недоступен")
+            return None
+        return self._watermark_value(value)
+    
+    @staticmethod
+    def _watermark_value(value: Any) -> Any:
+        """Водяной знак в _meta и файлах состояния храним в JSON-совместимом виде, пригодном для параметра запроса"""
+        if isinstance(value, datetime):
+            return value.isoformat(sep=" ")
+        if isinstance(value, date):
+            return value.isoformat()
+        return value
+    
+    def read_watermark(self) -> Any:
+        mappings = self.es.indices.get_mapping(index=self.index_name)
+        mapping = next(iter(mappings.values()))
+        return (mapping.get("mappings", {}).get("_meta") or {}).get(WATERMARK_META_KEY)
+    
+    def get_changes_from_mysql(self, watermark: Any) -> Iterator[Dict[str, Any]]:
+        """Строки, изменённые начиная с watermark, включая ставшие неактуальными, по возрастанию водяного знака.
+        Граница включительная: строки с тем же значением, записанные после прошлого запуска, не теряются,
+        а повторная обработка уже загруженных идемпотентна.
+        """
+        column = settings.ETL_WATERMARK_COLUMN
+        query = f"""
+            SELECT {SOURCE_COLUMNS}, status as source_status, {column} as watermark
+            FROM address_table2
+            WHERE {column} >= %s AND level IN (0, 3, 7, 8)
+        """
+        params: List[Any] = [watermark]
+        if self.region_codes:
+            query += f" AND region_code IN ({', '.join(['%s'] * len(self.region_codes))})"
+            params.extend(self.region_codes)
+        query += f" ORDER BY {column}, guid"
+        
+        connection = mysql.connector.connect(**self.mysql_config)
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        try:
+            cursor.execute(query, tuple(params))
+            while True:
+                batch = cursor.fetchmany(1000)
+                if not batch:
+                    break
+                yield from batch
+        finally:
+            cursor.close()
+            connection.close()
+    
+    def change_to_action(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Актуальная запись — index (вставка или полная замена документа), неактуальная — delete"""
+        if row["source_status"] in (0, 2) and row["name_exact"]:
+            return self.row_to_doc(row)
+        return {"_op_type": "delete", "_index": self.index_name, "_id": row["id"]}
+    
+    def run_delta(self) -> bool:
+        """Инкрементальная загрузка изменений после водяного знака в живой индекс (через алиас)"""
+        logger.info("Запуск инкрементального ETL процесса FIAS")
+        
+        start_time = time.time()
+        
+        if not self.es.ping():
+            logger.error("Не удалось подключиться к Elasticsearch")
+            return False
+        
+        try:
+            watermark = self.read_watermark()
+        except Exception as e:
+            logger.error(f"Не удалось прочитать водяной знак индекса {self.index_name}: {e}")
+            return False
+        if watermark is None:
+            logger.error(f"В индексе {self.index_name} нет водяного знака: сначала нужна полная загрузка")
+            return False
+        logger.info(f"Водяной знак: {settings.ETL_WATERMARK_COLUMN} >= {watermark}")
+        
+        new_watermark = watermark
+        
+        def actions() -> Iterator[Dict[str, Any]]:
+            nonlocal new_watermark
+            for row in self.get_changes_from_mysql(watermark):
+                # Строки идут по возрастанию водяного знака
+                new_watermark = self._watermark_value(row["watermark"])
+                yield self.change_to_action(row)
+        
+        upserted = deleted = errors = 0
+        client = self.es.options(request_timeout=60, max_retries=3, retry_on_timeout=True)
+        try:
+            for ok, info in parallel_bulk(
+                client,
+                actions(),
+                thread_count=self.bulk_threads,
+                chunk_size=self.chunk_size,
+                raise_on_error=False
+            ):
+                op_type, result = next(iter(info.items()))
+                if op_type == "delete":
+                    # Удаление того, чего в индексе нет, — не ошибка
+                    if ok or result.get("status") == 404:
+                        deleted += 1
+                        continue
+                elif ok:
+                    upserted += 1
+                    continue
+                errors += 1
+                logger.warning(f"Ошибка {op_type} {result.get('_id')}: {result.get('error')}")
+        except Exception as e:
+            logger.error(f"Ошибка инкрементальной загрузки: {e}")
+            return False
+        
+        logger.info(f"Обновлено/добавлено: {upserted}, удалено: {deleted}, ошибок: {errors}")
+        if errors:
+            # Водяной знак не двигаем: следующий запуск повторит те же изменения
+            logger.error("Водяной знак не сдвинут из-за ошибок")
+            return False
+        
+        self.es.indices.refresh(index=self.index_name)
+        update_index_meta(self.es, self.index_name, {WATERMARK_META_KEY: new_watermark})
+        if upserted or deleted:
+            generation = stamp_index_generation(self.es, self.index_name)
+            logger.info(f"Поколение индекса: {generation}")
+        
+        elapsed_time = time.time() - start_time
+        logger.info(f"Инкрементальный ETL завершен за {elapsed_time:.2f} секунд, водяной знак: {new_watermark}")
+        
+        return True
+    
     def run_etl(self) -> bool:
         """Запуск полного ETL процесса"""
         logger.info("Запуск ETL процесса FIAS")
@@ -278,6 +989,9 @@ class FiasETL:
             logger.error("Не удалось подключиться к Elasticsearch")
             return False
         
+        # Целевой индекс: новая версия или (без пересоздания) текущая под алиасом
+        self.prepare_build()
+        
         # Создаем индекс (при необходимости)
         if not self.create_index():
             return False
@@ -286,9 +1000,31 @@ class FiasETL:
         if not self.load_data():
             return False
         
+        if self.switch_alias:
+            # Алиас переключается только на слитый, прогретый и сверенный индекс
+            try:
+                self.force_merge()
+                self.warm_up()
+                if not self.validate_counts():
+                    logger.error(f"Число документов не сходится с MySQL, алиас не переключён; индекс {self.index_name} оставлен для разбора")
+                    return False
+            except Exception as e:
+                logger.error(f"Ошибка проверки нового индекса {self.index_name}: {e}")
+                return False
+        
+        if self.build_watermark is not None:
+            update_index_meta(self.es, self.index_name, {WATERMARK_META_KEY: self.build_watermark})
+        
+        # Новое поколение индекса: API сбросит кэш результатов
+        generation = stamp_index_generation(self.es, self.index_name)
+        logger.info(f"Поколение индекса: {generation}")
+        
+        if self.switch_alias:
+            self.swap_alias(self.index_name)
+            self.prune_generations()
+        
         # Получаем статистику
-        stats = self.es.indices.stats(index=settings.ES_INDEX)
-        doc_count = stats['indices'][settings.ES_INDEX]['total']['docs']['count']
+        doc_count = self.es.count(index=self.index_name)['count']
         
         elapsed_time = time.time() - start_time
         logger.info(f"ETL завершен успешно за {elapsed_time:.2f} секунд")
@@ -297,9 +1033,204 @@ class FiasETL:
         return True
 
 
+def address_analysis() -> Dict[str, Any]:
+    """Цепочки анализа для подполей .ru и .prefix.
+    address_ru: ё -> е, нижний регистр, лёгкий русский стеммер; при поиске (address_ru_search) ещё
+    и synonym_graph по normalizer.ALIASES, так что "улица"/"ул-ца"/"улиц" совпадают без вариантов в запросе
+    (короткие "ул", "ш", "пл" запрос и документ и так получают из apply_type_aliases).
+    address_prefix: edge n-grams слов для подсказок по началу ввода.
+    """
+    def token_form(form: str) -> str:
+        return form.lower().replace("ё", "е").replace(".", "").strip()
+
+    # Формы из одной-двух букв ("д", "с", "м", "б", "мо") в синонимы не берём: в адресе это и дом,
+    # и деревня, и строение, и сокращения названий — синоним подменял бы их всем группам сразу
+    groups = {
+        canon: {form for form in (canon, *variants) if len(token_form(form)) > 2}
+        for canon, variants in ALIASES.items()
+    }
+    # Сокращения из нескольких групп ("кр" — край и красная) в синонимы не берём: иначе группы сольются
+    owners: Dict[str, set] = {}
+    for canon, forms in groups.items():
+        for form in forms:
+            owners.setdefault(token_form(form), set()).add(canon)
+    synonyms = []
+    for canon, forms in groups.items():
+        forms = sorted(f for f in forms if len(owners[token_form(f)]) == 1)
+        if len(forms) > 1:
+            synonyms.append(", ".join(forms))
+    return {
+        "char_filter": {
+            "yo_fold": {"type": "mapping", "mappings": ["ё => е", "Ё => Е"]}
+        },
+        "filter": {
+            # lenient: правила, которые анализатор сводит к пустым токенам, пропускаются
+            "address_synonyms": {"type": "synonym_graph", "synonyms": synonyms, "lenient": True},
+            "russian_light_stemmer": {"type": "stemmer", "language": "light_russian"},
+            "address_edge_ngram": {"type": "edge_ngram", "min_gram": 1, "max_gram": 20}
+        },
+        "analyzer": {
+            "address_ru": {
+                "type": "custom", "tokenizer": "standard", "char_filter": ["yo_fold"],
+                "filter": ["lowercase", "russian_light_stemmer"]
+            },
+            "address_ru_search": {
+                "type": "custom", "tokenizer": "standard", "char_filter": ["yo_fold"],
+                "filter": ["lowercase", "address_synonyms", "russian_light_stemmer"]
+            },
+            "address_prefix": {
+                "type": "custom", "tokenizer": "standard", "char_filter": ["yo_fold"],
+                "filter": ["lowercase", "address_edge_ngram"]
+            },
+            "address_prefix_search": {
+                "type": "custom", "tokenizer": "standard", "char_filter": ["yo_fold"],
+                "filter": ["lowercase"]
+            }
+        }
+    }
+
+
+def write_partition_dump(key: str, docs: Iterator[Dict[str, Any]], dump_dir: str, shard_size: int = DUMP_SHARD_SIZE) -> Dict[str, Any]:
+    """Запись документов партиции в шарды <key>-NNNNN.ndjson.gz в формате _bulk (строка действия + документ).
+    _index в файлах не пишется: при загрузке подставляется целевой индекс.
+    Шард появляется под своим именем только целиком записанным; сводка партиции <key>.json — последней.
+    """
+    summary = {"partition": key, "shards": [], "levels": {}, "docs": 0}
+    out = None
+    shard_docs = 0
+    
+    def close_shard():
+        out.close()
+        name = f"{key}-{len(summary['shards']):05d}.ndjson.gz"
+        os.replace(os.path.join(dump_dir, name + ".tmp"), os.path.join(dump_dir, name))
+        summary["shards"].append({"file": name, "docs": shard_docs})
+    
+    for doc in docs:
+        if out is None:
+            tmp = os.path.join(dump_dir, f"{key}-{len(summary['shards']):05d}.ndjson.gz.tmp")
+            out = gzip.open(tmp, "wt", encoding="utf-8", compresslevel=DUMP_COMPRESSLEVEL)
+            shard_docs = 0
+        out.write(json.dumps({"index": {"_id": doc["_id"]}}) + "\n")
+        out.write(json.dumps(doc["_source"], ensure_ascii=False, separators=(",", ":")) + "\n")
+        level = doc["_source"]["level"]
+        summary["levels"][level] = summary["levels"].get(level, 0) + 1
+        summary["docs"] += 1
+        shard_docs += 1
+        if shard_docs >= shard_size:
+            close_shard()
+            out = None
+    if out is not None:
+        close_shard()
+    
+    with open(os.path.join(dump_dir, f"{key}.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False)
+    return summary
+
+
+def write_dump_manifest(dump_dir: str, summaries: List[Dict[str, Any]], **fields: Any) -> Dict[str, Any]:
+    """manifest.json выгрузки: итоги по уровням и список шардов; fields — сведения об источнике"""
+    levels: Dict[str, int] = {}
+    for summary in summaries:
+        for level, count in summary["levels"].items():
+            levels[level] = levels.get(level, 0) + count
+    manifest = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        **fields,
+        "docs": sum(s["docs"] for s in summaries),
+        "levels": levels,
+        "shards": sorted((shard for s in summaries for shard in s["shards"]), key=lambda shard: shard["file"]),
+    }
+    with open(os.path.join(dump_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def _dump_partition_worker(options: Dict[str, Any], key: str, partition: Dict[str, Any], dump_dir: str, shard_size: int) -> Dict[str, Any]:
+    """Точка входа процесса-воркера выгрузки: своё подключение к MySQL на каждую партицию"""
+    etl = FiasETL(**options)
+    try:
+        return etl.dump_partition(key, partition, dump_dir, shard_size)
+    finally:
+        etl.es.close()
+
+
+def _load_shard_worker(options: Dict[str, Any], key: str, shard: Dict[str, Any]) -> Dict[str, Any]:
+    """Точка входа процесса-воркера загрузки из выгрузки: свой клиент ES на каждый шард"""
+    etl = FiasETL(**options)
+    try:
+        return etl.load_shard(key, shard)
+    finally:
+        etl.es.close()
+
+
+def _load_partition_worker(options: Dict[str, Any], key: str, partition: Dict[str, Any]) -> Dict[str, Any]:
+    """Точка входа процесса-воркера: свои подключения к MySQL и ES на каждую партицию"""
+    etl = FiasETL(**options)
+    try:
+        return etl.load_partition(key, partition)
+    finally:
+        etl.es.close()
+
+
 if __name__ == "__main__":
-    etl = FiasETL()
-    success = etl.run_etl()
+    parser = argparse.ArgumentParser(description="Загрузка данных FIAS из MySQL в Elasticsearch")
+    parser.add_argument("--regions", default=None, help="Коды регионов через запятую (по умолчанию все)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Процессов загрузки (партиций одновременно)")
+    parser.add_argument("--partition-by", choices=["region", "guid"], default="region", help="Разбиение на партиции: по region_code или по диапазонам guid")
+    parser.add_argument("--bulk-threads", type=int, default=4, help="Потоков parallel_bulk в каждом процессе")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Документов в одном bulk-запросе")
+    parser.add_argument("--state-dir", default=DEFAULT_STATE_DIR, help="Каталог с прогрессом по партициям")
+    parser.add_argument("--resume", action="store_true", help="Продолжить прерванную загрузку (в тот же индекс)")
+    parser.add_argument("--count-tolerance", type=float, default=0.001, help="Допустимое расхождение числа документов по уровню с MySQL (доля)")
+    parser.add_argument("--list-generations", action="store_true", help="Показать версии индекса и выйти")
+    parser.add_argument("--rollback", action="store_true", help="Переключить алиас на предыдущую версию индекса и выйти")
+    parser.add_argument("--delta", action="store_true", help="Инкрементальная загрузка изменений после водяного знака в живой индекс")
+    parser.add_argument("--dump", metavar="DIR", default=None, help="Только выгрузить MySQL в сжатые NDJSON-шарды в DIR (без ES)")
+    parser.add_argument("--from-dump", metavar="DIR", default=None, help="Собрать индекс из выгрузки DIR, не обращаясь к MySQL")
+    parser.add_argument("--shard-size", type=int, default=DUMP_SHARD_SIZE, help="Документов в одном шарде выгрузки")
+    parser.add_argument("--suggest-snapshot", metavar="PATH", default=None,
+                        help="Снимок подсказок для SUGGEST_BACKEND=memory: после --dump DIR или только из --from-dump DIR (без ES)")
+    parser.add_argument("--offline-index", metavar="PATH", default=None,
+                        help="Офлайн-индекс для SEARCH_BACKEND=offline: после --dump DIR или только из --from-dump DIR (без ES)")
+    args = parser.parse_args()
+    artifacts = [(path, build) for path, build in (
+        (args.suggest_snapshot, FiasETL.build_suggest_snapshot),
+        (args.offline_index, FiasETL.build_offline_index),
+    ) if path]
+    if artifacts and not (args.dump or args.from_dump):
+        parser.error("--suggest-snapshot и --offline-index строятся из выгрузки: укажите --dump или --from-dump")
+    
+    # Тела запросов прогрева в лог на INFO не нужны
+    logging.getLogger("api.search").setLevel(logging.WARNING)
+    
+    etl = FiasETL(
+        region_codes=[int(x) for x in args.regions.split(",")] if args.regions else None,
+        workers=args.workers,
+        partition_by=args.partition_by,
+        state_dir=args.state_dir,
+        resume=args.resume,
+        bulk_threads=args.bulk_threads,
+        chunk_size=args.chunk_size,
+        count_tolerance=args.count_tolerance,
+        dump_dir=args.from_dump
+    )
+    if args.list_generations:
+        for generation in etl.list_generations():
+            print(f"{'*' if generation['live'] else ' '} {generation['index']}")
+        exit(0)
+    if args.rollback:
+        exit(0 if etl.rollback() else 1)
+    if args.dump:
+        success = etl.run_dump(args.dump, args.shard_size)
+        etl.dump_dir = args.dump
+        for path, build in artifacts:
+            success = success and build(etl, path)
+    elif artifacts:
+        success = all([build(etl, path) for path, build in artifacts])
+    elif args.delta:
+        success = etl.run_delta()
+    else:
+        success = etl.run_etl()
     
     if success:
         print("✅ ETL процесс завершен успешно")
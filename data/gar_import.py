@@ -0,0 +1,375 @@
+"""
+Импорт FIAS напрямую из XML ГАР (распакованный gar_xml.zip), без промежуточной MySQL.
+
+В каталоге региона (01, 02, ..., 99) читаются AS_ADDR_OBJ_*, AS_HOUSES_* и иерархия
+(AS_MUN_HIERARCHY_* или AS_ADM_HIERARCHY_*). XML разбирается потоково (iterparse), имена
+объектов и связи объект -> родитель складываются во временную SQLite-базу на диске, так что
+память не растёт с размером региона. По ним строится full_norm ("москва г, ..., дом 37 стр 5"),
+а документы собираются тем же rows_to_docs из data/etl.py, что и при загрузке из address_table2.
+
+Результат — выгрузка в формате `etl.py --dump` (шарды NDJSON + manifest.json); индекс из неё
+собирает `python data/etl.py --from-dump DIR` или сразу --load. Регионы обрабатываются
+параллельно в отдельных процессах.
+
+Пример:
+  python data/gar_import.py /data/gar --out dump_gar --regions 77,50 --workers 4
+  python data/gar_import.py /data/gar --out dump_gar --load
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from tqdm import tqdm
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.etl import DEFAULT_STATE_DIR, DUMP_SHARD_SIZE, FiasETL, rows_to_docs, write_dump_manifest, write_partition_dump
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Уровни адресных объектов ГАР (AS_OBJECT_LEVELS), которые попадают в индекс;
+# остальные (районы, поселения, планировочная структура) участвуют только в full_norm
+GAR_OBJECT_LEVELS = {1: "region", 5: "city", 6: "city", 8: "street"}
+# Файлы иерархии: муниципальная даёт full_norm того же вида, что text_cache в address_table2 ("... вн/тер-г, ...")
+HIERARCHY_FILES = {"mun": "AS_MUN_HIERARCHY", "adm": "AS_ADM_HIERARCHY"}
+# Типы домов (AS_HOUSE_TYPES) и дополнительных номеров (AS_ADDHOUSE_TYPES) в написании text_cache
+HOUSE_TYPE_NAMES = {
+    1: "влд", 2: "дом", 3: "двлд", 4: "гараж", 5: "зд", 6: "шахта", 7: "стр",
+    8: "соор", 9: "литера", 10: "к", 11: "подв", 12: "кот", 13: "п-б", 14: "онс",
+}
+ADD_TYPE_NAMES = {1: "к", 2: "стр", 3: "соор", 4: "лит"}
+ADD_TYPE_KORPUS = 1
+ADD_TYPE_STROENIE = 2
+# Сокращения типов ГАР, которые в address_table2 записаны иначе
+TYPE_NAME_ALIASES = {"вн.тер.г.": "вн/тер-г"}
+# Сколько full_norm адресных объектов держать в памяти (улицы и нас. пункты повторяются у всех домов)
+FULL_NORM_CACHE_SIZE = 200000
+# Строк в одной пачке для rows_to_docs
+ROWS_BATCH_SIZE = 1000
+
+
+def find_region_files(region_dir: str, prefix: str) -> List[str]:
+    """Файлы вида <prefix>_<дата>_<guid>.XML (без AS_ADDR_OBJ_PARAMS, AS_HOUSES_PARAMS и т.п.)"""
+    pattern = re.compile(rf"^{prefix}_\d{{8}}_.*\.xml$", re.IGNORECASE)
+    return sorted(
+        os.path.join(region_dir, name) for name in os.listdir(region_dir) if pattern.match(name)
+    )
+
+
+def list_regions(gar_dir: str) -> List[str]:
+    return sorted(name for name in os.listdir(gar_dir) if name.isdigit() and os.path.isdir(os.path.join(gar_dir, name)))
+
+
+def iter_records(path: str, tag: str) -> Iterator[Dict[str, str]]:
+    """Атрибуты элементов tag из XML ГАР потоково. Элементы — плоский список под корнем,
+    поэтому корень очищается после каждого: разобранное дерево не накапливается.
+    """
+    context = ET.iterparse(path, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event == "end" and elem.tag == tag:
+            yield elem.attrib
+            root.clear()
+
+
+def is_actual(record: Dict[str, str]) -> bool:
+    return record.get("ISACTUAL", "1") == "1" and record.get("ISACTIVE", "1") == "1"
+
+
+def normalize_type_name(type_name: str) -> str:
+    type_name = type_name.strip().lower()
+    return TYPE_NAME_ALIASES.get(type_name, type_name.rstrip("."))
+
+
+class GarRegionIndex:
+    """Адресные объекты и иерархия одного региона во временной SQLite-базе на диске"""
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.exists(path):
+            os.remove(path)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            PRAGMA cache_size = -65536;
+            CREATE TABLE objects (objectid INTEGER PRIMARY KEY, guid TEXT, name TEXT, type_name TEXT, level INTEGER);
+            CREATE TABLE parents (objectid INTEGER PRIMARY KEY, parentid INTEGER);
+        """)
+        self.full_norm = lru_cache(maxsize=FULL_NORM_CACHE_SIZE)(self._full_norm)
+
+    def load_objects(self, paths: List[str]) -> None:
+        for path in paths:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?)",
+                (
+                    (int(r["OBJECTID"]), r["OBJECTGUID"], r["NAME"], normalize_type_name(r.get("TYPENAME", "")), int(r["LEVEL"]))
+                    for r in iter_records(path, "OBJECT") if is_actual(r)
+                )
+            )
+        self.db.commit()
+
+    def load_hierarchy(self, paths: List[str]) -> None:
+        for path in paths:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO parents VALUES (?, ?)",
+                (
+                    (int(r["OBJECTID"]), int(r["PARENTOBJID"]))
+                    for r in iter_records(path, "ITEM") if is_actual(r) and r.get("PARENTOBJID")
+                )
+            )
+        self.db.commit()
+
+    def parent_of(self, objectid: int) -> Optional[int]:
+        row = self.db.execute("SELECT parentid FROM parents WHERE objectid = ?", (objectid,)).fetchone()
+        return row[0] if row else None
+
+    def _full_norm(self, objectid: int) -> Optional[str]:
+        """Полное имя адресного объекта: цепочка родителей "имя тип" через запятую (как text_cache)"""
+        row = self.db.execute("SELECT name, type_name FROM objects WHERE objectid = ?", (objectid,)).fetchone()
+        if row is None:
+            return None
+        segment = f"{row[0]} {row[1]}".strip().lower()
+        parent = self.parent_of(objectid)
+        prefix = self.full_norm(parent) if parent and parent != objectid else None
+        return f"{prefix}, {segment}" if prefix else segment
+
+    def iter_indexed_objects(self) -> Iterator[tuple]:
+        placeholders = ", ".join(["?"] * len(GAR_OBJECT_LEVELS))
+        return self.db.execute(
+            f"SELECT objectid, guid, name, type_name, level FROM objects WHERE level IN ({placeholders}) ORDER BY objectid",
+            tuple(GAR_OBJECT_LEVELS)
+        )
+
+    def close(self) -> None:
+        self.db.close()
+        os.remove(self.path)
+
+
+def house_row(record: Dict[str, str], region_code: int, parent_full_norm: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Строка в форме address_table2 для дома ГАР (None — дом без номера)"""
+    number = (record.get("HOUSENUM") or "").strip()
+    if not number:
+        return None
+    house_type = HOUSE_TYPE_NAMES.get(int(record.get("HOUSETYPE") or 2), "дом")
+    label = f"{house_type} {number}"
+    korpus = stroenie = None
+    for i in (1, 2):
+        add_number = (record.get(f"ADDNUM{i}") or "").strip()
+        if not add_number:
+            continue
+        add_type = int(record.get(f"ADDTYPE{i}") or 0)
+        label += f" {ADD_TYPE_NAMES.get(add_type, '')} {add_number}".replace("  ", " ")
+        if add_type == ADD_TYPE_KORPUS:
+            korpus = add_number
+        elif add_type == ADD_TYPE_STROENIE:
+            stroenie = add_number
+    label = label.lower()
+    return {
+        'id': record["OBJECTGUID"],
+        'level': 'house',
+        'name_norm': number.lower(),
+        'name_exact': number,
+        'type_norm': house_type,
+        'full_norm': f"{parent_full_norm}, {label}" if parent_full_norm else label,
+        'region_code': region_code,
+        'house_number': number,
+        'korpus': korpus,
+        'stroenie': stroenie,
+        'lat': None,
+        'lon': None,
+    }
+
+
+class GarImporter:
+    """XML ГАР -> выгрузка в формате FiasETL (шарды по регионам + manifest.json)"""
+
+    def __init__(
+        self,
+        gar_dir: str,
+        dump_dir: str,
+        regions: Optional[List[int]] = None,
+        workers: int = 1,
+        hierarchy: str = "mun",
+        shard_size: int = DUMP_SHARD_SIZE,
+        resume: bool = False,
+        work_dir: Optional[str] = None
+    ):
+        self.gar_dir = gar_dir
+        self.dump_dir = dump_dir
+        self.regions = regions
+        self.workers = max(1, workers)
+        self.hierarchy = hierarchy
+        self.shard_size = shard_size
+        self.resume = resume
+        # Временные SQLite-базы регионов; по умолчанию рядом с выгрузкой
+        self.work_dir = work_dir or dump_dir
+
+    def region_dirs(self) -> List[str]:
+        """Каталоги регионов, крупные (по объёму AS_HOUSES) первыми — воркеры заканчивают примерно одновременно"""
+        if self.regions:
+            names = [f"{code:02d}" for code in self.regions]
+        else:
+            names = list_regions(self.gar_dir)
+
+        def size(name: str) -> int:
+            return sum(os.path.getsize(p) for p in find_region_files(os.path.join(self.gar_dir, name), "AS_HOUSES"))
+        return sorted(names, key=size, reverse=True)
+
+    def region_rows(self, index: GarRegionIndex, region_dir: str, region_code: int) -> Iterator[Dict[str, Any]]:
+        """Строки в форме address_table2: сначала адресные объекты, затем дома (потоково из AS_HOUSES)"""
+        for objectid, guid, name, type_name, level in index.iter_indexed_objects():
+            yield {
+                'id': guid,
+                'level': GAR_OBJECT_LEVELS[level],
+                'name_norm': name.lower(),
+                'name_exact': name,
+                'type_norm': type_name,
+                'full_norm': index.full_norm(objectid),
+                'region_code': region_code,
+                'house_number': None,
+                'korpus': None,
+                'stroenie': None,
+                'lat': None,
+                'lon': None,
+            }
+        for path in find_region_files(region_dir, "AS_HOUSES"):
+            for record in iter_records(path, "HOUSE"):
+                if not is_actual(record):
+                    continue
+                parent = index.parent_of(int(record["OBJECTID"]))
+                row = house_row(record, region_code, index.full_norm(parent) if parent else None)
+                if row:
+                    yield row
+
+    def import_region(self, name: str) -> Dict[str, Any]:
+        """Один регион: объекты и иерархия в SQLite, затем документы в шарды region_<код>-NNNNN.ndjson.gz"""
+        region_code = int(name)
+        key = f"region_{region_code}"
+        region_dir = os.path.join(self.gar_dir, name)
+        started = time.time()
+
+        index = GarRegionIndex(os.path.join(self.work_dir, f"{key}.sqlite"))
+        try:
+            index.load_objects(find_region_files(region_dir, "AS_ADDR_OBJ"))
+            index.load_hierarchy(find_region_files(region_dir, HIERARCHY_FILES[self.hierarchy]))
+
+            def docs() -> Iterator[Dict[str, Any]]:
+                batch: List[Dict[str, Any]] = []
+                for row in self.region_rows(index, region_dir, region_code):
+                    batch.append(row)
+                    if len(batch) >= ROWS_BATCH_SIZE:
+                        yield from rows_to_docs(batch)
+                        batch = []
+                yield from rows_to_docs(batch)
+
+            summary = write_partition_dump(key, docs(), self.dump_dir, self.shard_size)
+        finally:
+            index.close()
+        logger.info(f"[{key}] {summary['docs']} документов за {time.time() - started:.2f} секунд")
+        return summary
+
+    def run(self) -> bool:
+        logger.info(f"Импорт ГАР из {self.gar_dir} в {self.dump_dir}")
+        start_time = time.time()
+        try:
+            os.makedirs(self.dump_dir, exist_ok=True)
+            os.makedirs(self.work_dir, exist_ok=True)
+            if not self.resume:
+                for path in glob.glob(os.path.join(self.dump_dir, "*.ndjson.gz*")) + glob.glob(os.path.join(self.dump_dir, "*.json")):
+                    os.remove(path)
+
+            regions = self.region_dirs()
+            logger.info(f"Регионов: {len(regions)}, процессов: {self.workers}")
+
+            summaries: List[Dict[str, Any]] = []
+            pending = []
+            for name in regions:
+                done = os.path.join(self.dump_dir, f"region_{int(name)}.json")
+                if self.resume and os.path.exists(done):
+                    with open(done, "r", encoding="utf-8") as f:
+                        summaries.append(json.load(f))
+                else:
+                    pending.append(name)
+
+            if self.workers == 1:
+                for name in tqdm(pending, desc="Регионы"):
+                    summaries.append(self.import_region(name))
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    futures = [pool.submit(_import_region_worker, self._worker_options(), name) for name in pending]
+                    for future in tqdm(as_completed(futures), total=len(futures), desc="Регионы"):
+                        summaries.append(future.result())
+        except Exception as e:
+            logger.error(f"Ошибка импорта ГАР: {e}")
+            return False
+
+        # Водяного знака MySQL у ГАР нет: --delta по такому индексу недоступен до загрузки из MySQL
+        manifest = write_dump_manifest(
+            self.dump_dir, summaries,
+            watermark=None, source="gar", hierarchy=self.hierarchy,
+            region_codes=sorted(int(name) for name in regions), partition_by="region"
+        )
+
+        elapsed_time = time.time() - start_time
+        logger.info(f"Импорт ГАР завершен за {elapsed_time:.2f} секунд: {manifest['docs']} документов, шардов {len(manifest['shards'])}")
+        return True
+
+    def _worker_options(self) -> Dict[str, Any]:
+        return {
+            "gar_dir": self.gar_dir,
+            "dump_dir": self.dump_dir,
+            "hierarchy": self.hierarchy,
+            "shard_size": self.shard_size,
+            "work_dir": self.work_dir,
+        }
+
+
+def _import_region_worker(options: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """Точка входа процесса-воркера: регион целиком, со своей временной базой"""
+    return GarImporter(**options).import_region(name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Импорт FIAS из XML ГАР в выгрузку для etl.py --from-dump")
+    parser.add_argument("gar_dir", help="Распакованный gar_xml: каталоги регионов 01..99")
+    parser.add_argument("--out", required=True, help="Каталог выгрузки (шарды NDJSON + manifest.json)")
+    parser.add_argument("--regions", default=None, help="Коды регионов через запятую (по умолчанию все)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Регионов одновременно (процессов)")
+    parser.add_argument("--hierarchy", choices=sorted(HIERARCHY_FILES), default="mun", help="Иерархия для full_norm: муниципальная или административная")
+    parser.add_argument("--shard-size", type=int, default=DUMP_SHARD_SIZE, help="Документов в одном шарде выгрузки")
+    parser.add_argument("--work-dir", default=None, help="Каталог временных SQLite-баз (по умолчанию --out)")
+    parser.add_argument("--resume", action="store_true", help="Пропустить уже импортированные регионы")
+    parser.add_argument("--load", action="store_true", help="Сразу собрать индекс из выгрузки (как etl.py --from-dump)")
+    parser.add_argument("--state-dir", default=DEFAULT_STATE_DIR, help="Каталог с прогрессом загрузки для --load")
+    args = parser.parse_args()
+
+    importer = GarImporter(
+        args.gar_dir,
+        args.out,
+        regions=[int(x) for x in args.regions.split(",")] if args.regions else None,
+        workers=args.workers,
+        hierarchy=args.hierarchy,
+        shard_size=args.shard_size,
+        resume=args.resume,
+        work_dir=args.work_dir
+    )
+    success = importer.run()
+    if success and args.load:
+        success = FiasETL(workers=args.workers, state_dir=args.state_dir, dump_dir=args.out).run_etl()
+
+    if success:
+        print("✅ Импорт ГАР завершен успешно")
+    else:
+        print("❌ Импорт ГАР завершился с ошибкой")
+        exit(1)
@@ -0,0 +1,262 @@
+"""
+Пакетное геокодирование файла адресов без HTTP: normalizer + SearchService напрямую.
+
+Вход: CSV / TSV (с заголовком) или JSONL; столбец/ключ с адресом — --column.
+Выход: CSV / TSV / JSONL с найденным id ФИАС, full_name, домом/корпусом/строением,
+координатами и score. Файл читается и пишется потоково (в памяти не больше
+--concurrency пачек), нормализация идёт в пуле процессов, поиск — параллельными
+пачками _msearch. Прогресс сохраняется в <output>.ckpt, --resume продолжает с него.
+
+Пример:
+  python geocode.py addresses.csv result.csv --column address
+  python geocode.py addresses.jsonl result.jsonl --resume
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import logging
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from tqdm import tqdm
+
+# Добавляем текущую директорию в PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from elasticsearch import Elasticsearch, AsyncElasticsearch  # noqa: E402
+
+from config import settings, get_elasticsearch_config  # noqa: E402
+from api.search import SearchService, AsyncSearchService, prepare_search_batch  # noqa: E402
+from api.result_cache import ResultCache  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FIELDS = [
+    "row", "query", "normalized_query", "id", "level", "full_name",
+    "house_number", "korpus", "stroenie", "region_code", "lat", "lon", "score", "error"
+]
+
+
+def detect_format(path: str, explicit: Optional[str]) -> str:
+    if explicit:
+        return explicit
+    ext = os.path.splitext(path)[1].lower()
+    return {".tsv": "tsv", ".jsonl": "jsonl", ".ndjson": "jsonl"}.get(ext, "csv")
+
+
+def read_rows(path: str, fmt: str, column: str) -> Iterator[str]:
+    """Потоковое чтение адресов из файла"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "jsonl":
+            for line in f:
+                if not line.strip():
+                    continue
+                value = json.loads(line)
+                yield value if isinstance(value, str) else str(value.get(column) or "")
+        else:
+            reader = csv.DictReader(f, delimiter="\t" if fmt == "tsv" else ",")
+            if column not in (reader.fieldnames or []):
+                raise SystemExit(f"В файле нет столбца '{column}' (есть: {reader.fieldnames})")
+            for row in reader:
+                yield row.get(column) or ""
+
+
+class OutputWriter:
+    """Потоковая запись результата с поддержкой дозаписи после checkpoint"""
+
+    def __init__(self, path: str, fmt: str, resume_bytes: Optional[int]):
+        self.fmt = fmt
+        if resume_bytes is not None and os.path.exists(path):
+            # Отрезаем то, что успели записать после последнего checkpoint
+            with open(path, "r+b") as f:
+                f.truncate(resume_bytes)
+            self.file = open(path, "a", encoding="utf-8", newline="")
+        else:
+            self.file = open(path, "w", encoding="utf-8", newline="")
+            resume_bytes = None
+        if fmt != "jsonl":
+            self.writer = csv.DictWriter(self.file, fieldnames=OUTPUT_FIELDS, delimiter="\t" if fmt == "tsv" else ",")
+            if resume_bytes is None:
+                self.writer.writeheader()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self.fmt == "jsonl":
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        else:
+            self.writer.writerow(record)
+
+    def flush(self) -> int:
+        """Сброс на диск; возвращает размер файла для checkpoint"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, offset: int, output_bytes: int) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"offset": offset, "output_bytes": output_bytes}, f)
+    os.replace(tmp, path)
+
+
+def to_record(row: int, query: str, prepared: Any, result: Any) -> Dict[str, Any]:
+    """Строка результата: лучший найденный адрес или ошибка"""
+    record: Dict[str, Any] = {field: None for field in OUTPUT_FIELDS}
+    record.update(row=row, query=query)
+    if isinstance(prepared, Exception):
+        record["error"] = f"Ошибка нормализации: {prepared}"
+        return record
+    record["normalized_query"] = prepared[0]["text_without_house"]
+    if isinstance(result, Exception):
+        record["error"] = f"Ошибка поиска: {result}"
+        return record
+    if result:
+        best = result[0]
+        record.update(
+            id=best.id,
+            level=best.level,
+            full_name=best.full_name,
+            house_number=best.house_number,
+            korpus=best.korpus,
+            stroenie=best.stroenie,
+            region_code=best.region_code,
+            lat=best.geo.lat if best.geo else None,
+            lon=best.geo.lon if best.geo else None,
+            score=best.score,
+        )
+    return record
+
+
+def chunked(rows: Iterator[str], size: int) -> Iterator[List[str]]:
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def geocode(args: argparse.Namespace) -> int:
+    in_fmt = detect_format(args.input, args.input_format)
+    out_fmt = detect_format(args.output, args.output_format)
+    checkpoint_path = args.output + ".ckpt"
+
+    offset = 0
+    resume_bytes = None
+    if args.resume:
+        checkpoint = load_checkpoint(checkpoint_path)
+        # Без выходного файла продолжать нечего: начинаем сначала
+        if checkpoint and os.path.exists(args.output):
+            offset = checkpoint["offset"]
+            resume_bytes = checkpoint["output_bytes"]
+            logger.info(f"Продолжаем со строки {offset}")
+
+    es_config = get_elasticsearch_config()
+    if settings.ES_CLIENT_MODE == "async":
+        es = AsyncElasticsearch(**es_config, connections_per_node=settings.ES_ASYNC_CONNECTIONS)
+        service = AsyncSearchService(es, settings.ES_INDEX)
+    else:
+        es = Elasticsearch(**es_config)
+        service = SearchService(es, settings.ES_INDEX)
+    if settings.RESULT_CACHE_ENABLED:
+        # Повторы адресов внутри файла не ходят в ES повторно
+        service.cache = ResultCache(max_entries=settings.RESULT_CACHE_MAX_ENTRIES, ttl=settings.RESULT_CACHE_TTL)
+        try:
+            await service.refresh_index_generation()
+        except Exception as e:
+            logger.warning(f"Не удалось получить поколение индекса: {e}")
+
+    rows = itertools.islice(read_rows(args.input, in_fmt, args.column), offset, None)
+    writer = OutputWriter(args.output, out_fmt, resume_bytes)
+    pool = ProcessPoolExecutor(max_workers=args.workers)
+    loop = asyncio.get_running_loop()
+    progress = tqdm(initial=offset, unit="строк", disable=args.quiet)
+
+    async def process(chunk: List[str]):
+        prepared = await loop.run_in_executor(pool, prepare_search_batch, chunk, args.limit)
+        params = [p[1] for p in prepared if not isinstance(p, Exception)]
+        try:
+            found = iter(await service.search_many(params))
+        except Exception as e:
+            logger.error(f"Ошибка пакетного поиска: {e}")
+            found = iter([e] * len(params))
+        return prepared, [None if isinstance(p, Exception) else next(found) for p in prepared]
+
+    in_flight: deque = deque()
+    errors = 0
+
+    async def drain_one():
+        nonlocal offset, errors
+        chunk, task = in_flight.popleft()
+        prepared, results = await task
+        for j, query in enumerate(chunk):
+            record = to_record(offset + j, query, prepared[j], results[j])
+            errors += record["error"] is not None
+            writer.write(record)
+        offset += len(chunk)
+        save_checkpoint(checkpoint_path, offset, writer.flush())
+        progress.update(len(chunk))
+
+    try:
+        for chunk in chunked(rows, args.chunk_size):
+            # Ограничиваем число пачек в работе: память не растёт с размером файла
+            if len(in_flight) >= args.concurrency:
+                await drain_one()
+            in_flight.append((chunk, asyncio.create_task(process(chunk))))
+        while in_flight:
+            await drain_one()
+    finally:
+        for _, task in in_flight:
+            task.cancel()
+        progress.close()
+        writer.close()
+        pool.shutdown(cancel_futures=True)
+        if isinstance(es, AsyncElasticsearch):
+            await es.close()
+        else:
+            es.close()
+
+    logger.info(f"Готово: {offset} строк, ошибок {errors}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетное геокодирование файла адресов (без HTTP)")
+    parser.add_argument("input", help="Входной файл: CSV, TSV или JSONL")
+    parser.add_argument("output", help="Выходной файл: CSV, TSV или JSONL")
+    parser.add_argument("--column", default="query", help="Столбец (ключ JSONL) с адресом")
+    parser.add_argument("--input-format", choices=["csv", "tsv", "jsonl"], default=None, help="По умолчанию — по расширению")
+    parser.add_argument("--output-format", choices=["csv", "tsv", "jsonl"], default=None, help="По умолчанию — по расширению")
+    parser.add_argument("--limit", type=int, default=1, help="Сколько результатов запрашивать у ES на адрес")
+    parser.add_argument("--chunk-size", type=int, default=settings.BATCH_CHUNK_SIZE, help="Адресов в одной пачке _msearch")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY, help="Пачек в работе одновременно")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Процессов нормализации")
+    parser.add_argument("--resume", action="store_true", help="Продолжить с checkpoint (<output>.ckpt)")
+    parser.add_argument("--quiet", action="store_true", help="Без индикатора прогресса")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL))
+    # Строка на каждый запрос к ES на INFO — только мешает при геокодировании файла
+    logging.getLogger("elastic_transport").setLevel(logging.WARNING)
+
+    errors = asyncio.run(geocode(args))
+    print(f"✅ Результат: {args.output}" + (f" (строк с ошибками: {errors})" if errors else ""))
+
+
+if __name__ == "__main__":
+    main()